@@ -1,9 +1,16 @@
+import argparse
+import random
 import sqlite3
+import time
 import bcrypt
 from datetime import datetime, timedelta
+from itertools import chain, islice
+from schema import create_change_log_triggers, drop_change_log_triggers, run_migrations
 
 def create_sample_data():
     conn = sqlite3.connect('database.db')
+    # Make sure the tables exist; the app no longer creates them on import
+    run_migrations(conn)
     cursor = conn.cursor()
     
     try:
@@ -17,8 +24,11 @@ def create_sample_data():
             ('parent_doe', 'parent123', 'parent', 1, 'doe@school.com')
         ]
         
+        # Hash each distinct password once
+        hashes = {password: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+                  for password in {user[1] for user in users}}
         for username, password, role, ref_id, email in users:
-            hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+            hashed_password = hashes[password]
             cursor.execute('''
                 INSERT OR IGNORE INTO users (username, password, role, reference_id, email)
                 VALUES (?, ?, ?, ?, ?)
@@ -74,6 +84,17 @@ def create_sample_data():
             VALUES (?, ?, ?, ?, ?)
         ''', parents)
 
+        # Link each parent to their child
+        parent_students = [
+            (1, 1),  # Robert Doe is John Doe's father
+            (2, 2)   # Mary Smith is Jane Smith's mother
+        ]
+        
+        cursor.executemany('''
+            INSERT OR IGNORE INTO parent_student (parentId, studentId)
+            VALUES (?, ?)
+        ''', parent_students)
+
         # Assign teachers to courses
         course_teachers = [
             (1, 1),  # Teacher 1 (Smith) teaches Mathematics 101
@@ -153,5 +174,190 @@ def create_sample_data():
     finally:
         conn.close()
 
+# Synthetic data at production scale, for load tests and benchmarks.
+# Every generated user of a role shares that role's password, so bcrypt runs
+# once per role instead of once per user. Rows are streamed into executemany
+# in chunks, one transaction per chunk.
+
+CHUNK_SIZE = 10000
+
+ROLE_PASSWORDS = {
+    'admin': 'admin123',
+    'teacher': 'teacher123',
+    'student': 'student123',
+    'parent': 'parent123',
+}
+
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda',
+               'William', 'Elizabeth', 'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson']
+DEPARTMENTS = ['Mathematics', 'Science', 'English', 'History', 'Languages', 'Arts', 'Computing']
+GRADES = ['A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'D', 'F']
+RELATIONS = ['Mother', 'Father', 'Guardian']
+
+def insert_chunked(conn, sql, rows):
+    total = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return total
+        with conn:
+            conn.executemany(sql, chunk)
+        total += len(chunk)
+
+def school_days(start, count):
+    day = start
+    days = []
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day.strftime('%Y-%m-%d'))
+        day += timedelta(days=1)
+    return days
+
+def generate_data(database='database.db', students=50000, courses=2000, teachers=500,
+                  parents=None, courses_per_student=5, attendance=1000000,
+                  bcrypt_rounds=12, seed=42):
+    rng = random.Random(seed)
+    parents = students if parents is None else parents
+    started = time.perf_counter()
+
+    conn = sqlite3.connect(database)
+    run_migrations(conn)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+
+    # The generated rows replace everything, so they are not written to the
+    # change log row by row. The log is emptied instead; change feed clients
+    # holding an older cursor are told to reset and refetch.
+    with conn:
+        drop_change_log_triggers(conn.cursor())
+        conn.execute('DELETE FROM change_log')
+
+    try:
+        with conn:
+            for table in ['attendance', 'grade', 'enrollment', 'course_teacher', 'parent_student',
+                          'parent_guardian', 'student', 'course', 'teachers', 'users']:
+                conn.execute(f'DELETE FROM {table}')
+            conn.execute("""DELETE FROM sqlite_sequence WHERE name IN
+                ('attendance', 'grade', 'enrollment', 'parent_guardian', 'student',
+                 'course', 'teachers', 'users')""")
+
+        def name():
+            return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+        insert_chunked(conn, """
+            INSERT INTO teachers (firstName, lastName, email, phoneNumber, department)
+            VALUES (?, ?, ?, ?, ?)
+        """, ((*name(), f'teacher{i}@school.com', 1000000000 + i, rng.choice(DEPARTMENTS))
+              for i in range(1, teachers + 1)))
+
+        insert_chunked(conn, """
+            INSERT INTO course (courseName, courseDescription, credits)
+            VALUES (?, ?, ?)
+        """, ((f'{rng.choice(DEPARTMENTS)} {100 + i}', f'Generated course {i}', rng.choice([1, 2, 3, 4]))
+              for i in range(1, courses + 1)))
+
+        insert_chunked(conn, """
+            INSERT INTO course_teacher (courseId, teacherId)
+            VALUES (?, ?)
+        """, ((course_id, (course_id - 1) % teachers + 1) for course_id in range(1, courses + 1)))
+
+        insert_chunked(conn, """
+            INSERT INTO student (firstName, lastName, email, dateOfBirth, address, phoneNumber)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, ((*name(), f'student{i}@school.com',
+               f'{rng.randint(2006, 2012)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+               f'{rng.randint(1, 999)} School Road', 2000000000 + i)
+              for i in range(1, students + 1)))
+
+        insert_chunked(conn, """
+            INSERT INTO parent_guardian (firstName, lastName, email, phoneNumber, relationToStudent)
+            VALUES (?, ?, ?, ?, ?)
+        """, ((*name(), f'parent{i}@school.com', 3000000000 + i, rng.choice(RELATIONS))
+              for i in range(1, parents + 1)))
+
+        # Parent i looks after student i (wrapping round when there are more
+        # parents than students); linked before the enrollments so the
+        # enrollment triggers fill in the parents' scope as they go
+        insert_chunked(conn, """
+            INSERT INTO parent_student (parentId, studentId)
+            VALUES (?, ?)
+        """, ((parent_id, (parent_id - 1) % students + 1) for parent_id in range(1, parents + 1) if students))
+
+        per_student = min(courses_per_student, courses)
+        enrollment_count = insert_chunked(conn, """
+            INSERT INTO enrollment (studentId, courseId, enrollmentDate)
+            VALUES (?, ?, ?)
+        """, ((student_id, course_id, '2024-09-02')
+              for student_id in range(1, students + 1)
+              for course_id in rng.sample(range(1, courses + 1), per_student)))
+
+        insert_chunked(conn, """
+            INSERT INTO grade (enrollmentId, gradeValue)
+            VALUES (?, ?)
+        """, ((enrollment_id, rng.choice(GRADES)) for enrollment_id in range(1, enrollment_count + 1)))
+
+        # Spread the attendance rows over consecutive school days, one
+        # register per enrollment per day
+        days = school_days(datetime(2024, 9, 2), max(1, -(-attendance // max(enrollment_count, 1))))
+        insert_chunked(conn, """
+            INSERT INTO attendance (enrollmentId, date, status)
+            VALUES (?, ?, ?)
+        """, islice(((enrollment_id, day, 'Absent' if rng.random() < 0.05 else 'Present')
+                     for day in days
+                     for enrollment_id in range(1, enrollment_count + 1)), attendance))
+
+        hashes = {role: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(bcrypt_rounds))
+                  for role, password in ROLE_PASSWORDS.items()}
+        users = chain(
+            [('admin_user', hashes['admin'], 'admin', None, 'admin@school.com')],
+            ((f'teacher_{i}', hashes['teacher'], 'teacher', i, f'teacher{i}@school.com')
+             for i in range(1, teachers + 1)),
+            ((f'student_{i}', hashes['student'], 'student', i, f'student{i}@school.com')
+             for i in range(1, students + 1)),
+            ((f'parent_{i}', hashes['parent'], 'parent', i, f'parent{i}@school.com')
+             for i in range(1, parents + 1)))
+        insert_chunked(conn, """
+            INSERT INTO users (username, password, role, reference_id, email)
+            VALUES (?, ?, ?, ?, ?)
+        """, users)
+
+        with conn:
+            conn.execute('ANALYZE')
+        print(f"Generated {students} students, {courses} courses, {teachers} teachers, "
+              f"{parents} parents, {enrollment_count} enrollments and "
+              f"{min(attendance, len(days) * enrollment_count)} attendance rows "
+              f"in {time.perf_counter() - started:.1f}s")
+        print("Logins: admin_user / teacher_<n> / student_<n> / parent_<n>, "
+              "passwords as in create_sample_data()")
+
+    except sqlite3.Error as e:
+        print(f"An error occurred: {e}")
+        conn.rollback()
+    finally:
+        with conn:
+            create_change_log_triggers(conn.cursor())
+        conn.close()
+
 if __name__ == "__main__":
-    create_sample_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Populate the database with sample or generated data.')
+    parser.add_argument('--generate', action='store_true',
+                        help='generate synthetic data instead of the small sample set')
+    parser.add_argument('--database', default='database.db')
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--courses', type=int, default=2000)
+    parser.add_argument('--teachers', type=int, default=500)
+    parser.add_argument('--parents', type=int, default=None)
+    parser.add_argument('--courses-per-student', type=int, default=5)
+    parser.add_argument('--attendance', type=int, default=1000000)
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_data(args.database, args.students, args.courses, args.teachers, args.parents,
+                      args.courses_per_student, args.attendance, args.bcrypt_rounds, args.seed)
+    else:
+        create_sample_data()
\ No newline at end of file
@@ -1,12 +1,36 @@
-from flask import Flask, request, jsonify, g
+from flask import (Flask, Response, request, jsonify, g, has_request_context, send_file,
+                   stream_with_context)
 from flask_cors import CORS
-import sqlite3
 from sqlite3 import Error
 from functools import wraps
 import jwt
-import bcrypt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import atexit
+import hashlib
 import os
+import threading
+import time
+import click
+from flask.cli import AppGroup
+from db import ConnectionPool, WriteQueue, WriteQueueClosed
+from cache import TokenVersionTable, TTLCache, create_response_cache
+from hashing import HasherBusy, PasswordHasher
+from exports import EXPORT_FORMATS, ExportBusy, ExportManager
+from metrics import (BYTE_BUCKETS, LATENCY_BUCKETS, ROW_BUCKETS, MetricsRegistry,
+                     compact_sql)
+from bulk import MAX_BULK_ROWS, BulkInsert, validate_bulk, write_bulk
+from importer import (IMPORT_CHUNK_ROWS, IMPORT_FORMATS, ImportResult, ImportSpec, Lookup,
+                      check_import_options, import_chunks, read_rows)
+from pagination import ListArgs, ListQuery, table_columns
+from search import MAX_SEARCH_OFFSET, SEARCH_TYPES, SearchArgs, build_search
+from schema import (SCHEMA_VERSION, find_table_scans, get_pending_migrations,
+                    get_schema_version, rebuild_access_scope, rebuild_search,
+                    rebuild_summaries, run_migrations)
+from streaming import NDJSON_MIMETYPE, iter_json_array, iter_ndjson, iter_rows
+from changes import (CHANGES_LIMIT, MAX_CHANGES_LIMIT, ChangeNotifier, format_event,
+                     is_stale, log_bounds, read_changes)
+from encoding import (COLUMNS_MIMETYPE, COMPRESSIBLE_MIMETYPES, MSGPACK_MIMETYPE, compress,
+                      negotiate_encoding, negotiate_format, pack_msgpack)
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -18,6 +42,70 @@ CORS(app, resources={
     }
 })
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
+app.config['DATABASE'] = os.environ.get('DATABASE', 'database.db')
+# Apply pending migrations on the first request instead of requiring
+# 'flask db upgrade'; turn off in production
+app.config['AUTO_MIGRATE'] = os.environ.get('AUTO_MIGRATE', '1') == '1'
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 1024))
+app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', 60))
+# AUTH_MODE=claims lets GET requests trust the role and reference_id signed
+# into the access token instead of loading the users row. Revocation is
+# checked against an in-memory copy of users.tokenVersion refreshed every
+# TOKEN_VERSION_REFRESH seconds; ACCESS_TOKEN_TTL bounds how long a token
+# issued before a role change keeps its old claims.
+app.config['AUTH_MODE'] = os.environ.get('AUTH_MODE', 'database')
+app.config['ACCESS_TOKEN_TTL'] = int(os.environ.get('ACCESS_TOKEN_TTL', 24 * 3600))
+app.config['REFRESH_TOKEN_TTL'] = int(os.environ.get('REFRESH_TOKEN_TTL', 7 * 24 * 3600))
+app.config['TOKEN_VERSION_REFRESH'] = float(os.environ.get('TOKEN_VERSION_REFRESH', 5))
+app.config['BCRYPT_ROUNDS'] = int(os.environ.get('BCRYPT_ROUNDS', 12))
+app.config['HASH_WORKERS'] = int(os.environ.get('HASH_WORKERS', os.cpu_count() or 2))
+app.config['HASH_QUEUE_DEPTH'] = int(os.environ.get('HASH_QUEUE_DEPTH', 2 * app.config['HASH_WORKERS']))
+app.config['HASH_RETRY_AFTER'] = int(os.environ.get('HASH_RETRY_AFTER', 1))
+app.config['SLOW_QUERY_SECONDS'] = float(os.environ.get('SLOW_QUERY_MS', 200)) / 1000
+# Optional static bearer token for Prometheus scrapes of /api/metrics
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# List response cache: 'memory' (per process), 'disk' (shared by every
+# worker through RESPONSE_CACHE_PATH) or 'off'
+app.config['RESPONSE_CACHE'] = os.environ.get('RESPONSE_CACHE', 'memory')
+app.config['RESPONSE_CACHE_PATH'] = os.environ.get('RESPONSE_CACHE_PATH',
+                                                   app.config['DATABASE'] + '.cache')
+app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.environ.get('RESPONSE_CACHE_MAX_MB', 64)) * 1024 * 1024
+app.config['RESPONSE_CACHE_TTL'] = float(os.environ.get('RESPONSE_CACHE_TTL', 300))
+# Responses of at least COMPRESS_MIN_BYTES are sent gzip or brotli encoded
+# when the client accepts it (COMPRESS=0 turns this off)
+app.config['COMPRESS'] = os.environ.get('COMPRESS', '1') == '1'
+app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+app.config['BROTLI_QUALITY'] = int(os.environ.get('BROTLI_QUALITY', 4))
+# Idle read-only connections kept per process
+app.config['READ_POOL_SIZE'] = int(os.environ.get('READ_POOL_SIZE', os.cpu_count() or 4))
+# Writes queued together are committed together: at most WRITE_BATCH_SIZE
+# rows per commit, waiting up to WRITE_BATCH_DELAY_MS for more to arrive
+app.config['WRITE_BATCH_SIZE'] = int(os.environ.get('WRITE_BATCH_SIZE', 500))
+app.config['WRITE_BATCH_DELAY'] = float(os.environ.get('WRITE_BATCH_DELAY_MS', 0)) / 1000
+# Group commit for attendance: when set, attendance writes wait up to this
+# long for others to share their commit (flushing early at WRITE_BATCH_SIZE
+# rows). Each request still returns only after its row is committed.
+app.config['ATTENDANCE_COMMIT_DELAY'] = float(os.environ.get('ATTENDANCE_COMMIT_DELAY_MS', 0)) / 1000
+# Background report exports: finished files live in EXPORT_DIR for
+# EXPORT_RETENTION seconds; at most EXPORT_MAX_JOBS are queued or running
+app.config['EXPORT_DIR'] = os.environ.get('EXPORT_DIR', app.config['DATABASE'] + '.exports')
+app.config['EXPORT_WORKERS'] = int(os.environ.get('EXPORT_WORKERS', 2))
+app.config['EXPORT_MAX_JOBS'] = int(os.environ.get('EXPORT_MAX_JOBS', 4))
+app.config['EXPORT_RETENTION'] = float(os.environ.get('EXPORT_RETENTION', 3600))
+# Change feed streams (/api/changes/stream). Each open stream holds a thread
+# and a read connection, so at most CHANGE_STREAM_MAX are served at once.
+# Streams poll the log every CHANGE_POLL_SECONDS (sooner when this process
+# commits), send a keepalive comment after CHANGE_HEARTBEAT_SECONDS of
+# silence and end after CHANGE_STREAM_SECONDS so the client reconnects and
+# its token is checked again. CHANGE_LOG_DAYS is the default retention of
+# 'flask db prune-changes'.
+app.config['CHANGE_STREAM_MAX'] = int(os.environ.get('CHANGE_STREAM_MAX', 32))
+app.config['CHANGE_POLL_SECONDS'] = float(os.environ.get('CHANGE_POLL_SECONDS', 1))
+app.config['CHANGE_HEARTBEAT_SECONDS'] = float(os.environ.get('CHANGE_HEARTBEAT_SECONDS', 15))
+app.config['CHANGE_STREAM_SECONDS'] = float(os.environ.get('CHANGE_STREAM_SECONDS', 300))
+app.config['CHANGE_RETRY_MS'] = int(os.environ.get('CHANGE_RETRY_MS', 3000))
+app.config['CHANGE_LOG_DAYS'] = int(os.environ.get('CHANGE_LOG_DAYS', 7))
 
 # Helper function to convert row to dict
 def dict_factory(cursor, row):
@@ -26,195 +114,336 @@ def dict_factory(cursor, row):
         d[col[0]] = row[idx]
     return d
 
+# Reads and writes are routed separately. Handlers read through db_pool,
+# whose connections are opened read-only; every write is a job on db_writer,
+# which owns the only write connection of the process and batches commits.
+# With WAL, readers see the last committed state and never wait for it.
+db_pool = ConnectionPool(app.config['DATABASE'], row_factory=dict_factory,
+                         max_idle=app.config['READ_POOL_SIZE'], read_only=True)
+db_pool.init_app(app)
+write_pool = ConnectionPool(app.config['DATABASE'], row_factory=dict_factory, max_idle=1)
+db_writer = WriteQueue(write_pool, max_batch=app.config['WRITE_BATCH_SIZE'],
+                       max_delay=app.config['WRITE_BATCH_DELAY'])
+# Commit whatever is still queued when the process exits
+atexit.register(db_writer.close)
+change_notifier = ChangeNotifier()
+db_writer.on_commit = change_notifier.notify
+change_streams = threading.BoundedSemaphore(app.config['CHANGE_STREAM_MAX'])
+
+# Request instrumentation. Every query is timed and tagged with the route
+# that ran it; per-request totals are kept on g and recorded after the
+# response is built.
+metrics = MetricsRegistry()
+metrics.describe('http_requests_total', 'counter', 'Requests by endpoint, method and status')
+metrics.describe('http_request_duration_seconds', 'histogram', 'Total request latency')
+metrics.describe('http_auth_duration_seconds', 'histogram', 'Time spent in token_required')
+metrics.describe('http_request_sql_seconds', 'histogram', 'Time spent executing SQL per request')
+metrics.describe('http_response_rows', 'histogram', 'Rows fetched per request')
+metrics.describe('http_response_bytes', 'histogram', 'Response body size (non-streamed responses)')
+metrics.describe('db_query_duration_seconds', 'histogram', 'Latency of each cursor.execute')
+metrics.describe('db_slow_queries_total', 'counter', 'Queries slower than SLOW_QUERY_MS')
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    # On the writer thread, the endpoint that queued the running job
+    return db_writer.current_context() or 'none'
+
+def record_query(sql, seconds):
+    endpoint = current_endpoint()
+    metrics.observe('db_query_duration_seconds', LATENCY_BUCKETS, seconds, [('endpoint', endpoint)])
+    if has_request_context():
+        g.sql_seconds = g.get('sql_seconds', 0.0) + seconds
+    if seconds >= app.config['SLOW_QUERY_SECONDS']:
+        metrics.inc('db_slow_queries_total', [('endpoint', endpoint)])
+        app.logger.warning('Slow query (%.1f ms) in %s: %s', seconds * 1000, endpoint, compact_sql(sql))
+
+def record_rows(count):
+    if has_request_context():
+        g.rows_fetched = g.get('rows_fetched', 0) + count
+
+for pool in (db_pool, write_pool):
+    pool.on_query = record_query
+    pool.on_rows = record_rows
+db_writer.capture_context = current_endpoint
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.get('request_start')
+    if start is None:
+        return response
+    endpoint = request.endpoint or 'unknown'
+    labels = [('endpoint', endpoint), ('method', request.method)]
+    metrics.inc('http_requests_total', labels + [('status', str(response.status_code))])
+    metrics.observe('http_request_duration_seconds', LATENCY_BUCKETS, time.perf_counter() - start, labels)
+    if 'auth_seconds' in g:
+        metrics.observe('http_auth_duration_seconds', LATENCY_BUCKETS, g.auth_seconds, labels)
+    metrics.observe('http_request_sql_seconds', LATENCY_BUCKETS, g.get('sql_seconds', 0.0), labels)
+    metrics.observe('http_response_rows', ROW_BUCKETS, g.get('rows_fetched', 0), labels)
+    if not response.is_streamed:
+        metrics.observe('http_response_bytes', BYTE_BUCKETS, response.calculate_content_length() or 0, labels)
+    return response
+
 def get_db_connection():
     try:
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = dict_factory
-        return conn
+        return db_pool.acquire()
     except Error as e:
-        print(f"Error connecting to the database: {e}")
+        app.logger.error('Error connecting to the database: %s', e)
         return None
 
+# Writable connection for schema changes and maintenance commands; request
+# handlers write through db_writer instead
+def get_write_connection():
+    return write_pool.acquire_detached()
+
 def init_db():
-    conn = get_db_connection()
+    conn = get_write_connection()
     if conn is not None:
         try:
-            c = conn.cursor()
-            # Create users table with role-based access control
-            c.execute('''CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                role TEXT NOT NULL,
-                reference_id INTEGER,
-                email TEXT UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )''')
-            
-            # Create roles table
-            c.execute('''CREATE TABLE IF NOT EXISTS roles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                role_name TEXT UNIQUE NOT NULL,
-                permissions TEXT NOT NULL
-            )''')
-            
-            # Insert default roles if they don't exist
-            roles = [
-                ('admin', 'all'),
-                ('teacher', 'courses,students,grades,attendance'),
-                ('student', 'courses,grades'),
-                ('parent', 'grades,attendance'),
-                ('staff', 'courses,attendance'),
-                ('investor', 'none')
-            ]
-            
-            c.executemany('''INSERT OR IGNORE INTO roles (role_name, permissions)
-                            VALUES (?, ?)''', roles)
-
-            # Create course table
-            c.execute('''CREATE TABLE IF NOT EXISTS course (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                courseName TEXT NOT NULL,
-                courseDescription TEXT NOT NULL,
-                credits INTEGER NOT NULL
-            )''')
-
-            # Create teachers table
-            c.execute('''CREATE TABLE IF NOT EXISTS teachers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                firstName TEXT NOT NULL,
-                lastName TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                phoneNumber INTEGER UNIQUE NOT NULL,
-                department TEXT NOT NULL
-            )''')
-
-            # Create student table
-            c.execute('''CREATE TABLE IF NOT EXISTS student (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                firstName TEXT NOT NULL,
-                lastName TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                dateOfBirth TEXT NOT NULL,
-                address TEXT NOT NULL,
-                phoneNumber INTEGER UNIQUE NOT NULL
-            )''')
-
-            # Create parent_guardian table
-            c.execute('''CREATE TABLE IF NOT EXISTS parent_guardian (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                firstName TEXT NOT NULL,
-                lastName TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                phoneNumber INTEGER UNIQUE NOT NULL,
-                relationToStudent TEXT NOT NULL
-            )''')
-
-            # Create enrollment table
-            c.execute('''CREATE TABLE IF NOT EXISTS enrollment (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                studentId INTEGER NOT NULL,
-                courseId INTEGER NOT NULL,
-                enrollmentDate DATE NOT NULL,
-                FOREIGN KEY (studentId) REFERENCES student(id),
-                FOREIGN KEY (courseId) REFERENCES course(id)
-            )''')
-
-            # Create grade table
-            c.execute('''CREATE TABLE IF NOT EXISTS grade (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                enrollmentId INTEGER NOT NULL,
-                gradeValue TEXT NOT NULL,
-                FOREIGN KEY (enrollmentId) REFERENCES enrollment(id)
-            )''')
-
-            # Create attendance table
-            c.execute('''CREATE TABLE IF NOT EXISTS attendance (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                enrollmentId INTEGER NOT NULL,
-                date DATE NOT NULL,
-                status TEXT NOT NULL,
-                FOREIGN KEY (enrollmentId) REFERENCES enrollment(id)
-            )''')
-
-            # Create supporting_staff table
-            c.execute('''CREATE TABLE IF NOT EXISTS supporting_staff (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                firstName TEXT NOT NULL,
-                lastName TEXT NOT NULL,
-                role TEXT NOT NULL,
-                department TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL
-            )''')
-
-            # Create investor table
-            c.execute('''CREATE TABLE IF NOT EXISTS investor (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                firstName TEXT NOT NULL,
-                lastName TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                phoneNumber INTEGER UNIQUE NOT NULL,
-                investmentDetails TEXT NOT NULL
-            )''')
-
-            # Create exam_board table
-            c.execute('''CREATE TABLE IF NOT EXISTS exam_board (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                boardName TEXT NOT NULL,
-                contactDetails TEXT NOT NULL
-            )''')
-
-            # Create course_teacher table
-            c.execute('''CREATE TABLE IF NOT EXISTS course_teacher (
-                courseId INTEGER NOT NULL,
-                teacherId INTEGER NOT NULL,
-                PRIMARY KEY (courseId, teacherId),
-                FOREIGN KEY (courseId) REFERENCES course(id),
-                FOREIGN KEY (teacherId) REFERENCES teachers(id)
-            )''')
-
-            # Create course_exam_board table
-            c.execute('''CREATE TABLE IF NOT EXISTS course_exam_board (
-                courseId INTEGER NOT NULL,
-                examBoardId INTEGER NOT NULL,
-                PRIMARY KEY (courseId, examBoardId),
-                FOREIGN KEY (courseId) REFERENCES course(id),
-                FOREIGN KEY (examBoardId) REFERENCES exam_board(id)
-            )''')
-            
-            conn.commit()
+            return run_migrations(conn)
         except Error as e:
-            print(f"Error creating tables: {e}")
+            app.logger.error('Error creating tables: %s', e)
+        finally:
+            conn.close()
+    return []
+
+# The schema is no longer created at import time. Each process checks
+# PRAGMA user_version once, on its first request, and only touches DDL when
+# migrations are pending and AUTO_MIGRATE is on.
+schema_ready = threading.Event()
+schema_lock = threading.Lock()
+
+@app.before_request
+def ensure_schema():
+    if schema_ready.is_set():
+        return None
+    with schema_lock:
+        if schema_ready.is_set():
+            return None
+        conn = get_write_connection()
+        try:
+            pending = get_pending_migrations(conn)
+            if pending and app.config['AUTO_MIGRATE']:
+                run_migrations(conn)
+                pending = []
+        except Error as e:
+            return jsonify({"error": str(e)}), 500
+        finally:
+            conn.close()
+        if pending:
+            return jsonify({'message': 'Database schema is out of date, run "flask db upgrade"'}), 503
+        schema_ready.set()
+    return None
+
+db_cli = AppGroup('db', help='Database schema commands.')
+app.cli.add_command(db_cli)
+
+@db_cli.command('upgrade')
+def db_upgrade():
+    """Apply pending schema migrations."""
+    applied = init_db()
+    if applied:
+        click.echo(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        click.echo('Schema is up to date')
+
+@db_cli.command('rebuild-summaries')
+def db_rebuild_summaries():
+    """Recompute the attendance and grade summary tables and access scopes."""
+    conn = get_write_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        rebuild_summaries(conn.cursor())
+        rebuild_access_scope(conn.cursor())
+        conn.commit()
+        click.echo('Summaries rebuilt')
+    finally:
+        conn.close()
+
+@db_cli.command('rebuild-search')
+def db_rebuild_search():
+    """Re-index the student, teacher and parent search tables."""
+    conn = get_write_connection()
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        rebuild_search(conn.cursor())
+        conn.commit()
+        click.echo('Search indexes rebuilt')
+    finally:
+        conn.close()
+
+@db_cli.command('prune-changes')
+@click.option('--days', type=int, default=None,
+              help='Keep this many days of changes (CHANGE_LOG_DAYS by default).')
+def db_prune_changes(days):
+    """Delete old rows from the change log."""
+    if days is None:
+        days = app.config['CHANGE_LOG_DAYS']
+    conn = get_write_connection()
+    try:
+        cursor = conn.execute("DELETE FROM change_log WHERE createdAt < datetime('now', ?)",
+                              (f'-{days} days',))
+        conn.commit()
+        click.echo(f'Deleted {cursor.rowcount} changes')
+    finally:
+        conn.close()
+
+@db_cli.command('status')
+def db_status():
+    """Show the current and latest schema version."""
+    conn = get_write_connection()
+    try:
+        click.echo(f'Schema version: {get_schema_version(conn)} (latest {SCHEMA_VERSION})')
+        pending = get_pending_migrations(conn)
+        if pending:
+            click.echo(f"Pending migrations: {', '.join(str(v) for v in pending)}")
+    finally:
+        conn.close()
+
+# Authenticated user rows keyed by user id, so token_required can skip the
+# users lookup. Anything that writes to users must call invalidate_user().
+user_cache = TTLCache(maxsize=app.config['USER_CACHE_SIZE'],
+                      ttl=app.config['USER_CACHE_TTL'])
+
+def invalidate_user(user_id):
+    user_cache.invalidate(user_id)
+
+def load_token_versions(stamp):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT version FROM table_version WHERE tableName = 'users'")
+        row = cursor.fetchone()
+        version = row['version'] if row else None
+        if version is not None and version == stamp:
+            return None
+        cursor.execute('SELECT id, tokenVersion FROM users WHERE tokenVersion > 0')
+        return version, {row['id']: row['tokenVersion'] for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+token_versions = TokenVersionTable(load_token_versions,
+                                   interval=app.config['TOKEN_VERSION_REFRESH'])
+
+def issue_token(user, token_type='access'):
+    ttl = app.config['ACCESS_TOKEN_TTL' if token_type == 'access' else 'REFRESH_TOKEN_TTL']
+    claims = {
+        'user_id': user['id'],
+        'ver': user['tokenVersion'],
+        'typ': token_type,
+        'exp': datetime.utcnow() + timedelta(seconds=ttl),
+    }
+    if token_type == 'access':
+        claims['role'] = user['role']
+        claims['reference_id'] = user['reference_id']
+    return jwt.encode(claims, app.config['SECRET_KEY'])
+
+# Bump a user's token version, revoking every token issued to them so far
+def revoke_tokens(user_id):
+    def bump(conn):
+        cursor = conn.cursor()
+        cursor.execute('UPDATE users SET tokenVersion = tokenVersion + 1 WHERE id = ?', (user_id,))
+        cursor.execute('SELECT tokenVersion FROM users WHERE id = ?', (user_id,))
+        return cursor.fetchone()
+
+    row = db_writer.run(bump)
+    if row is not None:
+        token_versions.set(user_id, row['tokenVersion'])
+    invalidate_user(user_id)
+    return row is not None
+
+def load_user(user_id):
+    user = user_cache.get(user_id)
+    if user is None:
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+            user = cursor.fetchone()
         finally:
             conn.close()
+        if user:
+            user_cache.set(user_id, user)
+    return user
+
+# bcrypt runs on its own bounded pool; see hashing.py
+password_hasher = PasswordHasher(rounds=app.config['BCRYPT_ROUNDS'],
+                                 workers=app.config['HASH_WORKERS'],
+                                 max_queue=app.config['HASH_QUEUE_DEPTH'],
+                                 retry_after=app.config['HASH_RETRY_AFTER'])
+
+# Marks views that spend most of their time in bcrypt. The ASGI server runs
+# them on the hasher's own pool (see asgi.py), so no request thread waits
+# for the hash.
+def hashes_passwords(f):
+    f.hashes_passwords = True
+    return f
+
+@app.errorhandler(WriteQueueClosed)
+def handle_write_queue_closed(e):
+    return jsonify({'message': 'Server is shutting down'}), 503
+
+export_jobs = ExportManager(db_pool, app.config['EXPORT_DIR'],
+                            workers=app.config['EXPORT_WORKERS'],
+                            max_jobs=app.config['EXPORT_MAX_JOBS'],
+                            retention=app.config['EXPORT_RETENTION'])
+atexit.register(export_jobs.shutdown)
 
-# Initialize the database
-init_db()
+@app.errorhandler(ExportBusy)
+def handle_export_busy(e):
+    return jsonify({'message': 'Too many export jobs, please retry'}), 429, {'Retry-After': str(e.retry_after)}
+
+@app.errorhandler(HasherBusy)
+def handle_hasher_busy(e):
+    return jsonify({'message': 'Server busy, please retry'}), 503, {'Retry-After': str(e.retry_after)}
+
+# Marks views that also take the token as ?access_token, for clients that
+# cannot set headers (EventSource). Put it below role_required so
+# token_required sees it.
+def token_in_query(f):
+    f.token_in_query = True
+    return f
 
 # Authentication decorator
 def token_required(f):
+    query_token = getattr(f, 'token_in_query', False)
+
     @wraps(f)
     def decorated(*args, **kwargs):
+        auth_start = time.perf_counter()
         token = None
         
         if 'Authorization' in request.headers:
             token = request.headers['Authorization'].split(" ")[1]
+        elif query_token:
+            token = request.args.get('access_token')
         
         if not token:
             return jsonify({'message': 'Token is missing'}), 401
         
         try:
             data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute('SELECT * FROM users WHERE id = ?', (data['user_id'],))
-            current_user = cursor.fetchone()
-            conn.close()
+            if data.get('typ', 'access') != 'access':
+                return jsonify({'message': 'Invalid token'}), 401
+            if data.get('ver', 0) != token_versions.get(data['user_id']):
+                return jsonify({'message': 'Token has been revoked'}), 401
+
+            if (app.config['AUTH_MODE'] == 'claims' and request.method in ('GET', 'HEAD')
+                    and 'role' in data):
+                current_user = {'id': data['user_id'], 'role': data['role'],
+                                'reference_id': data.get('reference_id')}
+            else:
+                current_user = load_user(data['user_id'])
             
             if not current_user:
                 return jsonify({'message': 'Invalid token'}), 401
                 
             g.current_user = current_user
+            g.auth_seconds = time.perf_counter() - auth_start
         except:
             return jsonify({'message': 'Invalid token'}), 401
         
@@ -237,8 +466,256 @@ def role_required(allowed_roles):
         return decorated_function
     return decorator
 
+# Column definitions used by the list endpoints
+COURSE_FIELDS = ['id', 'courseName', 'courseDescription', 'credits']
+STUDENT_FIELDS = ['id', 'firstName', 'lastName', 'email', 'dateOfBirth', 'address', 'phoneNumber']
+TEACHER_FIELDS = ['id', 'firstName', 'lastName', 'email', 'phoneNumber', 'department']
+PARENT_FIELDS = ['id', 'firstName', 'lastName', 'email', 'phoneNumber', 'relationToStudent']
+GRADE_FIELDS = ['id', 'enrollmentId', 'gradeValue']
+ATTENDANCE_FIELDS = ['id', 'enrollmentId', 'date', 'status']
+ENROLLMENT_FIELDS = ['id', 'studentId', 'courseId', 'enrollmentDate']
+
+STUDENT_NAME_COLUMNS = [('studentFirstName', 's.firstName'), ('studentLastName', 's.lastName')]
+COURSE_NAME_COLUMNS = [('courseName', 'c.courseName')]
+
+# Finished list bodies keyed by their ETag. The ETag already covers the
+# route, query string, role scope, format and the version of every table
+# read, so a write to any of those tables retires the old entries by itself.
+response_cache = create_response_cache(
+    app.config['RESPONSE_CACHE'],
+    path=app.config['RESPONSE_CACHE_PATH'],
+    max_bytes=app.config['RESPONSE_CACHE_MAX_BYTES'],
+    ttl=app.config['RESPONSE_CACHE_TTL'])
+
+# List format chosen by the Accept header: json (default), ndjson, columns
+# (application/vnd.columns+json) or msgpack (when msgpack is installed)
+def response_format():
+    return negotiate_format(request.accept_mimetypes)
+
+# Streaming is requested with Accept: application/x-ndjson or ?stream=1
+def wants_ndjson():
+    return response_format() == 'ndjson'
+
+def wants_stream():
+    fmt = response_format()
+    return fmt == 'ndjson' or (fmt == 'json' and request.args.get('stream') in ('1', 'true'))
+
+# List queries are built with json_rows=True and read as plain tuples of
+# (json object text, key), skipping dict_factory
+def execute_tuples(conn, sql, params):
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(sql, params)
+    return cursor
+
+def join_json_rows(rows):
+    return '[' + ','.join([row[0] for row in rows]) + ']'
+
+def json_body(body, status=200):
+    return Response(body, status=status, mimetype='application/json')
+
+# Conditional GET. Each versioned table has a change counter bumped by
+# triggers (see schema.py). The ETag covers the counters of every table a
+# response reads plus whatever else selects the representation: the path and
+# query string, the caller's role scope and the format. Counters are read
+# before the data, so a write in between can only make the ETag stale, never
+# pair an old body with a new ETag.
+def version_etag(conn, tables, *extra):
+    placeholders = ', '.join('?' for _ in tables)
+    rows = execute_tuples(conn, f'''
+        SELECT tableName, version, updatedAt FROM table_version
+        WHERE tableName IN ({placeholders}) ORDER BY tableName
+    ''', list(tables)).fetchall()
+    user = g.current_user
+    key = repr((request.path, sorted(request.args.items(multi=True)), user['role'],
+                user['reference_id'], response_format(), [row[:2] for row in rows], extra))
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    last_modified = max((row[2] for row in rows), default=None)
+    if last_modified is not None:
+        last_modified = datetime.strptime(last_modified, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return etag, last_modified
+
+# Only the ETag validates. Last-Modified is sent for information but has
+# one-second resolution, so If-Modified-Since would answer 304 for a write
+# made in the same second as the copy the client holds. Compressed bodies
+# carry the weak form of the ETag (see compress_response), so both forms match.
+def is_not_modified(etag):
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+def add_validators(response, etag, last_modified):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.update(('Authorization', 'Accept'))
+    return response
+
+def not_modified_response(etag, last_modified):
+    return add_validators(Response(status=304), etag, last_modified)
+
+# Stream the rows of a query straight from the cursor. The rows are read on
+# a connection of their own because the handler releases its connection
+# before the response body is produced.
+def stream_response(sql, params):
+    conn = db_pool.acquire_detached()
+    try:
+        cursor = execute_tuples(conn, sql, params)
+    except Error:
+        conn.close()
+        raise
+
+    ndjson = wants_ndjson()
+    encode = iter_ndjson if ndjson else iter_json_array
+
+    def generate():
+        try:
+            yield from encode(iter_rows(cursor))
+        finally:
+            conn.close()
+
+    return Response(generate(), mimetype=NDJSON_MIMETYPE if ndjson else 'application/json')
+
+# Run a list query with the caller's limit/after/fields and return the rows.
+# Paginated requests get a {data, next_cursor} envelope, otherwise a plain list.
+# tables lists every table the query reads; when given, the response carries
+# an ETag, a matching If-None-Match is answered with 304 without running the
+# query, and non-streamed bodies are served from response_cache.
+def list_response(conn, query, tables=None):
+    fmt = response_format()
+    try:
+        list_args = ListArgs.from_request(request.args)
+        columns = [name for name, _ in query.select_columns(list_args.fields)]
+        if fmt == 'msgpack':
+            sql, params = query.build(list_args, with_key=True)
+        else:
+            sql, params = query.build(list_args, json_rows='array' if fmt == 'columns' else True)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    if tables is None:
+        return build_list_response(conn, list_args, sql, params, columns, fmt)
+
+    etag, last_modified = version_etag(conn, tables)
+    if is_not_modified(etag):
+        return not_modified_response(etag, last_modified)
+    if wants_stream():
+        return add_validators(stream_response(sql, params), etag, last_modified)
+
+    cached = response_cache.get(etag)
+    if cached is not None:
+        mimetype, body = cached
+        return add_validators(Response(body, mimetype=mimetype), etag, last_modified)
+
+    response = build_list_response(conn, list_args, sql, params, columns, fmt)
+    response_cache.set(etag, response.mimetype, response.get_data())
+    return add_validators(response, etag, last_modified)
+
+# The columns and msgpack formats name the columns once and send each row as
+# an array of values: {"columns": [...], "rows": [[...], ...]}, plus
+# next_cursor and limit when paginated
+def build_list_response(conn, list_args, sql, params, columns, fmt='json'):
+    if wants_stream():
+        return stream_response(sql, params)
+
+    rows = execute_tuples(conn, sql, params).fetchall()
+    next_cursor = None
+    if list_args.paginated and len(rows) == list_args.limit:
+        next_cursor = rows[-1][-1]
+
+    if fmt == 'msgpack':
+        body = {'columns': columns, 'rows': [row[:-1] for row in rows]}
+        if list_args.paginated:
+            body.update(next_cursor=next_cursor, limit=list_args.limit)
+        return Response(pack_msgpack(body), mimetype=MSGPACK_MIMETYPE)
+
+    if fmt == 'columns':
+        body = '{"columns":%s,"rows":%s' % (app.json.dumps(columns), join_json_rows(rows))
+        if list_args.paginated:
+            body += ',"next_cursor":%s,"limit":%d' % (app.json.dumps(next_cursor), list_args.limit)
+        return Response(body + '}\n', mimetype=COLUMNS_MIMETYPE)
+
+    if not list_args.paginated:
+        return json_body(join_json_rows(rows) + '\n')
+    return json_body('{"data":%s,"next_cursor":%s,"limit":%d}\n' % (
+        join_json_rows(rows), app.json.dumps(next_cursor), list_args.limit))
+
+# Compress finished bodies for clients that accept it. Bodies with an ETag
+# are list or report responses; their compressed form is kept in
+# response_cache next to the plain one, so a repeat request costs neither
+# the query nor the compression. A compressed body gets the weak form of the
+# ETag since it is not byte-identical to the plain one.
+@app.after_request
+def compress_response(response):
+    if (not app.config['COMPRESS'] or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None or len(response.get_data()) < app.config['COMPRESS_MIN_BYTES']:
+        return response
+
+    etag, _ = response.get_etag()
+    body = None
+    if etag:
+        key = f'{etag}:{encoding}'
+        cached = response_cache.get(key)
+        if cached is not None:
+            body = cached[1]
+    if body is None:
+        body = compress(response.get_data(), encoding, app.config['COMPRESS_LEVEL'],
+                        app.config['BROTLI_QUALITY'])
+        if etag:
+            response_cache.set(key, response.mimetype, body)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
+# Insert a JSON array of rows in one transaction. ?dry_run=1 validates and
+# checks constraints without writing anything.
+# check(cursor, items, errors), when given, adds errors for fields the spec
+# does not know about; after_write(conn, items, ids) runs in the same write
+# job once the rows are inserted (not on dry runs)
+def bulk_response(spec, delay=None, check=None, after_write=None):
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'Expected a non-empty JSON array'}), 400
+    if len(items) > MAX_BULK_ROWS:
+        return jsonify({'message': f'At most {MAX_BULK_ROWS} rows per request'}), 413
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+
+    conn = get_db_connection()
+    try:
+        errors = validate_bulk(conn.cursor(), spec, items)
+        if check is not None:
+            check(conn.cursor(), items, errors)
+
+        def write(write_conn):
+            result, errors = write_bulk(write_conn, spec, items, dry_run)
+            if after_write is not None and result is not None and not dry_run:
+                after_write(write_conn, items, result['ids'])
+            return result, errors
+
+        if not errors:
+            result, errors = db_writer.run(write, rows=len(items), delay=delay)
+        if errors:
+            return jsonify({
+                'message': 'Validation failed',
+                'errors': [{'index': index, 'errors': messages}
+                           for index, messages in sorted(errors.items())]
+            }), 400
+        return jsonify(result), 200 if dry_run else 201
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
 # Authentication Routes
 @app.route('/api/auth/register', methods=['POST'])
+@hashes_passwords
 def register():
     conn = get_db_connection()
     try:
@@ -252,15 +729,15 @@ def register():
             return jsonify({'message': 'Username or email already exists'}), 400
         
         # Hash the password
-        hashed_password = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt())
+        hashed_password = password_hasher.hash(data['password'])
         
-        cursor.execute('''
+        user_id = db_writer.execute('''
             INSERT INTO users (username, password, role, reference_id, email)
             VALUES (?, ?, ?, ?, ?)
         ''', (data['username'], hashed_password, data['role'], 
               data.get('reference_id'), data['email']))
         
-        conn.commit()
+        invalidate_user(user_id)
         return jsonify({'message': 'User created successfully'}), 201
         
     except Error as e:
@@ -269,6 +746,7 @@ def register():
         conn.close()
 
 @app.route('/api/auth/login', methods=['POST'])
+@hashes_passwords
 def login():
     conn = get_db_connection()
     try:
@@ -278,16 +756,11 @@ def login():
         cursor.execute('SELECT * FROM users WHERE username = ?', (data['username'],))
         user = cursor.fetchone()
         
-        if user and bcrypt.checkpw(data['password'].encode('utf-8'), user['password']):
-            # Generate token
-            token = jwt.encode({
-                'user_id': user['id'],
-                'role': user['role'],
-                'exp': datetime.utcnow() + timedelta(hours=24)
-            }, app.config['SECRET_KEY'])
-            
+        if user and password_hasher.check(data['password'], user['password']):
             return jsonify({
-                'token': token,
+                'token': issue_token(user),
+                'refresh_token': issue_token(user, 'refresh'),
+                'expires_in': app.config['ACCESS_TOKEN_TTL'],
                 'user': {
                     'id': user['id'],
                     'username': user['username'],
@@ -303,33 +776,65 @@ def login():
     finally:
         conn.close()
 
+# Exchange a refresh token for a new access token. The users row is read
+# here, so role changes and revocations take effect at the next refresh.
+@app.route('/api/auth/refresh', methods=['POST'])
+def refresh_token():
+    token = (request.get_json(silent=True) or {}).get('refresh_token')
+    if not token:
+        return jsonify({'message': 'Refresh token is missing'}), 401
+    try:
+        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return jsonify({'message': 'Invalid token'}), 401
+    if data.get('typ') != 'refresh':
+        return jsonify({'message': 'Invalid token'}), 401
+
+    invalidate_user(data['user_id'])
+    user = load_user(data['user_id'])
+    if not user or user['tokenVersion'] != data.get('ver'):
+        return jsonify({'message': 'Token has been revoked'}), 401
+    return jsonify({'token': issue_token(user), 'expires_in': app.config['ACCESS_TOKEN_TTL']})
+
+# Revoke every token of the caller, on every device
+@app.route('/api/auth/logout', methods=['POST'])
+@token_required
+def logout():
+    revoke_tokens(g.current_user['id'])
+    return jsonify({'message': 'Logged out'})
+
+@app.route('/api/users/<int:user_id>/revoke-tokens', methods=['POST'])
+@token_required
+@role_required(['admin'])
+def revoke_user_tokens(user_id):
+    if not revoke_tokens(user_id):
+        return jsonify({'message': 'User not found'}), 404
+    return jsonify({'message': 'Tokens revoked'})
+
 # Course Routes
+def courses_query(current_user):
+    columns = table_columns('c', COURSE_FIELDS)
+
+    if current_user['role'] == 'admin':
+        query = ListQuery(columns, 'course c', 'c.id')
+    elif current_user['role'] == 'teacher':
+        query = ListQuery(columns, """course c
+            JOIN course_teacher ct ON c.id = ct.courseId""", 'c.id',
+            where=['ct.teacherId = ?'], params=[current_user['reference_id']])
+    else:  # student
+        query = ListQuery(columns, """course c
+            JOIN enrollment e ON c.id = e.courseId""", 'c.id',
+            where=['e.studentId = ?'], params=[current_user['reference_id']])
+    return query
+
 @app.route('/api/courses', methods=['GET'])
 @token_required
 @role_required(['admin', 'teacher', 'student'])
 def get_courses():
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        current_user = g.current_user
-        
-        if current_user['role'] == 'admin':
-            cursor.execute('SELECT * FROM course')
-        elif current_user['role'] == 'teacher':
-            cursor.execute('''
-                SELECT c.* FROM course c
-                JOIN course_teacher ct ON c.id = ct.courseId
-                WHERE ct.teacherId = ?
-            ''', (current_user['reference_id'],))
-        else:  # student
-            cursor.execute('''
-                SELECT c.* FROM course c
-                JOIN enrollment e ON c.id = e.courseId
-                WHERE e.studentId = ?
-            ''', (current_user['reference_id'],))
-            
-        courses = cursor.fetchall()
-        return jsonify(courses)
+        return list_response(conn, courses_query(g.current_user),
+                             tables=['course', 'course_teacher', 'enrollment'])
     except Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -339,43 +844,51 @@ def get_courses():
 @token_required
 @role_required(['admin'])
 def create_course():
-    conn = get_db_connection()
     try:
         data = request.json
-        cursor = conn.cursor()
-        cursor.execute('''
+        new_id = db_writer.execute('''
             INSERT INTO course (courseName, courseDescription, credits)
             VALUES (?, ?, ?)
         ''', (data['courseName'], data['courseDescription'], data['credits']))
-        conn.commit()
-        return jsonify({"id": cursor.lastrowid, **data}), 201
+        return jsonify({"id": new_id, **data}), 201
     except Error as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
+
+COURSE_BULK = BulkInsert('course', [
+    ('courseName', str), ('courseDescription', str), ('credits', int)])
+
+@app.route('/api/courses/bulk', methods=['POST'])
+@token_required
+@role_required(['admin'])
+def create_courses_bulk():
+    return bulk_response(COURSE_BULK)
+
+# Teachers and parents see the enrollments listed for them in
+# enrollment_scope, which triggers keep current (see schema.py)
+def scope_filter(column, current_user, scope_column='enrollmentId'):
+    return (f'''{column} IN (SELECT {scope_column} FROM enrollment_scope
+            WHERE viewerRole = ? AND viewerId = ?)''',
+            [current_user['role'], current_user['reference_id']])
 
 # Student Routes
+def students_query(current_user):
+    columns = table_columns('s', STUDENT_FIELDS)
+
+    if current_user['role'] == 'admin':
+        query = ListQuery(columns, 'student s', 's.id')
+    else:  # teacher
+        where, params = scope_filter('s.id', current_user, 'studentId')
+        query = ListQuery(columns, 'student s', 's.id', where=[where], params=params)
+    return query
+
 @app.route('/api/students', methods=['GET'])
 @token_required
 @role_required(['admin', 'teacher'])
 def get_students():
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        current_user = g.current_user
-        
-        if current_user['role'] == 'admin':
-            cursor.execute('SELECT * FROM student')
-        else:  # teacher
-            cursor.execute('''
-                SELECT DISTINCT s.* FROM student s
-                JOIN enrollment e ON s.id = e.studentId
-                JOIN course_teacher ct ON e.courseId = ct.courseId
-                WHERE ct.teacherId = ?
-            ''', (current_user['reference_id'],))
-            
-        students = cursor.fetchall()
-        return jsonify(students)
+        return list_response(conn, students_query(g.current_user),
+                             tables=['student', 'enrollment', 'course_teacher'])
     except Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -385,76 +898,55 @@ def get_students():
 @token_required
 @role_required(['admin'])
 def create_student():
-    conn = get_db_connection()        
-    print(request.json)
     try:
         data = request.json
-        cursor = conn.cursor()
-        cursor.execute('''
+        new_id = db_writer.execute('''
             INSERT INTO student (firstName, lastName, email, dateOfBirth, address, phoneNumber)
             VALUES (?, ?, ?, ?, ?, ?)
         ''', (data['firstName'], data['lastName'], data['email'], 
               data['dateOfBirth'], data['address'], data['phoneNumber']))
-        conn.commit()
-
-        return jsonify({"id": cursor.lastrowid, **data}), 201
+        return jsonify({"id": new_id, **data}), 201
     except Error as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
+
+STUDENT_BULK = BulkInsert('student', [
+    ('firstName', str), ('lastName', str), ('email', str),
+    ('dateOfBirth', str), ('address', str), ('phoneNumber', None)])
+
+@app.route('/api/students/bulk', methods=['POST'])
+@token_required
+@role_required(['admin'])
+def create_students_bulk():
+    return bulk_response(STUDENT_BULK)
 
 # Grade Routes
+def grades_query(current_user):
+    columns = table_columns('g', GRADE_FIELDS) + STUDENT_NAME_COLUMNS + COURSE_NAME_COLUMNS
+    joins = """grade g
+            JOIN enrollment e ON g.enrollmentId = e.id
+            JOIN student s ON e.studentId = s.id
+            JOIN course c ON e.courseId = c.id"""
+
+    if current_user['role'] == 'admin':
+        query = ListQuery(columns, joins, 'g.id')
+    elif current_user['role'] == 'student':
+        query = ListQuery(table_columns('g', GRADE_FIELDS) + COURSE_NAME_COLUMNS, """grade g
+            JOIN enrollment e ON g.enrollmentId = e.id
+            JOIN course c ON e.courseId = c.id""", 'g.id',
+            where=['e.studentId = ?'], params=[current_user['reference_id']])
+    else:  # teacher, parent
+        where, params = scope_filter('g.enrollmentId', current_user)
+        query = ListQuery(columns, joins, 'g.id', where=[where], params=params)
+    return query
+
 @app.route('/api/grades', methods=['GET'])
 @token_required
 @role_required(['admin', 'teacher', 'student', 'parent'])
 def get_grades():
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        current_user = g.current_user
-        
-        if current_user['role'] == 'admin':
-            cursor.execute('''
-                SELECT g.*, s.firstName as studentFirstName, s.lastName as studentLastName,
-                       c.courseName
-                FROM grade g
-                JOIN enrollment e ON g.enrollmentId = e.id
-                JOIN student s ON e.studentId = s.id
-                JOIN course c ON e.courseId = c.id
-            ''')
-        elif current_user['role'] == 'teacher':
-            cursor.execute('''
-                SELECT g.*, s.firstName as studentFirstName, s.lastName as studentLastName,
-                       c.courseName
-                FROM grade g
-                JOIN enrollment e ON g.enrollmentId = e.id
-                JOIN student s ON e.studentId = s.id
-                JOIN course c ON e.courseId = c.id
-                JOIN course_teacher ct ON e.courseId = ct.courseId
-                WHERE ct.teacherId = ?
-            ''', (current_user['reference_id'],))
-        elif current_user['role'] == 'student':
-            cursor.execute('''
-                SELECT g.*, c.courseName
-                FROM grade g
-                JOIN enrollment e ON g.enrollmentId = e.id
-                JOIN course c ON e.courseId = c.id
-                WHERE e.studentId = ?
-            ''', (current_user['reference_id'],))
-        else:  # parent
-            cursor.execute('''
-                SELECT g.*, s.firstName as studentFirstName, s.lastName as studentLastName,
-                       c.courseName
-                FROM grade g
-                JOIN enrollment e ON g.enrollmentId = e.id
-                JOIN student s ON e.studentId = s.id
-                JOIN course c ON e.courseId = c.id
-                JOIN parent_guardian pg ON s.id = ?
-                WHERE pg.id = ?
-            ''', (current_user['reference_id'], current_user['reference_id']))
-            
-        grades = cursor.fetchall()
-        return jsonify(grades)
+        return list_response(conn, grades_query(g.current_user), tables=[
+            'grade', 'enrollment', 'student', 'course', 'course_teacher', 'parent_student'])
     except Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -464,65 +956,48 @@ def get_grades():
 @token_required
 @role_required(['admin', 'teacher'])
 def create_grade():
-    conn = get_db_connection()
     try:
         data = request.json
-        cursor = conn.cursor()
-        cursor.execute('''
+        new_id = db_writer.execute('''
             INSERT INTO grade (enrollmentId, gradeValue)
             VALUES (?, ?)
         ''', (data['enrollmentId'], data['gradeValue']))
-        conn.commit()
-        return jsonify({"id": cursor.lastrowid, **data}), 201
+        return jsonify({"id": new_id, **data}), 201
     except Error as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
+
+GRADE_BULK = BulkInsert('grade', [('enrollmentId', int), ('gradeValue', str)],
+                        references={'enrollmentId': 'enrollment'})
+
+@app.route('/api/grades/bulk', methods=['POST'])
+@token_required
+@role_required(['admin', 'teacher'])
+def create_grades_bulk():
+    return bulk_response(GRADE_BULK)
 
 # Attendance Routes
+def attendance_query(current_user):
+    columns = table_columns('a', ATTENDANCE_FIELDS) + STUDENT_NAME_COLUMNS + COURSE_NAME_COLUMNS
+    joins = """attendance a
+            JOIN enrollment e ON a.enrollmentId = e.id
+            JOIN student s ON e.studentId = s.id
+            JOIN course c ON e.courseId = c.id"""
+
+    if current_user['role'] == 'admin':
+        query = ListQuery(columns, joins, 'a.id')
+    else:  # teacher, parent
+        where, params = scope_filter('a.enrollmentId', current_user)
+        query = ListQuery(columns, joins, 'a.id', where=[where], params=params)
+    return query
+
 @app.route('/api/attendance', methods=['GET'])
 @token_required
 @role_required(['admin', 'teacher', 'parent'])
 def get_attendance():
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        current_user = g.current_user
-        
-        if current_user['role'] == 'admin':
-            cursor.execute('''
-                SELECT a.*, s.firstName as studentFirstName, s.lastName as studentLastName,
-                       c.courseName
-                FROM attendance a
-                JOIN enrollment e ON a.enrollmentId = e.id
-                JOIN student s ON e.studentId = s.id
-                JOIN course c ON e.courseId = c.id
-            ''')
-        elif current_user['role'] == 'teacher':
-            cursor.execute('''
-                SELECT a.*, s.firstName as studentFirstName, s.lastName as studentLastName,
-                       c.courseName
-                FROM attendance a
-                JOIN enrollment e ON a.enrollmentId = e.id
-                JOIN student s ON e.studentId = s.id
-                JOIN course c ON e.courseId = c.id
-                JOIN course_teacher ct ON e.courseId = ct.courseId
-                WHERE ct.teacherId = ?
-            ''', (current_user['reference_id'],))
-        else:  # parent
-            cursor.execute('''
-                SELECT a.*, s.firstName as studentFirstName, s.lastName as studentLastName,
-                       c.courseName
-                FROM attendance a
-                JOIN enrollment e ON a.enrollmentId = e.id
-                JOIN student s ON e.studentId = s.id
-                JOIN course c ON e.courseId = c.id
-                JOIN parent_guardian pg ON s.id = ?
-                WHERE pg.id = ?
-            ''', (current_user['reference_id'], current_user['reference_id']))
-            
-        attendance = cursor.fetchall()
-        return jsonify(attendance)
+        return list_response(conn, attendance_query(g.current_user), tables=[
+            'attendance', 'enrollment', 'student', 'course', 'course_teacher', 'parent_student'])
     except Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -532,52 +1007,49 @@ def get_attendance():
 @token_required
 @role_required(['admin', 'teacher'])
 def create_attendance():
-    conn = get_db_connection()
     try:
         data = request.json
-        cursor = conn.cursor()
-        cursor.execute('''
+        new_id = db_writer.execute('''
             INSERT INTO attendance (enrollmentId, date, status)
             VALUES (?, ?, ?)
-        ''', (data['enrollmentId'], data['date'], data['status']))
-        conn.commit()
-        return jsonify({"id": cursor.lastrowid, **data}), 201
+        ''', (data['enrollmentId'], data['date'], data['status']),
+            delay=app.config['ATTENDANCE_COMMIT_DELAY'])
+        return jsonify({"id": new_id, **data}), 201
     except Error as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
+
+ATTENDANCE_BULK = BulkInsert('attendance', [
+    ('enrollmentId', int), ('date', str), ('status', str)],
+    references={'enrollmentId': 'enrollment'})
+
+@app.route('/api/attendance/bulk', methods=['POST'])
+@token_required
+@role_required(['admin', 'teacher'])
+def create_attendance_bulk():
+    return bulk_response(ATTENDANCE_BULK, delay=app.config['ATTENDANCE_COMMIT_DELAY'])
 
 # Enrollment Routes
+def enrollments_query(current_user):
+    columns = table_columns('e', ENROLLMENT_FIELDS) + STUDENT_NAME_COLUMNS + COURSE_NAME_COLUMNS
+    joins = """enrollment e
+            JOIN student s ON e.studentId = s.id
+            JOIN course c ON e.courseId = c.id"""
+
+    if current_user['role'] == 'admin':
+        query = ListQuery(columns, joins, 'e.id')
+    else:  # teacher
+        where, params = scope_filter('e.id', current_user)
+        query = ListQuery(columns, joins, 'e.id', where=[where], params=params)
+    return query
+
 @app.route('/api/enrollments', methods=['GET'])
 @token_required
 @role_required(['admin', 'teacher'])
 def get_enrollments():
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        current_user = g.current_user
-        
-        if current_user['role'] == 'admin':
-            cursor.execute('''
-                SELECT e.*, s.firstName as studentFirstName, s.lastName as studentLastName,
-                       c.courseName
-                FROM enrollment e
-                JOIN student s ON e.studentId = s.id
-                JOIN course c ON e.courseId = c.id
-            ''')
-        else:  # teacher
-            cursor.execute('''
-                SELECT e.*, s.firstName as studentFirstName, s.lastName as studentLastName,
-                       c.courseName
-                FROM enrollment e
-                JOIN student s ON e.studentId = s.id
-                JOIN course c ON e.courseId = c.id
-                JOIN course_teacher ct ON e.courseId = ct.courseId
-                WHERE ct.teacherId = ?
-            ''', (current_user['reference_id'],))
-            
-        enrollments = cursor.fetchall()
-        return jsonify(enrollments)
+        return list_response(conn, enrollments_query(g.current_user),
+                             tables=['enrollment', 'student', 'course', 'course_teacher'])
     except Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -587,20 +1059,26 @@ def get_enrollments():
 @token_required
 @role_required(['admin'])
 def create_enrollment():
-    conn = get_db_connection()
     try:
         data = request.json
-        cursor = conn.cursor()
-        cursor.execute('''
+        new_id = db_writer.execute('''
             INSERT INTO enrollment (studentId, courseId, enrollmentDate)
             VALUES (?, ?, ?)
         ''', (data['studentId'], data['courseId'], datetime.now().strftime('%Y-%m-%d')))
-        conn.commit()
-        return jsonify({"id": cursor.lastrowid, **data}), 201
+        return jsonify({"id": new_id, **data}), 201
     except Error as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
+
+ENROLLMENT_BULK = BulkInsert('enrollment', [('studentId', int), ('courseId', int)],
+                             references={'studentId': 'student', 'courseId': 'course'},
+                             extra_columns=['enrollmentDate'],
+                             extra=lambda: (datetime.now().strftime('%Y-%m-%d'),))
+
+@app.route('/api/enrollments/bulk', methods=['POST'])
+@token_required
+@role_required(['admin'])
+def create_enrollments_bulk():
+    return bulk_response(ENROLLMENT_BULK)
 
 # Teacher Routes
 @app.route('/api/teachers', methods=['GET'])
@@ -609,10 +1087,8 @@ def create_enrollment():
 def get_teachers():
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM teachers')
-        teachers = cursor.fetchall()
-        return jsonify(teachers)
+        query = ListQuery(table_columns('t', TEACHER_FIELDS), 'teachers t', 't.id')
+        return list_response(conn, query, tables=['teachers'])
     except Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -622,41 +1098,41 @@ def get_teachers():
 @token_required
 @role_required(['admin'])
 def create_teacher():
-    conn = get_db_connection()
     try:
         data = request.json
-        cursor = conn.cursor()
-        cursor.execute('''
+        new_id = db_writer.execute('''
             INSERT INTO teachers (firstName, lastName, email, phoneNumber, department)
             VALUES (?, ?, ?, ?, ?)
         ''', (data['firstName'], data['lastName'], data['email'], 
               data['phoneNumber'], data['department']))
-        conn.commit()
-        return jsonify({"id": cursor.lastrowid, **data}), 201
+        return jsonify({"id": new_id, **data}), 201
     except Error as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
+
+TEACHER_BULK = BulkInsert('teachers', [
+    ('firstName', str), ('lastName', str), ('email', str),
+    ('phoneNumber', None), ('department', str)])
+
+@app.route('/api/teachers/bulk', methods=['POST'])
+@token_required
+@role_required(['admin'])
+def create_teachers_bulk():
+    return bulk_response(TEACHER_BULK)
 
 # Course-Teacher Assignment Routes
 @app.route('/api/course-teachers', methods=['POST'])
 @token_required
 @role_required(['admin'])
 def assign_teacher_to_course():
-    conn = get_db_connection()
     try:
         data = request.json
-        cursor = conn.cursor()
-        cursor.execute('''
+        db_writer.execute('''
             INSERT INTO course_teacher (courseId, teacherId)
             VALUES (?, ?)
         ''', (data['courseId'], data['teacherId']))
-        conn.commit()
         return jsonify({"message": "Teacher assigned to course successfully"}), 201
     except Error as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        conn.close()
 
 @app.route('/api/course-teachers/<int:course_id>', methods=['GET'])
 @token_required
@@ -664,14 +1140,10 @@ def assign_teacher_to_course():
 def get_course_teachers(course_id):
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT t.* FROM teachers t
-            JOIN course_teacher ct ON t.id = ct.teacherId
-            WHERE ct.courseId = ?
-        ''', (course_id,))
-        teachers = cursor.fetchall()
-        return jsonify(teachers)
+        query = ListQuery(table_columns('t', TEACHER_FIELDS), """teachers t
+            JOIN course_teacher ct ON t.id = ct.teacherId""", 't.id',
+            where=['ct.courseId = ?'], params=[course_id])
+        return list_response(conn, query, tables=['teachers', 'course_teacher'])
     except Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -684,10 +1156,8 @@ def get_course_teachers(course_id):
 def get_parents():
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM parent_guardian')
-        parents = cursor.fetchall()
-        return jsonify(parents)
+        query = ListQuery(table_columns('pg', PARENT_FIELDS), 'parent_guardian pg', 'pg.id')
+        return list_response(conn, query, tables=['parent_guardian'])
     except Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
@@ -700,59 +1170,855 @@ def create_parent():
     conn = get_db_connection()
     try:
         data = request.json
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO parent_guardian (firstName, lastName, email, phoneNumber, relationToStudent)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (data['firstName'], data['lastName'], data['email'], 
-              data['phoneNumber'], data['relationToStudent']))
-        conn.commit()
-        return jsonify({"id": cursor.lastrowid, **data}), 201
+        errors = {}
+        find_missing_students(conn.cursor(), [data], errors)
+        if errors:
+            return jsonify({'message': '; '.join(errors[0])}), 400
+
+        def insert(conn):
+            new_id = conn.execute('''
+                INSERT INTO parent_guardian (firstName, lastName, email, phoneNumber, relationToStudent)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (data['firstName'], data['lastName'], data['email'], 
+                  data['phoneNumber'], data['relationToStudent'])).lastrowid
+            link_parent(conn, new_id, data.get('studentIds', []))
+            return new_id
+
+        new_id = db_writer.run(insert)
+        return jsonify({"id": new_id, **data}), 201
     except Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
         conn.close()
 
-@app.route('/api/students/<int:id>', methods=['PUT'])
+PARENT_BULK = BulkInsert('parent_guardian', [
+    ('firstName', str), ('lastName', str), ('email', str),
+    ('phoneNumber', None), ('relationToStudent', str)])
+
+@app.route('/api/parents/bulk', methods=['POST'])
 @token_required
 @role_required(['admin'])
-def update_student(id):
-    conn = get_db_connection()
+def create_parents_bulk():
+    return bulk_response(PARENT_BULK, check=find_missing_students, after_write=link_new_parents)
+
+# Parent-Student Link Routes
+# A parent sees only the students linked here or through studentIds when
+# the parent is created (singly or in bulk); nothing is linked implicitly
+def link_parent(conn, parent_id, student_ids):
+    conn.executemany('''
+        INSERT OR IGNORE INTO parent_student (parentId, studentId)
+        VALUES (?, ?)
+    ''', [(parent_id, student_id) for student_id in student_ids])
+
+def link_new_parents(conn, items, ids):
+    for item, parent_id in zip(items, ids):
+        link_parent(conn, parent_id, item.get('studentIds', []))
+
+# Check the optional studentIds of parent rows, with one IN query per 500
+# distinct ids. parent_student has no enforced foreign keys, so a link to a
+# missing student would only be noticed when the parent sees nothing.
+def find_missing_students(cursor, items, errors):
+    for index, item in enumerate(items):
+        if index in errors or not isinstance(item, dict):
+            continue
+        student_ids = item.get('studentIds', [])
+        if not isinstance(student_ids, list) or any(
+                isinstance(student_id, bool) or not isinstance(student_id, int)
+                for student_id in student_ids):
+            errors.setdefault(index, []).append('studentIds must be a list of integers')
+    wanted = list({student_id for index, item in enumerate(items) if index not in errors
+                   for student_id in item.get('studentIds', [])})
+    found = set()
+    for start in range(0, len(wanted), 500):
+        chunk = wanted[start:start + 500]
+        cursor.execute(f"SELECT id FROM student WHERE id IN ({', '.join('?' for _ in chunk)})", chunk)
+        found.update(row['id'] for row in cursor.fetchall())
+    for index, item in enumerate(items):
+        if index in errors:
+            continue
+        missing = [student_id for student_id in item.get('studentIds', []) if student_id not in found]
+        if missing:
+            errors[index] = [f"studentIds {', '.join(map(str, missing))} do not exist"]
+
+@app.route('/api/parents/<int:parent_id>/students', methods=['POST'])
+@token_required
+@role_required(['admin'])
+def link_parent_student(parent_id):
     try:
         data = request.json
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE student
-            SET firstName = ?, lastName = ?, email = ?, dateOfBirth = ?, address = ?, phoneNumber = ?
-            WHERE id = ?
-        ''', (data['firstName'], data['lastName'], data['email'], 
-              data['dateOfBirth'], data['address'], data['phoneNumber'], id))
-        conn.commit()
-        
-        # Fetch updated student
-        cursor.execute('SELECT * FROM student WHERE id = ?', (id,))
-        student = cursor.fetchone()
-        return jsonify(student)
+
+        # Checked in the write job so neither row can go away in between
+        def link(conn):
+            if conn.execute('SELECT id FROM parent_guardian WHERE id = ?', (parent_id,)).fetchone() is None:
+                return 'Parent not found'
+            if conn.execute('SELECT id FROM student WHERE id = ?', (data['studentId'],)).fetchone() is None:
+                return 'Student not found'
+            link_parent(conn, parent_id, [data['studentId']])
+            return None
+
+        missing = db_writer.run(link)
+        if missing:
+            return jsonify({'message': missing}), 404
+        return jsonify({"message": "Student linked to parent successfully"}), 201
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/parents/<int:parent_id>/students/<int:student_id>', methods=['DELETE'])
+@token_required
+@role_required(['admin'])
+def unlink_parent_student(parent_id, student_id):
+    try:
+        db_writer.execute('DELETE FROM parent_student WHERE parentId = ? AND studentId = ?',
+                          (parent_id, student_id))
+        return jsonify({"message": "Student unlinked from parent successfully"})
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/parents/<int:parent_id>/students', methods=['GET'])
+@token_required
+@role_required(['admin'])
+def get_parent_students(parent_id):
+    conn = get_db_connection()
+    try:
+        query = ListQuery(table_columns('s', STUDENT_FIELDS), """student s
+            JOIN parent_student ps ON s.id = ps.studentId""", 's.id',
+            where=['ps.parentId = ?'], params=[parent_id])
+        return list_response(conn, query, tables=['student', 'parent_student'])
     except Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
         conn.close()
 
+@app.route('/api/students/<int:id>', methods=['PUT'])
+@token_required
+@role_required(['admin'])
+def update_student(id):
+    try:
+        data = request.json
+
+        def update(conn):
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE student
+                SET firstName = ?, lastName = ?, email = ?, dateOfBirth = ?, address = ?, phoneNumber = ?
+                WHERE id = ?
+            ''', (data['firstName'], data['lastName'], data['email'], 
+                  data['dateOfBirth'], data['address'], data['phoneNumber'], id))
+
+            # Fetch updated student
+            cursor.execute('SELECT * FROM student WHERE id = ?', (id,))
+            return cursor.fetchone()
+
+        return jsonify(db_writer.run(update))
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+
 # Delete student
 @app.route('/api/students/<int:id>', methods=['DELETE'])
 @token_required
 @role_required(['admin'])
 def delete_student(id):
+    try:
+        db_writer.execute('DELETE FROM student WHERE id = ?', (id,))
+        return jsonify({"message": "Student deleted successfully"})
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+
+# Admin dashboard
+DASHBOARD_RECENT = 5
+MAX_DASHBOARD_RECENT = 50
+DASHBOARD_COUNTS = [
+    ('students', 'student'),
+    ('teachers', 'teachers'),
+    ('courses', 'course'),
+    ('parents', 'parent_guardian'),
+    ('enrollments', 'enrollment'),
+]
+DASHBOARD_RECENT_QUERIES = [
+    ('students', 'student', ['id', 'firstName', 'lastName', 'email']),
+    ('teachers', 'teachers', ['id', 'firstName', 'lastName', 'department']),
+    ('courses', 'course', ['id', 'courseName', 'credits']),
+]
+DASHBOARD_TABLES = [table for _, table in DASHBOARD_COUNTS] + ['attendance']
+
+# Counts, today's attendance and the newest rows of each table in one
+# response. Everything is read inside one transaction so the numbers agree
+# with each other; the ETag comes from the table versions, so refreshing an
+# unchanged dashboard costs one lookup and a 304.
+@app.route('/api/admin/dashboard', methods=['GET'])
+@token_required
+@role_required(['admin'])
+def get_admin_dashboard():
+    recent = request.args.get('recent', DASHBOARD_RECENT, type=int)
+    if recent < 0 or recent > MAX_DASHBOARD_RECENT:
+        return jsonify({'message': f'recent must be between 0 and {MAX_DASHBOARD_RECENT}'}), 400
+
     conn = get_db_connection()
     try:
+        today = datetime.now().strftime('%Y-%m-%d')
+        etag, last_modified = version_etag(conn, DASHBOARD_TABLES, today)
+        if is_not_modified(etag):
+            return not_modified_response(etag, last_modified)
+
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM student WHERE id = ?', (id,))
-        conn.commit()
-        return jsonify({"message": "Student deleted successfully"})
+        cursor.execute('BEGIN')
+        try:
+            cursor.execute(' UNION ALL '.join(
+                f"SELECT '{name}' AS name, COUNT(*) AS total FROM {table}"
+                for name, table in DASHBOARD_COUNTS))
+            counts = {row['name']: row['total'] for row in cursor.fetchall()}
+
+            cursor.execute('''
+                SELECT date, presentCount, absentCount, totalCount
+                FROM attendance_daily_summary WHERE date = ?
+            ''', (today,))
+            attendance = cursor.fetchone() or {
+                'date': today, 'presentCount': 0, 'absentCount': 0, 'totalCount': 0}
+            attendance['rate'] = (round(attendance['presentCount'] / attendance['totalCount'], 4)
+                                  if attendance['totalCount'] else None)
+
+            recent_rows = {}
+            for name, table, fields in DASHBOARD_RECENT_QUERIES:
+                cursor.execute(f"SELECT {', '.join(fields)} FROM {table} ORDER BY id DESC LIMIT ?",
+                               (recent,))
+                recent_rows[name] = cursor.fetchall()
+        finally:
+            conn.rollback()
+
+        response = jsonify({'counts': counts, 'attendanceToday': attendance, 'recent': recent_rows})
+        return add_validators(response, etag, last_modified)
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+# Search Routes
+# Ranked prefix search over names and emails, backed by the FTS5 indexes in
+# schema.py. Teachers may only search the students of their own courses.
+SEARCH_ROLES = {
+    'admin': ['student', 'teacher', 'parent'],
+    'teacher': ['student'],
+}
+
+def search_filters(current_user):
+    if current_user['role'] == 'teacher':
+        return {'student': ('''SELECT studentId FROM enrollment_scope
+            WHERE viewerRole = 'teacher' AND viewerId = ?''', [current_user['reference_id']])}
+    return {}
+
+@app.route('/api/search', methods=['GET'])
+@token_required
+@role_required(list(SEARCH_ROLES))
+def search_people():
+    allowed = SEARCH_ROLES[g.current_user['role']]
+    try:
+        search_args = SearchArgs.from_request(request.args, allowed)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if any(t not in allowed for t in search_args.types):
+        return jsonify({'message': 'Permission denied'}), 403
+
+    conn = get_db_connection()
+    try:
+        tables = [SEARCH_TYPES[t] for t in search_args.types]
+        if g.current_user['role'] == 'teacher':
+            tables += ['enrollment', 'course_teacher']
+        etag, last_modified = version_etag(conn, tables)
+        if is_not_modified(etag):
+            return not_modified_response(etag, last_modified)
+        cached = response_cache.get(etag)
+        if cached is not None:
+            mimetype, body = cached
+            return add_validators(Response(body, mimetype=mimetype), etag, last_modified)
+
+        sql, params = build_search(search_args, search_filters(g.current_user))
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        next_cursor = None
+        if len(rows) == search_args.limit and search_args.offset + len(rows) <= MAX_SEARCH_OFFSET:
+            next_cursor = search_args.offset + len(rows)
+        response = jsonify({'data': rows, 'next_cursor': next_cursor, 'limit': search_args.limit})
+        response_cache.set(etag, response.mimetype, response.get_data())
+        return add_validators(response, etag, last_modified)
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+# Import Routes
+# Streaming imports of CSV or NDJSON files. Rows may name students by email
+# and courses by name instead of by id; those keys are resolved per chunk.
+STUDENT_BY_EMAIL = Lookup('studentId', 'student', [('studentEmail', 'email')])
+COURSE_BY_NAME = Lookup('courseId', 'course', [('courseName', 'courseName')])
+IMPORT_SPECS = {
+    'students': ImportSpec(STUDENT_BULK),
+    'enrollments': ImportSpec(ENROLLMENT_BULK, [STUDENT_BY_EMAIL, COURSE_BY_NAME]),
+    'grades': ImportSpec(GRADE_BULK, [
+        STUDENT_BY_EMAIL, COURSE_BY_NAME,
+        Lookup('enrollmentId', 'enrollment', [('studentId', 'studentId'), ('courseId', 'courseId')])]),
+}
+IMPORT_MIMETYPES = {'text/csv': 'csv', NDJSON_MIMETYPE: 'ndjson'}
+
+# The request body is read as it arrives. ?format=csv|ndjson overrides the
+# Content-Type, ?chunk=N sets the rows per transaction, ?on_error=abort stops
+# at the first bad chunk and ?dry_run=1 rolls every chunk back. With
+# Accept: application/x-ndjson one progress line is sent per chunk, followed
+# by the summary.
+@app.route('/api/import/<kind>', methods=['POST'])
+@token_required
+@role_required(['admin'])
+def import_rows(kind):
+    spec = IMPORT_SPECS.get(kind)
+    if spec is None:
+        return jsonify({'message': f"Unknown import, expected one of: {', '.join(IMPORT_SPECS)}"}), 404
+    fmt = request.args.get('format') or IMPORT_MIMETYPES.get(request.mimetype)
+    chunk_rows = request.args.get('chunk', IMPORT_CHUNK_ROWS, type=int)
+    on_error = request.args.get('on_error', 'skip')
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    try:
+        check_import_options(chunk_rows, on_error)
+        rows = read_rows(request.stream, fmt, spec)
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'message': str(e)}), 400
+
+    conn = db_pool.acquire_detached()
+    chunks = import_chunks(spec, rows, conn, db_writer, chunk_rows, dry_run, on_error)
+    if not wants_ndjson():
+        try:
+            result = None
+            for result in chunks:
+                pass
+            summary = (result or ImportResult()).to_dict()
+        except UnicodeDecodeError as e:
+            return jsonify({'message': str(e)}), 400
+        except Error as e:
+            return jsonify({"error": str(e)}), 500
+        finally:
+            conn.close()
+        return jsonify(summary), 200 if dry_run or summary['failed'] else 201
+
+    def generate():
+        try:
+            result = ImportResult()
+            for result in chunks:
+                yield app.json.dumps({'event': 'progress', **result.to_dict(include_errors=False)}) + '\n'
+            yield app.json.dumps({'event': 'done', **result.to_dict()}) + '\n'
+        except (Error, UnicodeDecodeError) as e:
+            yield app.json.dumps({'event': 'error', 'error': str(e)}) + '\n'
+        finally:
+            conn.close()
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+# Export Routes
+# Full reports are written by export_jobs in the background instead of being
+# pulled through the interactive list routes
+EXPORT_QUERIES = {
+    'grades': grades_query,
+    'attendance': attendance_query,
+    'enrollments': enrollments_query,
+    'students': students_query,
+    'courses': courses_query,
+}
+
+def export_status(job):
+    status = job.to_dict()
+    if job.status == 'done':
+        status['download'] = f'/api/exports/{job.id}/download'
+    return status
+
+# Body: {"kind": "grades", "format": "csv" | "ndjson", "fields": ["id", "gradeValue"]}
+# Answers 202 with the job status; poll it until status is done, then fetch
+# the gzip file from its download URL. Jobs are only visible to the user who
+# created them; other users get 404.
+@app.route('/api/exports', methods=['POST'])
+@token_required
+@role_required(['admin'])
+def create_export():
+    data = request.get_json(silent=True) or {}
+    build_query = EXPORT_QUERIES.get(data.get('kind'))
+    if build_query is None:
+        return jsonify({'message': f"kind must be one of: {', '.join(EXPORT_QUERIES)}"}), 400
+    fmt = data.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'message': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        fields = data.get('fields')
+        if isinstance(fields, list):
+            fields = ','.join(str(field) for field in fields)
+        list_args = ListArgs.from_request({'fields': fields})
+        query = build_query(g.current_user)
+        columns = [name for name, _ in query.select_columns(list_args.fields)]
+        sql, params = query.build(list_args, json_rows=fmt == 'ndjson')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    job = export_jobs.submit(data['kind'], fmt, g.current_user['id'], sql, params, columns)
+    return jsonify(export_status(job)), 202, {'Location': f'/api/exports/{job.id}'}
+
+@app.route('/api/exports', methods=['GET'])
+@token_required
+@role_required(['admin'])
+def list_exports():
+    return jsonify([export_status(job) for job in export_jobs.list(g.current_user['id'])])
+
+@app.route('/api/exports/<job_id>', methods=['GET'])
+@token_required
+@role_required(['admin'])
+def get_export(job_id):
+    job = export_jobs.get(job_id, g.current_user['id'])
+    if job is None:
+        return jsonify({'message': 'Export not found'}), 404
+    return jsonify(export_status(job))
+
+@app.route('/api/exports/<job_id>/download', methods=['GET'])
+@token_required
+@role_required(['admin'])
+def download_export(job_id):
+    job = export_jobs.get(job_id, g.current_user['id'])
+    if job is None:
+        return jsonify({'message': 'Export not found'}), 404
+    if job.status != 'done':
+        return jsonify({'message': f'Export is {job.status}', **export_status(job)}), 409
+    return send_file(job.path, mimetype='application/gzip', as_attachment=True,
+                     download_name=job.filename)
+
+# Change feed
+# Every insert, update and delete on the main tables is appended to
+# change_log by triggers (see schema.py), so clients can apply row deltas
+# instead of refetching whole lists. Each change is
+#   {"seq": 42, "table": "grade", "id": 7, "op": "update", "row": {...}, "createdAt": "..."}
+# with row null for deletes, filtered to the caller's role scope. A client
+# keeps the last seq it applied and passes it as `since`; without one it
+# starts from now. A `reset` (JSON: "reset": true) means changes after since
+# are no longer in the log and the client should refetch its lists.
+def changes_since():
+    since = request.args.get('since', request.headers.get('Last-Event-ID'))
+    if since in (None, ''):
+        return None
+    since = int(since)
+    if since < 0:
+        raise ValueError
+    return since
+
+@app.route('/api/changes', methods=['GET'])
+@token_required
+@role_required(['admin', 'teacher', 'student', 'parent'])
+def get_changes():
+    try:
+        since = changes_since()
+        limit = int(request.args.get('limit', CHANGES_LIMIT))
+    except ValueError:
+        return jsonify({'message': 'since and limit must be non-negative integers'}), 400
+    if not 1 <= limit <= MAX_CHANGES_LIMIT:
+        return jsonify({'message': f'limit must be between 1 and {MAX_CHANGES_LIMIT}'}), 400
+
+    conn = get_db_connection()
+    try:
+        oldest, latest = log_bounds(conn)
+        if since is None or is_stale(since, oldest, latest):
+            reset = since is not None
+            body = f'{{"data":[],"next_cursor":{latest},"reset":{"true" if reset else "false"}}}'
+        else:
+            rows, cursor = read_changes(conn, g.current_user, since, limit, latest)
+            data = ','.join(row[1] for row in rows)
+            body = f'{{"data":[{data}],"next_cursor":{cursor},"reset":false}}'
+        response = json_body(body)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
     except Error as e:
         return jsonify({"error": str(e)}), 500
     finally:
         conn.close()
 
+# Server-Sent Events version of /api/changes. Each change is a `change`
+# event whose id is its seq, so a reconnecting EventSource resumes from
+# Last-Event-ID by itself. The stream runs on a read connection of its own,
+# polls the log and ends after CHANGE_STREAM_SECONDS.
+@app.route('/api/changes/stream', methods=['GET'])
+@token_required
+@role_required(['admin', 'teacher', 'student', 'parent'])
+@token_in_query
+def stream_changes():
+    try:
+        since = changes_since()
+    except ValueError:
+        return jsonify({'message': 'since must be a non-negative integer'}), 400
+    if not change_streams.acquire(blocking=False):
+        return (jsonify({'message': 'Too many change streams, please retry'}), 503,
+                {'Retry-After': str(app.config['CHANGE_RETRY_MS'] // 1000 or 1)})
+    try:
+        conn = db_pool.acquire_detached()
+    except Error:
+        change_streams.release()
+        raise
+
+    current_user = g.current_user
+    config = app.config
+
+    def generate():
+        nonlocal since
+        yield f"retry: {config['CHANGE_RETRY_MS']}\n\n"
+        deadline = time.monotonic() + config['CHANGE_STREAM_SECONDS']
+        last_sent = time.monotonic()
+        while True:
+            generation = change_notifier.generation
+            oldest, latest = log_bounds(conn)
+            if since is None:
+                since = latest
+            elif is_stale(since, oldest, latest):
+                since = latest
+                yield format_event('reset', f'{{"seq":{latest}}}', latest)
+                last_sent = time.monotonic()
+            while since < latest:
+                rows, since = read_changes(conn, current_user, since, CHANGES_LIMIT, latest)
+                if rows:
+                    yield ''.join(format_event('change', row[1], row[0]) for row in rows)
+                    last_sent = time.monotonic()
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if now - last_sent >= config['CHANGE_HEARTBEAT_SECONDS']:
+                yield ': keepalive\n\n'
+                last_sent = now
+            change_notifier.wait(generation, min(
+                config['CHANGE_POLL_SECONDS'], deadline - now,
+                last_sent + config['CHANGE_HEARTBEAT_SECONDS'] - now))
+
+    def close():
+        conn.close()
+        change_streams.release()
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.call_on_close(close)
+    response.headers['Cache-Control'] = 'no-store'
+    # Keep proxies such as nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Summary Routes
+# Read from the summary tables maintained by triggers (see schema.py), so
+# each student or course costs one indexed row lookup
+def student_summary_query(current_user):
+    columns = [
+        ('id', 's.id'),
+        ('firstName', 's.firstName'),
+        ('lastName', 's.lastName'),
+        ('presentCount', 'COALESCE(sa.presentCount, 0)'),
+        ('absentCount', 'COALESCE(sa.absentCount, 0)'),
+        ('attendanceTotal', 'COALESCE(sa.totalCount, 0)'),
+        ('attendanceRate', 'ROUND(1.0 * sa.presentCount / NULLIF(sa.totalCount, 0), 4)'),
+        ('gradeCount', 'COALESCE(sg.gradeCount, 0)'),
+        ('gpa', 'ROUND(sg.pointsTotal / NULLIF(sg.scoredCount, 0), 2)'),
+    ]
+    joins = """student s
+            LEFT JOIN student_attendance_summary sa ON sa.studentId = s.id
+            LEFT JOIN student_grade_summary sg ON sg.studentId = s.id"""
+
+    if current_user['role'] == 'admin':
+        query = ListQuery(columns, joins, 's.id')
+    elif current_user['role'] == 'teacher':
+        where, params = scope_filter('s.id', current_user, 'studentId')
+        query = ListQuery(columns, joins, 's.id', where=[where], params=params)
+    elif current_user['role'] == 'parent':
+        query = ListQuery(columns, joins, 's.id', where=[
+            's.id IN (SELECT studentId FROM parent_student WHERE parentId = ?)'],
+            params=[current_user['reference_id']])
+    else:  # student
+        query = ListQuery(columns, joins, 's.id', where=['s.id = ?'],
+                          params=[current_user['reference_id']])
+    return query
+
+def course_summary_query(current_user):
+    columns = [
+        ('id', 'c.id'),
+        ('courseName', 'c.courseName'),
+        ('enrolledCount', 'COALESCE(cs.enrolledCount, 0)'),
+        ('gradeCount', 'COALESCE(cs.gradeCount, 0)'),
+        ('averagePoints', 'ROUND(cs.pointsTotal / NULLIF(cs.scoredCount, 0), 2)'),
+    ]
+    joins = """course c
+            LEFT JOIN course_summary cs ON cs.courseId = c.id"""
+
+    if current_user['role'] == 'admin':
+        query = ListQuery(columns, joins, 'c.id')
+    elif current_user['role'] == 'teacher':
+        query = ListQuery(columns, joins, 'c.id', where=[
+            'c.id IN (SELECT courseId FROM course_teacher WHERE teacherId = ?)'],
+            params=[current_user['reference_id']])
+    else:  # student
+        query = ListQuery(columns, joins, 'c.id', where=[
+            'c.id IN (SELECT courseId FROM enrollment WHERE studentId = ?)'],
+            params=[current_user['reference_id']])
+    return query
+
+@app.route('/api/summary/students', methods=['GET'])
+@token_required
+@role_required(['admin', 'teacher', 'student', 'parent'])
+def get_student_summaries():
+    conn = get_db_connection()
+    try:
+        return list_response(conn, student_summary_query(g.current_user), tables=[
+            'student', 'attendance', 'grade', 'enrollment', 'course_teacher', 'parent_student'])
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/summary/students/<int:id>', methods=['GET'])
+@token_required
+@role_required(['admin', 'teacher', 'student', 'parent'])
+def get_student_summary(id):
+    conn = get_db_connection()
+    try:
+        query = student_summary_query(g.current_user)
+        query.where.append('s.id = ?')
+        query.params.append(id)
+        sql, params = query.build(ListArgs())
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        summary = cursor.fetchone()
+        if not summary:
+            return jsonify({'message': 'Student not found'}), 404
+        return jsonify(summary)
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/summary/courses', methods=['GET'])
+@token_required
+@role_required(['admin', 'teacher', 'student'])
+def get_course_summaries():
+    conn = get_db_connection()
+    try:
+        return list_response(conn, course_summary_query(g.current_user),
+                             tables=['course', 'enrollment', 'grade', 'course_teacher'])
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/summary/attendance/daily', methods=['GET'])
+@token_required
+@role_required(['admin', 'staff'])
+def get_daily_attendance_summary():
+    conn = get_db_connection()
+    try:
+        etag, last_modified = version_etag(conn, ['attendance'])
+        if is_not_modified(etag):
+            return not_modified_response(etag, last_modified)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT date, presentCount, absentCount, totalCount
+            FROM attendance_daily_summary
+            WHERE date >= ? AND date <= ?
+            ORDER BY date
+        ''', (request.args.get('from', '0000-00-00'), request.args.get('to', '9999-12-31')))
+        return add_validators(jsonify(cursor.fetchall()), etag, last_modified)
+    except Error as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        conn.close()
+
+# Connection pool statistics
+@app.route('/api/db/stats', methods=['GET'])
+@token_required
+@role_required(['admin'])
+def get_db_stats():
+    return jsonify({
+        'read_pool': db_pool.get_stats(),
+        'write_pool': write_pool.get_stats(),
+        'writer': db_writer.get_stats(),
+        'exports': export_jobs.get_stats(),
+    })
+
+@app.route('/api/auth/hash-stats', methods=['GET'])
+@token_required
+@role_required(['admin'])
+def get_hash_stats():
+    return jsonify(password_hasher.get_stats())
+
+@app.route('/api/auth/cache-stats', methods=['GET'])
+@token_required
+@role_required(['admin'])
+def get_user_cache_stats():
+    return jsonify({**user_cache.get_stats(), 'token_versions': token_versions.get_stats()})
+
+@app.route('/api/cache/stats', methods=['GET'])
+@token_required
+@role_required(['admin'])
+def get_response_cache_stats():
+    return jsonify(response_cache.get_stats())
+
+@app.route('/api/cache', methods=['DELETE'])
+@token_required
+@role_required(['admin'])
+def clear_response_cache():
+    response_cache.clear()
+    return jsonify({'message': 'Response cache cleared'})
+
+# Gauges for the pool, user cache and password hasher statistics
+def collect_component_stats():
+    pools = [('read', db_pool.get_stats()), ('write', write_pool.get_stats())]
+    yield ('db_pool_connections', 'gauge', 'Pooled connections by state', [
+        ('db_pool_connections', {'pool': name, 'state': state}, pool[state])
+        for name, pool in pools for state in ('in_use', 'idle')
+    ])
+    yield ('db_pool_events_total', 'counter', 'Pool connection events', [
+        ('db_pool_events_total', {'pool': name, 'event': event}, pool[event])
+        for name, pool in pools for event in ('opened', 'reused', 'released', 'discarded')
+    ])
+    writer = db_writer.get_stats()
+    yield ('db_write_jobs_total', 'counter', 'Jobs run by the writer thread', [
+        ('db_write_jobs_total', {'result': 'ok'}, writer['jobs'] - writer['failed']),
+        ('db_write_jobs_total', {'result': 'failed'}, writer['failed']),
+    ])
+    yield ('db_write_commits_total', 'counter', 'Commits made by the writer thread', [
+        ('db_write_commits_total', {}, writer['commits']),
+    ])
+    yield ('db_write_rows_total', 'counter', 'Rows submitted to the writer thread', [
+        ('db_write_rows_total', {}, writer['rows']),
+    ])
+    yield ('db_write_queue_depth', 'gauge', 'Write jobs waiting for the writer thread', [
+        ('db_write_queue_depth', {}, writer['queued']),
+    ])
+    exports = export_jobs.get_stats()
+    yield ('export_jobs', 'gauge', 'Export jobs by state', [
+        ('export_jobs', {'state': state}, exports[state]) for state in ('queued', 'running')
+    ])
+    yield ('export_jobs_total', 'counter', 'Export jobs by outcome', [
+        ('export_jobs_total', {'result': result}, exports[result])
+        for result in ('done', 'failed', 'rejected')
+    ])
+    cache = user_cache.get_stats()
+    yield ('user_cache_requests_total', 'counter', 'User cache lookups', [
+        ('user_cache_requests_total', {'result': 'hit'}, cache['hits']),
+        ('user_cache_requests_total', {'result': 'miss'}, cache['misses']),
+    ])
+    yield ('user_cache_entries', 'gauge', 'Cached user rows', [
+        ('user_cache_entries', {}, cache['size']),
+    ])
+    responses = response_cache.get_stats()
+    if responses['backend'] != 'off':
+        yield ('response_cache_requests_total', 'counter', 'List response cache lookups', [
+            ('response_cache_requests_total', {'result': 'hit'}, responses['hits']),
+            ('response_cache_requests_total', {'result': 'miss'}, responses['misses']),
+        ])
+        yield ('response_cache_bytes', 'gauge', 'Bytes held by the list response cache', [
+            ('response_cache_bytes', {'backend': responses['backend']}, responses['bytes']),
+        ])
+        yield ('response_cache_evictions_total', 'counter', 'Entries evicted for space', [
+            ('response_cache_evictions_total', {}, responses['evictions']),
+        ])
+    hashing = password_hasher.get_stats()
+    samples = []
+    cumulative = 0
+    for bound, count in hashing['latency_buckets'].items():
+        cumulative += count
+        samples.append(('password_hash_duration_seconds_bucket', {'le': bound}, cumulative))
+    samples.append(('password_hash_duration_seconds_sum', {}, hashing['total_seconds']))
+    samples.append(('password_hash_duration_seconds_count', {}, hashing['hashes']))
+    yield ('password_hash_duration_seconds', 'histogram', 'bcrypt hash/check latency', samples)
+    yield ('password_hash_rejected_total', 'counter', 'Hashes refused because the pool was full', [
+        ('password_hash_rejected_total', {}, hashing['rejected']),
+    ])
+
+metrics.add_collector(collect_component_stats)
+
+def metrics_response():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@token_required
+@role_required(['admin'])
+def admin_metrics():
+    return metrics_response()
+
+# Prometheus metrics; accepts either METRICS_TOKEN or an admin JWT
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') == f'Bearer {token}':
+        return metrics_response()
+    return admin_metrics()
+
+# Role-scoped list queries and the non-admin roles that can run them
+ROLE_SCOPED_QUERIES = [
+    ('courses', courses_query, ['teacher', 'student']),
+    ('students', students_query, ['teacher']),
+    ('grades', grades_query, ['teacher', 'student', 'parent']),
+    ('attendance', attendance_query, ['teacher', 'parent']),
+    ('enrollments', enrollments_query, ['teacher']),
+    ('student summaries', student_summary_query, ['teacher', 'student', 'parent']),
+    ('course summaries', course_summary_query, ['teacher', 'student']),
+]
+
+# Fails if any role-scoped query reads a whole table instead of an index
+@app.cli.command('check-query-plans')
+def check_query_plans():
+    conn = get_write_connection()
+    failed = False
+    try:
+        for name, build_query, roles in ROLE_SCOPED_QUERIES:
+            for role in roles:
+                sql, params = build_query({'role': role, 'reference_id': 1}).build(ListArgs())
+                scans = find_table_scans(conn, sql, params)
+                if scans:
+                    failed = True
+                    click.echo(f"{name} ({role}): {'; '.join(scans)}")
+                else:
+                    click.echo(f"{name} ({role}): ok")
+    finally:
+        conn.close()
+    if failed:
+        raise SystemExit(1)
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORT_SPECS)))
+@click.argument('file', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS),
+              help='File format, guessed from the file extension by default.')
+@click.option('--chunk-size', default=IMPORT_CHUNK_ROWS, show_default=True,
+              help='Rows written per transaction.')
+@click.option('--on-error', type=click.Choice(['skip', 'abort']), default='skip', show_default=True)
+@click.option('--dry-run', is_flag=True, help='Validate and check constraints without writing.')
+def import_file(kind, file, fmt, chunk_size, on_error, dry_run):
+    """Import students, enrollments or grades from a CSV or NDJSON file."""
+    if fmt is None:
+        fmt = 'ndjson' if file.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+    conn = get_write_connection()
+    try:
+        pending = get_pending_migrations(conn)
+    finally:
+        conn.close()
+    if pending:
+        raise click.ClickException('Database schema is out of date, run "flask db upgrade"')
+
+    spec = IMPORT_SPECS[kind]
+    try:
+        check_import_options(chunk_size, on_error)
+        rows = read_rows(file, fmt, spec)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    conn = db_pool.acquire_detached()
+    result = ImportResult()
+    try:
+        for result in import_chunks(spec, rows, conn, db_writer, chunk_size, dry_run, on_error):
+            click.echo(f'{kind}: {result.processed} rows, {result.inserted} '
+                       f"{'checked' if dry_run else 'inserted'}, {result.failed} failed", err=True)
+    finally:
+        conn.close()
+        db_writer.close()
+
+    for error in result.errors:
+        click.echo(f"line {error['line']}: {'; '.join(error['errors'])}")
+    if result.failed > len(result.errors):
+        click.echo(f'... {result.failed - len(result.errors)} more errors')
+    if result.aborted:
+        click.echo('Import aborted')
+    if result.failed:
+        raise SystemExit(1)
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
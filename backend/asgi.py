@@ -0,0 +1,195 @@
+import asyncio
+import contextvars
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+
+from app import app, db_pool, db_writer, export_jobs, password_hasher, write_pool
+from hashing import HasherBusy
+
+# ASGI entry point, e.g.
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 4
+#
+# The Flask app runs unchanged, so routes, token_required and role_required
+# behave exactly as under WSGI. What changes is when a request holds a
+# thread: headers and the request body are read on the event loop, only the
+# view itself (SQL, JSON encoding) runs on a bounded executor, and the
+# response is written back on the event loop. Views marked hashes_passwords
+# run on the bcrypt pool instead, so a login storm queues there rather than
+# holding executor threads while they wait for hashes. Streamed bodies are
+# pulled from the executor one chunk at a time, so a slow reader does not
+# pin a thread between chunks, and idle keep-alive connections cost a socket
+# instead of a thread.
+#
+# A response's chunks may be pulled on different executor threads, so every
+# call for one request runs in that request's own contextvars context. The
+# request context that stream_with_context keeps pushed between chunks
+# lives there, not in whichever thread happens to resume the generator.
+
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', min(32, (os.cpu_count() or 1) + 4)))
+# Requests waiting for a thread beyond this are answered 503 straight away
+ASGI_MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', 1024))
+ASGI_RETRY_AFTER = int(os.environ.get('ASGI_RETRY_AFTER', 1))
+# Request bodies larger than this are spooled to a temporary file
+SPOOL_BYTES = 1024 * 1024
+
+executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='asgi')
+pending = 0
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+async def read_body(receive):
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            body.close()
+            return None
+        body.write(message.get('body', b''))
+        if not message.get('more_body'):
+            body.seek(0)
+            return body
+
+# Runs on the executor: call the Flask app and collect the status, headers
+# and first chunk. Bodies with a Content-Length are already in memory, so
+# they are drained here in one go.
+def start_app(environ):
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    iterable = app(environ, start_response)
+    iterator = iter(iterable)
+    try:
+        first = next(iterator, None)
+        status, headers = started
+        if any(name.lower() == 'content-length' for name, _ in headers):
+            chunks = [] if first is None else [first]
+            chunks.extend(iterator)
+            return status, headers, iterable, None, b''.join(chunks)
+        return status, headers, iterable, iterator, first
+    except BaseException:
+        close_iterable(iterable)
+        raise
+
+def hashes_passwords(environ):
+    try:
+        endpoint, _ = app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return False
+    return getattr(app.view_functions.get(endpoint), 'hashes_passwords', False)
+
+def close_iterable(iterable):
+    close = getattr(iterable, 'close', None)
+    if close is not None:
+        close()
+
+async def handle_http(scope, receive, send):
+    global pending
+    body = await read_body(receive)
+    if body is None:
+        return
+
+    loop = asyncio.get_running_loop()
+    if pending >= ASGI_MAX_PENDING:
+        body.close()
+        await send({'type': 'http.response.start', 'status': 503,
+                    'headers': [(b'content-type', b'application/json'),
+                                (b'retry-after', str(ASGI_RETRY_AFTER).encode())]})
+        await send({'type': 'http.response.body', 'body': b'{"message":"Server is busy"}\n'})
+        return
+
+    environ = build_environ(scope, body)
+    context = contextvars.copy_context()
+    pending += 1
+    try:
+        future = None
+        if hashes_passwords(environ):
+            try:
+                future = asyncio.wrap_future(password_hasher.submit(context.run, start_app, environ))
+            except HasherBusy:
+                # Run the view as usual; its own hash raises HasherBusy and
+                # the app answers 503 with Retry-After
+                pass
+        if future is None:
+            future = loop.run_in_executor(executor, context.run, start_app, environ)
+        status, headers, iterable, iterator, first = await future
+    finally:
+        pending -= 1
+        body.close()
+
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in headers],
+        })
+        chunk = first
+        while chunk is not None:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if iterator is None:
+                break
+            chunk = await loop.run_in_executor(executor, context.run, next, iterator, None)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        await loop.run_in_executor(executor, context.run, close_iterable, iterable)
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            executor.shutdown(wait=True)
+            password_hasher.shutdown()
+            export_jobs.shutdown()
+            db_writer.close()
+            db_pool.close_all()
+            write_pool.close_all()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        await handle_http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await handle_lifespan(receive, send)
+    else:
+        raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+# Load/benchmark harness for the REST API. Drives every /api route for each
+# role that may call it and writes throughput and p50/p99 latency to a JSON
+# file, so runs on different commits can be compared.
+#
+# Generate a database first, e.g.
+#   python DataEntry.py --generate --database bench.db
+# then run against it in-process through the Flask test client
+#   python bench_api.py --database bench.db --output results.json
+# or against a running server
+#   python bench_api.py --url http://127.0.0.1:5000 --output results.json
+# and compare two runs with
+#   python bench_api.py --compare old.json new.json
+
+LOGINS = {
+    'admin': ('admin_user', 'admin123'),
+    'teacher': ('teacher_1', 'teacher123'),
+    'student': ('student_1', 'student123'),
+    'parent': ('parent_1', 'parent123'),
+}
+
+# Flask test client, one per thread
+class TestClientTransport:
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self.local = threading.local()
+
+    def request(self, method, path, headers=None, body=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        response = client.open(path, method=method, headers=headers, json=body)
+        data = response.get_data()
+        return response.status_code, data
+
+# Plain HTTP against a running server
+class HttpTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, headers=None, body=None):
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+class Counter:
+    def __init__(self, start=1):
+        self.value = start
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            value = self.value
+            self.value += 1
+            return value
+
+def build_scenarios(list_limit, run_id):
+    suffix = f'?limit={list_limit}' if list_limit else ''
+    unique = Counter()
+    created_students = []
+
+    def student_body():
+        n = unique.next()
+        return {'firstName': 'Bench', 'lastName': f'Student{n}', 'email': f'bench{run_id}_{n}@school.com',
+                'dateOfBirth': '2010-01-01', 'address': '1 Bench Road',
+                'phoneNumber': 9000000000 + run_id % 100000 * 10000 + n}
+
+    def person_body(extra_key, extra_value):
+        def body():
+            n = unique.next()
+            return {'firstName': 'Bench', 'lastName': f'Person{n}',
+                    'email': f'person{run_id}_{n}@school.com',
+                    'phoneNumber': 8000000000 + run_id % 100000 * 10000 + n, extra_key: extra_value}
+        return body
+
+    # Course ids past the generated range, so every pair is new
+    def course_teacher_body():
+        n = unique.next()
+        return {'courseId': 1000000000 + run_id % 100000 * 10000 + n, 'teacherId': 1}
+
+    def register_body():
+        n = unique.next()
+        return {'username': f'bench_{run_id}_{n}', 'password': 'bench123', 'role': 'student',
+                'reference_id': 1, 'email': f'bench_user{run_id}_{n}@school.com'}
+
+    def created_student_id():
+        with unique.lock:
+            return created_students.pop() if created_students else 1
+
+    def update_body():
+        return {'firstName': 'Bench', 'lastName': 'Updated', 'email': f'updated{run_id}@school.com',
+                'dateOfBirth': '2010-01-01', 'address': '2 Bench Road', 'phoneNumber': 7000000000 + run_id % 100000}
+
+    # (name, role, method, path or callable, body callable or None)
+    scenarios = []
+    for path, roles in [
+        ('/api/courses', ['admin', 'teacher', 'student']),
+        ('/api/students', ['admin', 'teacher']),
+        ('/api/grades', ['admin', 'teacher', 'student', 'parent']),
+        ('/api/attendance', ['admin', 'teacher', 'parent']),
+        ('/api/enrollments', ['admin', 'teacher']),
+        ('/api/teachers', ['admin']),
+        ('/api/parents', ['admin']),
+    ]:
+        for role in roles:
+            scenarios.append((f'GET {path} ({role})', role, 'GET', path + suffix, None))
+    scenarios += [
+        ('GET /api/admin/dashboard (admin)', 'admin', 'GET', '/api/admin/dashboard', None),
+        ('GET /api/course-teachers/1 (admin)', 'admin', 'GET', '/api/course-teachers/1', None),
+        ('POST /api/grades (teacher)', 'teacher', 'POST', '/api/grades',
+         lambda: {'enrollmentId': 1, 'gradeValue': 'B'}),
+        ('POST /api/attendance (teacher)', 'teacher', 'POST', '/api/attendance',
+         lambda: {'enrollmentId': 1, 'date': '2025-01-06', 'status': 'Present'}),
+        ('POST /api/attendance/bulk x30 (teacher)', 'teacher', 'POST', '/api/attendance/bulk',
+         lambda: [{'enrollmentId': e, 'date': '2025-01-07', 'status': 'Present'} for e in range(1, 31)]),
+        ('POST /api/enrollments (admin)', 'admin', 'POST', '/api/enrollments',
+         lambda: {'studentId': 1, 'courseId': 1}),
+        ('POST /api/courses (admin)', 'admin', 'POST', '/api/courses',
+         lambda: {'courseName': 'Bench 101', 'courseDescription': 'Benchmark', 'credits': 3}),
+        ('POST /api/teachers (admin)', 'admin', 'POST', '/api/teachers', person_body('department', 'Bench')),
+        ('POST /api/parents (admin)', 'admin', 'POST', '/api/parents', person_body('relationToStudent', 'Guardian')),
+        ('POST /api/course-teachers (admin)', 'admin', 'POST', '/api/course-teachers', course_teacher_body),
+        ('POST /api/students (admin)', 'admin', 'POST', '/api/students', student_body),
+        ('PUT /api/students/<id> (admin)', 'admin', 'PUT',
+         lambda: f'/api/students/{created_students[-1] if created_students else 1}', update_body),
+        ('DELETE /api/students/<id> (admin)', 'admin', 'DELETE',
+         lambda: f'/api/students/{created_student_id()}', None),
+        ('POST /api/auth/login (student)', None, 'POST', '/api/auth/login',
+         lambda: {'username': LOGINS['student'][0], 'password': LOGINS['student'][1]}),
+        ('POST /api/auth/register', None, 'POST', '/api/auth/register', register_body),
+        ('GET /api/metrics (admin)', 'admin', 'GET', '/api/metrics', None),
+    ]
+    return scenarios, created_students
+
+def login(transport, role):
+    username, password = LOGINS[role]
+    status, data = transport.request('POST', '/api/auth/login',
+                                     body={'username': username, 'password': password})
+    if status != 200:
+        raise SystemExit(f'Login failed for {role} ({username}): {status} {data[:200]!r}')
+    return {'Authorization': 'Bearer ' + json.loads(data)['token']}
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_scenario(transport, headers, scenario, requests, concurrency, warmup, created_students):
+    name, role, method, path, body = scenario
+    role_headers = headers.get(role, {})
+    latencies = []
+    statuses = {}
+    total_bytes = [0]
+    lock = threading.Lock()
+    issued = Counter(0)
+
+    def one_request(record):
+        url = path() if callable(path) else path
+        payload = body() if body else None
+        start = time.perf_counter()
+        status, data = transport.request(method, url, headers=role_headers, body=payload)
+        elapsed = time.perf_counter() - start
+        if method == 'POST' and url == '/api/students' and status == 201:
+            created_students.append(json.loads(data)['id'])
+        if record:
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+                total_bytes[0] += len(data)
+
+    for _ in range(warmup):
+        one_request(False)
+
+    def worker():
+        while issued.next() < requests:
+            one_request(True)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        'name': name,
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'avg_bytes': round(total_bytes[0] / len(latencies)) if latencies else 0,
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = {r['name']: r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = json.load(f)['results']
+    print(f"{'scenario':48} {'p50 ms':>16} {'p99 ms':>16} {'req/s':>16}")
+    for result in new:
+        before = old.get(result['name'])
+        if before is None:
+            continue
+
+        def delta(key):
+            a, b = before[key], result[key]
+            change = f'{(b - a) / a * 100:+.0f}%' if a else ''
+            return f'{b:>9} {change:>6}'
+
+        print(f"{result['name'][:48]:48} {delta('p50_ms')} {delta('p99_ms')} {delta('throughput_rps')}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every /api route for each role.')
+    parser.add_argument('--database', help='database for in-process runs (copied unless --in-place)')
+    parser.add_argument('--in-place', action='store_true', help='write to --database directly')
+    parser.add_argument('--url', help='benchmark a running server instead of the test client')
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--list-limit', type=int, default=100,
+                        help='?limit= for list routes, 0 for full tables')
+    parser.add_argument('--only', help='run only scenarios whose name contains this text')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.url:
+        transport = HttpTransport(args.url)
+    else:
+        if not args.database:
+            parser.error('--database or --url is required')
+        database = args.database
+        if not args.in_place:
+            database = os.path.join(tempfile.mkdtemp(), 'bench_api.db')
+            shutil.copyfile(args.database, database)
+        os.environ['DATABASE'] = database
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import app as server
+        server.app.logger.disabled = True
+        transport = TestClientTransport(server.app)
+
+    headers = {role: login(transport, role) for role in LOGINS}
+    run_id = int(time.time())
+    scenarios, created_students = build_scenarios(args.list_limit, run_id)
+    results = []
+    for scenario in scenarios:
+        if args.only and args.only not in scenario[0]:
+            continue
+        result = run_scenario(transport, headers, scenario, args.requests, args.concurrency,
+                              args.warmup, created_students)
+        results.append(result)
+        print(f"{result['name'][:48]:48} {result['throughput_rps']:>9} req/s  "
+              f"p50 {result['p50_ms']:>9} ms  p99 {result['p99_ms']:>9} ms  errors {result['errors']}")
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'target': args.url or 'test-client',
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'list_limit': args.list_limit,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {args.output}')
+
+if __name__ == '__main__':
+    main()
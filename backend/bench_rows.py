@@ -0,0 +1,89 @@
+import os
+import sys
+import tempfile
+import time
+
+# Microbenchmark for the list row pipeline: dict_factory + json.dumps versus
+# json_object() rows joined straight from tuples, on 100k-row
+# grade/attendance joins.
+#
+#   python bench_rows.py [rows]
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+REPEAT = 3
+
+os.environ['DATABASE'] = os.path.join(tempfile.mkdtemp(), 'bench_rows.db')
+
+import app as server
+from pagination import ListArgs
+
+def populate(conn):
+    students = 1000
+    courses = 50
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT INTO student (firstName, lastName, email, dateOfBirth, address, phoneNumber)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(f'First{i}', f'Last{i}', f'student{i}@school.com', '2008-01-01',
+           f'{i} School Road', 7000000000 + i) for i in range(students)])
+    cursor.executemany('''
+        INSERT INTO course (courseName, courseDescription, credits)
+        VALUES (?, ?, ?)
+    ''', [(f'Course {i}', 'Benchmark course', 3) for i in range(courses)])
+    cursor.executemany('''
+        INSERT INTO enrollment (studentId, courseId, enrollmentDate)
+        VALUES (?, ?, ?)
+    ''', [(i % students + 1, i % courses + 1, '2024-01-15') for i in range(students * 5)])
+    enrollments = students * 5
+    cursor.executemany('''
+        INSERT INTO grade (enrollmentId, gradeValue)
+        VALUES (?, ?)
+    ''', [(i % enrollments + 1, 'ABCDF'[i % 5]) for i in range(ROWS)])
+    cursor.executemany('''
+        INSERT INTO attendance (enrollmentId, date, status)
+        VALUES (?, ?, ?)
+    ''', [(i % enrollments + 1, f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}',
+           'Present' if i % 7 else 'Absent') for i in range(ROWS)])
+    conn.commit()
+
+def old_path(conn, query):
+    sql, params = query.build(ListArgs())
+    cursor = conn.cursor()
+    cursor.row_factory = server.dict_factory
+    cursor.execute(sql, params)
+    return server.app.json.dumps(cursor.fetchall())
+
+def new_path(conn, query):
+    sql, params = query.build(ListArgs(), json_rows=True)
+    return server.join_json_rows(server.execute_tuples(conn, sql, params).fetchall())
+
+def best_of(func, *args):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        body = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(body)
+
+def main():
+    admin = {'role': 'admin', 'reference_id': None}
+    with server.app.app_context():
+        server.init_db()
+        conn = server.get_write_connection()
+        try:
+            populate(conn)
+            for name, build_query in [('grades', server.grades_query),
+                                      ('attendance', server.attendance_query)]:
+                query = build_query(admin)
+                old_time, old_size = best_of(old_path, conn, query)
+                new_time, new_size = best_of(new_path, conn, query)
+                print(f'{name} ({ROWS} rows)')
+                print(f'  dict_factory + json : {old_time * 1000:8.1f} ms  {old_size} bytes')
+                print(f'  json_object rows    : {new_time * 1000:8.1f} ms  {new_size} bytes')
+                print(f'  speedup             : {old_time / new_time:8.2f}x')
+        finally:
+            conn.close_for_real()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+from bench_api import LOGINS, git_commit, percentile
+
+# Concurrency benchmark for the two ways of serving the API: the threaded
+# WSGI server behind app.run() and the ASGI adapter in asgi.py under uvicorn.
+# Each server gets a copy of the database. While `--idle` slow clients hold
+# connections open with half-sent requests, `--concurrency` clients issue
+# `--requests` GETs; the report has throughput, p50/p99 latency, errors
+# and the server's peak thread count and RSS.
+#
+#   python bench_serving.py --database bench.db --idle 1000 --concurrency 200
+#
+# Thousands of idle clients need a matching open file limit (ulimit -n).
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SERVERS = {
+    'wsgi': lambda port: [sys.executable, '-c',
+                          f"from app import app; app.run(port={port}, threaded=True)"],
+    'asgi': lambda port: [sys.executable, '-m', 'uvicorn', 'asgi:application',
+                          '--port', str(port), '--log-level', 'warning'],
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'Server exited with {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit(f'Server did not listen on {port}')
+
+def login(port, role):
+    username, password = LOGINS[role]
+    req = urllib.request.Request(f'http://127.0.0.1:{port}/api/auth/login',
+                                 data=json.dumps({'username': username, 'password': password}).encode(),
+                                 headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(req) as response:
+        return json.loads(response.read())['token']
+
+def process_stats(pid):
+    stats = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name == 'Threads':
+                    stats['threads'] = int(value)
+                elif name == 'VmRSS':
+                    stats['rss_kb'] = int(value.split()[0])
+    except OSError:
+        pass
+    return stats
+
+async def sample_process(pid, peak, stop):
+    while not stop.is_set():
+        for key, value in process_stats(pid).items():
+            peak[key] = max(peak.get(key, 0), value)
+        await asyncio.sleep(0.05)
+
+# Opens a connection and sends only part of a request, like a slow client
+async def open_idle(port):
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /api/courses HTTP/1.1\r\nHost: 127.0.0.1\r\n')
+        await writer.drain()
+        return writer
+    except OSError:
+        return None
+
+async def fetch(port, path, token):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write((f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                      f'Authorization: Bearer {token}\r\nConnection: close\r\n\r\n').encode())
+        await writer.drain()
+        data = await reader.read()
+        return int(data.split(b' ', 2)[1]), len(data)
+    finally:
+        writer.close()
+
+async def drive(port, path, token, requests, concurrency):
+    latencies = []
+    statuses = {}
+    remaining = [requests]
+
+    async def client():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                status, _ = await fetch(port, path, token)
+            except (OSError, IndexError, ValueError):
+                status = 'error'
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+async def run_mode(mode, args):
+    database = os.path.join(tempfile.mkdtemp(), f'bench_{mode}.db')
+    shutil.copyfile(args.database, database)
+    port = free_port()
+    env = dict(os.environ, DATABASE=database)
+    process = subprocess.Popen(SERVERS[mode](port), cwd=HERE, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port, process)
+        token = login(port, args.role)
+        await drive(port, args.path, token, args.warmup, min(args.warmup, args.concurrency) or 1)
+        baseline = process_stats(process.pid)
+
+        peak = {}
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_process(process.pid, peak, stop))
+        idle = [w for w in await asyncio.gather(*(open_idle(port) for _ in range(args.idle))) if w]
+        latencies, statuses, wall = await drive(port, args.path, token, args.requests, args.concurrency)
+        stop.set()
+        await sampler
+        for writer in idle:
+            writer.close()
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if status == 'error' or status >= 400)
+    return {
+        'mode': mode,
+        'idle_connections': len(idle),
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in statuses.items()},
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'threads_before': baseline.get('threads'),
+        'peak_threads': peak.get('threads'),
+        'peak_rss_kb': peak.get('rss_kb'),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare WSGI and ASGI serving under concurrency.')
+    parser.add_argument('--database', required=True, help='database to copy for each server')
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--path', default='/api/courses?limit=20')
+    parser.add_argument('--role', default='teacher', choices=sorted(LOGINS))
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--idle', type=int, default=500, help='slow clients holding a connection open')
+    parser.add_argument('--output', default='bench_serving.json')
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes.split(','):
+        result = asyncio.run(run_mode(mode, args))
+        results.append(result)
+        print(f"{mode}: {result['throughput_rps']:>9} req/s  p50 {result['p50_ms']:>9} ms  "
+              f"p99 {result['p99_ms']:>9} ms  errors {result['errors']}  "
+              f"threads {result['threads_before']} -> {result['peak_threads']}  "
+              f"rss {result['peak_rss_kb']} kB")
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'path': args.path,
+        'role': args.role,
+        'concurrency': args.concurrency,
+        'idle': args.idle,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Wrote {args.output}')
+
+if __name__ == '__main__':
+    main()
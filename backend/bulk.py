@@ -0,0 +1,123 @@
+from sqlite3 import Error, IntegrityError
+
+MAX_BULK_ROWS = 5000
+
+# Describes how a JSON array of objects is inserted into one table.
+#   fields     - (name, type) pairs taken from each object, in column order;
+#                type is int, str or None for "any scalar"
+#   references - field name -> table whose id it must match
+#   extra      - callable returning values appended after the fields
+#                (e.g. server-side enrollment dates)
+class BulkInsert:
+    def __init__(self, table, fields, references=None, extra_columns=(), extra=None):
+        self.table = table
+        self.fields = fields
+        self.references = references or {}
+        self.extra_columns = list(extra_columns)
+        self.extra = extra
+        columns = [name for name, _ in fields] + self.extra_columns
+        self.sql = (f"INSERT INTO {table} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})")
+
+    def validate_item(self, item):
+        if not isinstance(item, dict):
+            return ['row must be an object']
+        errors = []
+        for name, kind in self.fields:
+            value = item.get(name)
+            if value is None or value == '':
+                errors.append(f'{name} is required')
+            elif kind is int and (isinstance(value, bool) or not isinstance(value, int)):
+                errors.append(f'{name} must be an integer')
+            elif kind is str and not isinstance(value, str):
+                errors.append(f'{name} must be a string')
+            elif isinstance(value, (dict, list)):
+                errors.append(f'{name} must be a scalar')
+        return errors
+
+    def params(self, item):
+        values = tuple(item[name] for name, _ in self.fields)
+        if self.extra is not None:
+            values += tuple(self.extra())
+        return values
+
+# Report rows whose foreign keys point at ids that do not exist, using one
+# IN query per referenced table instead of one lookup per row
+def find_missing_references(cursor, spec, items, errors):
+    for field, table in spec.references.items():
+        wanted = {item[field] for index, item in enumerate(items) if index not in errors}
+        if not wanted:
+            continue
+        found = set()
+        wanted = list(wanted)
+        for start in range(0, len(wanted), 500):
+            chunk = wanted[start:start + 500]
+            cursor.execute(f"SELECT id FROM {table} WHERE id IN ({', '.join('?' for _ in chunk)})",
+                           chunk)
+            found.update(row['id'] if isinstance(row, dict) else row[0] for row in cursor.fetchall())
+        for index, item in enumerate(items):
+            if index not in errors and item[field] not in found:
+                errors.setdefault(index, []).append(f'{field} {item[field]} does not exist')
+
+# Find which rows break a constraint, by retrying them one at a time inside a
+# savepoint that is always rolled back
+def find_constraint_errors(conn, spec, rows, errors):
+    cursor = conn.cursor()
+    cursor.execute('SAVEPOINT bulk_check')
+    try:
+        for index, params in rows:
+            try:
+                cursor.execute(spec.sql, params)
+            except IntegrityError as e:
+                errors.setdefault(index, []).append(str(e))
+    finally:
+        cursor.execute('ROLLBACK TO bulk_check')
+        cursor.execute('RELEASE bulk_check')
+
+# Check every row's fields and references. Returns a dict mapping row index
+# to a list of messages; it is empty when all rows are valid.
+def validate_bulk(cursor, spec, items):
+    errors = {}
+    for index, item in enumerate(items):
+        item_errors = spec.validate_item(item)
+        if item_errors:
+            errors[index] = item_errors
+    find_missing_references(cursor, spec, items, errors)
+    return errors
+
+# Insert validated rows inside the caller's transaction, under a savepoint of
+# their own so a failure leaves the rest of the transaction untouched.
+# Returns (result, errors); errors maps row index to a list of messages and
+# nothing is written unless it is empty. With dry_run the insert is rolled
+# back after the constraints have been checked.
+def write_bulk(conn, spec, items, dry_run=False):
+    errors = {}
+    rows = [(index, spec.params(item)) for index, item in enumerate(items)]
+    cursor = conn.cursor()
+    cursor.execute('SAVEPOINT bulk_insert')
+    try:
+        cursor.executemany(spec.sql, [params for _, params in rows])
+        cursor.execute('SELECT last_insert_rowid() AS id')
+        last_id = cursor.fetchone()
+        last_id = last_id['id'] if isinstance(last_id, dict) else last_id[0]
+    except IntegrityError:
+        cursor.execute('ROLLBACK TO bulk_insert')
+        try:
+            find_constraint_errors(conn, spec, rows, errors)
+        finally:
+            cursor.execute('RELEASE bulk_insert')
+        return None, errors
+    except Error:
+        cursor.execute('ROLLBACK TO bulk_insert')
+        cursor.execute('RELEASE bulk_insert')
+        raise
+
+    if dry_run:
+        cursor.execute('ROLLBACK TO bulk_insert')
+        cursor.execute('RELEASE bulk_insert')
+        return {'dry_run': True, 'count': len(rows)}, {}
+
+    cursor.execute('RELEASE bulk_insert')
+    # Rows written by one executemany get consecutive AUTOINCREMENT ids
+    ids = list(range(last_id - len(rows) + 1, last_id + 1))
+    return {'created': len(rows), 'ids': ids}, {}
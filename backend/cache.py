@@ -0,0 +1,341 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Bounded in-process cache with per-entry expiry and LRU eviction
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+# In-memory copy of users.tokenVersion, so a signed token can be checked
+# for revocation without touching the database. Only users whose tokens were
+# ever revoked are held; everyone else is at version 0. load(stamp) returns
+# (stamp, {user_id: version}) or None when nothing changed since stamp. It
+# runs at most every `interval` seconds, on the first lookup after the
+# interval; other threads keep using the current table meanwhile. Local
+# revocations are applied immediately with set().
+class TokenVersionTable:
+    def __init__(self, load, interval=5.0):
+        self.load = load
+        self.interval = interval
+        self._versions = {}
+        self._stamp = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._refreshing = threading.Lock()
+        self.refreshes = 0
+        self.reloads = 0
+
+    def get(self, user_id):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at >= self.interval:
+            self.refresh(wait=loaded_at is None)
+        return self._versions.get(user_id, 0)
+
+    def refresh(self, wait=True):
+        if not self._refreshing.acquire(blocking=wait):
+            return
+        try:
+            result = self.load(self._stamp)
+            with self._lock:
+                self.refreshes += 1
+                if result is not None:
+                    self._stamp, versions = result
+                    self._versions = versions
+                    self.reloads += 1
+                self._loaded_at = time.monotonic()
+        finally:
+            self._refreshing.release()
+
+    def set(self, user_id, version):
+        with self._lock:
+            versions = dict(self._versions)
+            versions[user_id] = version
+            self._versions = versions
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'revoked_users': len(self._versions),
+                'interval': self.interval,
+                'refreshes': self.refreshes,
+                'reloads': self.reloads,
+            }
+
+# Response caches store finished list bodies as (mimetype, bytes) under a
+# key that already encodes everything the body depends on (see
+# version_etag in app.py), so they never need to be told about writes: a
+# write bumps a table version and the old entries simply stop being asked
+# for. All three backends share get/set/clear/get_stats.
+
+# In-process LRU bounded by entry count and total body size
+class MemoryResponseCache:
+    kind = 'memory'
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=4096, ttl=300):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_bytes // 4
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set(self, key, mimetype, body):
+        if len(body) > self.max_entry_bytes:
+            return
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires, mimetype, body)
+            self.bytes += len(body)
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        self.bytes -= len(self._data.pop(key)[2])
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'backend': self.kind,
+                'entries': len(self._data),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+# Cache shared by every worker process on the host, kept in a SQLite file of
+# its own. Entry sizes are totalled by triggers; when a write takes the total
+# over max_bytes, expired entries go first and then the least recently used.
+# Hit/miss counters are per process.
+class DiskResponseCache:
+    kind = 'disk'
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, ttl=300):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 4
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._ready = False
+
+    # One connection per thread; the file is only a cache, so commits skip
+    # fsync. The tables are created by the first connection.
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            with self._lock:
+                if not self._ready:
+                    self._create_tables(conn)
+                    self._ready = True
+            self._local.conn = conn
+        return conn
+
+    def _create_tables(self, conn):
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                mimetype TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expiresAt REAL NOT NULL,
+                lastUsed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache (lastUsed);
+            CREATE TABLE IF NOT EXISTS response_cache_size (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                bytes INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO response_cache_size (id, bytes) VALUES (1, 0);
+            CREATE TRIGGER IF NOT EXISTS response_cache_insert AFTER INSERT ON response_cache
+            BEGIN
+                UPDATE response_cache_size SET bytes = bytes + NEW.size;
+            END;
+            CREATE TRIGGER IF NOT EXISTS response_cache_delete AFTER DELETE ON response_cache
+            BEGIN
+                UPDATE response_cache_size SET bytes = bytes - OLD.size;
+            END;
+        ''')
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def get(self, key):
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute('SELECT mimetype, body, expiresAt, lastUsed FROM response_cache WHERE key = ?',
+                           (key,)).fetchone()
+        if row is None or row[2] <= now:
+            self._count('misses')
+            return None
+        # Refresh the LRU position at most once a second per entry
+        if now - row[3] >= 1:
+            try:
+                conn.execute('UPDATE response_cache SET lastUsed = ? WHERE key = ?', (now, key))
+            except sqlite3.OperationalError:
+                pass
+        self._count('hits')
+        return row[0], bytes(row[1])
+
+    def set(self, key, mimetype, body):
+        if len(body) > self.max_entry_bytes:
+            return
+        now = time.time()
+        conn = self._connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+            conn.execute('''
+                INSERT INTO response_cache (key, mimetype, body, size, expiresAt, lastUsed)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, mimetype, body, len(body), now + self.ttl, now))
+            total = conn.execute('SELECT bytes FROM response_cache_size').fetchone()[0]
+            if total > self.max_bytes:
+                evicted = conn.execute('DELETE FROM response_cache WHERE expiresAt <= ?', (now,)).rowcount
+                total = conn.execute('SELECT bytes FROM response_cache_size').fetchone()[0]
+                if total > self.max_bytes:
+                    # The least recently used entries, oldest first, until
+                    # enough bytes are freed; never the entry just written
+                    evicted += conn.execute('''
+                        DELETE FROM response_cache WHERE key IN (
+                            SELECT key FROM (
+                                SELECT key, size, SUM(size) OVER (ORDER BY lastUsed, key) AS freed
+                                FROM response_cache WHERE key != ?)
+                            WHERE freed - size < ?)
+                    ''', (key, total - self.max_bytes)).rowcount
+                self._count('evictions', evicted)
+            conn.execute('COMMIT')
+        except sqlite3.OperationalError:
+            # Another worker holds the write lock for too long; skip caching
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+
+    def clear(self):
+        self._connection().execute('DELETE FROM response_cache')
+
+    def get_stats(self):
+        conn = self._connection()
+        entries, total = conn.execute('''
+            SELECT (SELECT COUNT(*) FROM response_cache), (SELECT bytes FROM response_cache_size)
+        ''').fetchone()
+        with self._lock:
+            return {
+                'backend': self.kind,
+                'path': self.path,
+                'entries': entries,
+                'bytes': total,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+# Used when RESPONSE_CACHE=off
+class NullResponseCache:
+    kind = 'off'
+
+    def get(self, key):
+        return None
+
+    def set(self, key, mimetype, body):
+        pass
+
+    def clear(self):
+        pass
+
+    def get_stats(self):
+        return {'backend': self.kind}
+
+def create_response_cache(kind, path=None, max_bytes=64 * 1024 * 1024, ttl=300):
+    if kind == 'memory':
+        return MemoryResponseCache(max_bytes=max_bytes, ttl=ttl)
+    if kind == 'disk':
+        return DiskResponseCache(path, max_bytes=max_bytes, ttl=ttl)
+    if kind == 'off':
+        return NullResponseCache()
+    raise ValueError(f'Unknown response cache backend: {kind}')
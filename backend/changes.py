@@ -0,0 +1,122 @@
+import threading
+
+CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 5000
+
+# Which logged rows each role may see, as (tables, condition) pairs OR'd
+# together. Conditions are on change_log columns and take the viewer's role
+# and reference id where they use ?, mirroring the role scopes of the list
+# endpoints. Admins see everything; roles not listed see nothing. Scopes are
+# checked when the change is read, so the delete of a row that took its scope
+# with it (a student removed with their enrollments) reaches admins only.
+SCOPE = 'SELECT {column} FROM enrollment_scope WHERE viewerRole = ? AND viewerId = ?'
+CHANGE_SCOPES = {
+    'teacher': [
+        (('enrollment', 'grade', 'attendance'), f"enrollmentId IN ({SCOPE.format(column='enrollmentId')})"),
+        (('student',), f"rowId IN ({SCOPE.format(column='studentId')})"),
+        (('course',), 'rowId IN (SELECT courseId FROM course_teacher WHERE teacherId = ?)'),
+    ],
+    'parent': [
+        (('grade', 'attendance'), f"enrollmentId IN ({SCOPE.format(column='enrollmentId')})"),
+    ],
+    'student': [
+        (('grade',), 'enrollmentId IN (SELECT id FROM enrollment WHERE studentId = ?)'),
+        (('course',), 'rowId IN (SELECT courseId FROM enrollment WHERE studentId = ?)'),
+    ],
+}
+
+# Returns (sql, params) restricting change_log rows to the viewer's scope,
+# or None when the viewer sees every change
+def change_filter(current_user):
+    if current_user['role'] == 'admin':
+        return None
+    parts = []
+    params = []
+    for tables, condition in CHANGE_SCOPES.get(current_user['role'], []):
+        placeholders = ', '.join('?' for _ in tables)
+        parts.append(f'(tableName IN ({placeholders}) AND {condition})')
+        params.extend(tables)
+        if 'viewerRole' in condition:
+            params.extend([current_user['role'], current_user['reference_id']])
+        else:
+            params.append(current_user['reference_id'])
+    if not parts:
+        return '0', []
+    return '(' + ' OR '.join(parts) + ')', params
+
+# Oldest seq still in the log and the last seq handed out. seq comes from
+# AUTOINCREMENT, so it never goes back even when the log is pruned empty.
+def log_bounds(conn):
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute('''SELECT (SELECT MIN(seq) FROM change_log),
+                             (SELECT seq FROM sqlite_sequence WHERE name = 'change_log')''')
+    oldest, latest = cursor.fetchone()
+    latest = latest or 0
+    return (oldest if oldest is not None else latest + 1), latest
+
+# A client that last saw `since` has missed changes when the rows after it
+# were pruned, or when since lies beyond the log (e.g. a restored database)
+def is_stale(since, oldest, latest):
+    return since < oldest - 1 or since > latest
+
+# Changes after `since` up to `until` (the latest seq read beforehand), at
+# most `limit` of them, as (seq, json text) tuples. Bounding by `until` lets
+# the caller move its cursor past rows the filter skipped.
+def build_changes(current_user, since, until, limit):
+    where = ['seq > ?', 'seq <= ?']
+    params = [since, until]
+    scope = change_filter(current_user)
+    if scope is not None:
+        where.append(scope[0])
+        params.extend(scope[1])
+    sql = f'''SELECT seq, json_object('seq', seq, 'table', tableName, 'id', rowId, 'op', op,
+                                      'row', json(data), 'createdAt', createdAt)
+              FROM change_log WHERE {' AND '.join(where)} ORDER BY seq LIMIT ?'''
+    params.append(limit)
+    return sql, params
+
+# Read one page of changes. Returns (rows, cursor): the cursor is the seq to
+# pass as `since` next time, past every row scanned even when none was
+# visible to the caller.
+def read_changes(conn, current_user, since, limit, until=None):
+    if until is None:
+        until = log_bounds(conn)[1]
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(*build_changes(current_user, since, until, limit))
+    rows = cursor.fetchall()
+    if len(rows) == limit:
+        return rows, rows[-1][0]
+    return rows, max(since, until)
+
+# Wakes change streams in this process when the writer commits, so they do
+# not wait for their next poll. Changes committed by other processes or by
+# CLI commands are picked up on the next poll.
+class ChangeNotifier:
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._generation = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def notify(self):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    # Wait until notify() is called after `generation` was read, or timeout
+    def wait(self, generation, timeout):
+        with self._condition:
+            return self._condition.wait_for(lambda: self._generation != generation, timeout)
+
+# One Server-Sent Events message
+def format_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {data}')
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,419 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import quote
+from flask import g, has_app_context
+
+# PRAGMAs applied once when a pooled connection is opened
+DEFAULT_PRAGMAS = [
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', 268435456),
+    ('cache_size', -16000),
+    ('busy_timeout', 5000),
+]
+
+# Read-only pools cannot change the journal mode; query_only makes any write
+# attempt fail loudly instead of taking the database lock
+READ_ONLY_PRAGMAS = [
+    ('query_only', 1),
+    ('mmap_size', 268435456),
+    ('cache_size', -16000),
+    ('busy_timeout', 5000),
+]
+
+# Cursor that reports query time and fetched row counts to the pool's hooks
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            on_query = self.connection.pool.on_query
+            if on_query is not None:
+                on_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            on_query = self.connection.pool.on_query
+            if on_query is not None:
+                on_query(sql, time.perf_counter() - start)
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            self._count_rows(1)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._count_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count_rows(len(rows))
+        return rows
+
+    def _count_rows(self, count):
+        on_rows = self.connection.pool.on_rows
+        if on_rows is not None and count:
+            on_rows(count)
+
+# Connection class handed out by the pool. close() gives the connection back
+# to the pool instead of closing it, so existing handlers keep working as-is.
+class PooledConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute() does not go through cursor(), so route it there
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        self.pool.release(self)
+
+    def close_for_real(self):
+        sqlite3.Connection.close(self)
+
+# read_only pools open the file with mode=ro, so with WAL their readers never
+# wait for (or block) the writer
+class ConnectionPool:
+    def __init__(self, database, row_factory=None, pragmas=None, max_idle=16, read_only=False):
+        self.database = database
+        self.row_factory = row_factory
+        self.read_only = read_only
+        if pragmas is None:
+            pragmas = READ_ONLY_PRAGMAS if read_only else DEFAULT_PRAGMAS
+        self.pragmas = pragmas
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        # Optional instrumentation hooks: on_query(sql, seconds), on_rows(count)
+        self.on_query = None
+        self.on_rows = None
+        self._stats = {
+            'opened': 0,
+            'reused': 0,
+            'released': 0,
+            'discarded': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+        }
+
+    def _connect(self):
+        if self.read_only:
+            uri = 'file:' + quote(os.path.abspath(self.database)) + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, factory=PooledConnection,
+                                   check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.database, factory=PooledConnection,
+                                   check_same_thread=False)
+        conn.pool = self
+        for name, value in self.pragmas:
+            conn.execute(f'PRAGMA {name} = {value}')
+        conn.row_factory = self.row_factory
+        return conn
+
+    def acquire(self):
+        # Reuse the connection already held by this app context, if any
+        if has_app_context():
+            conn = g.get('_db_conn')
+            if conn is not None:
+                with self._lock:
+                    self._stats['reused'] += 1
+                return conn
+
+        conn = self._checkout()
+        if has_app_context():
+            g._db_conn = conn
+        return conn
+
+    # Connection that is not tied to the current app context, for work that
+    # outlives the request handler (e.g. streamed responses). The caller must
+    # close() it when done.
+    def acquire_detached(self):
+        return self._checkout()
+
+    def _checkout(self):
+        conn = None
+        with self._lock:
+            if self._idle:
+                conn = self._idle.pop()
+                self._stats['reused'] += 1
+            self._stats['in_use'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'],
+                                             self._stats['in_use'])
+        if conn is None:
+            try:
+                conn = self._connect()
+            except sqlite3.Error:
+                with self._lock:
+                    self._stats['in_use'] -= 1
+                raise
+            with self._lock:
+                self._stats['opened'] += 1
+
+        conn.checked_out = True
+        return conn
+
+    def release(self, conn):
+        if not getattr(conn, 'checked_out', False):
+            return
+        conn.checked_out = False
+        if has_app_context() and g.get('_db_conn') is conn:
+            g.pop('_db_conn')
+        try:
+            # Never hand a connection with an open transaction to the next user
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = self.row_factory
+        except sqlite3.Error:
+            conn.close_for_real()
+            with self._lock:
+                self._stats['in_use'] -= 1
+                self._stats['discarded'] += 1
+            return
+
+        with self._lock:
+            self._stats['in_use'] -= 1
+            self._stats['released'] += 1
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                conn = None
+            else:
+                self._stats['discarded'] += 1
+        if conn is not None:
+            conn.close_for_real()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close_for_real()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats['max_idle'] = self.max_idle
+        stats['database'] = self.database
+        stats['read_only'] = self.read_only
+        return stats
+
+    def init_app(self, app):
+        # Hand back whatever connection the request still holds
+        @app.teardown_appcontext
+        def release_db_connection(exception=None):
+            conn = g.pop('_db_conn', None)
+            if conn is not None:
+                self.release(conn)
+
+class WriteQueueClosed(RuntimeError):
+    pass
+
+# All writes go through one connection owned by a single thread. Callers
+# submit a function that takes the connection; the thread takes whatever
+# jobs are queued (up to max_batch rows), runs each under its own savepoint
+# inside one BEGIN IMMEDIATE transaction and commits once for the whole
+# batch. A job that raises only rolls back its own savepoint. Results are
+# handed back after the commit, so a caller never sees a row that is not
+# yet durable.
+#
+# A batch waits for more jobs until the earliest deadline of the jobs in it:
+# each job allows `delay` seconds (max_delay by default). Jobs that can
+# tolerate latency, like attendance under group commit, pass a longer delay
+# so bursts share one commit; any job that cannot wait cuts the batch short.
+#
+# Jobs must not commit or roll back themselves. on_commit, when set, is
+# called on the writer thread after every commit. capture_context, when set,
+# is called by submit() on the caller's thread; what it returns is available
+# from current_context() on the writer thread while that job runs (the app
+# uses it to label a job's queries with the endpoint that queued it).
+class WriteQueue:
+    def __init__(self, pool, max_batch=500, max_delay=0.0):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self.on_commit = None
+        self.capture_context = None
+        self._local = threading.local()
+        self._stats = {
+            'jobs': 0,
+            'rows': 0,
+            'failed': 0,
+            'batches': 0,
+            'commits': 0,
+            'largest_batch': 0,
+            'commit_seconds': 0.0,
+        }
+
+    # rows is the job's share of max_batch (e.g. the size of a bulk insert)
+    def submit(self, func, rows=1, delay=None):
+        future = Future()
+        context = self.capture_context() if self.capture_context is not None else None
+        with self._lock:
+            if self._closed:
+                raise WriteQueueClosed('The write queue has been shut down')
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+            self._queue.put((future, func, rows, self.max_delay if delay is None else delay, context))
+        return future
+
+    def run(self, func, rows=1, delay=None):
+        return self.submit(func, rows, delay).result()
+
+    # Run one statement and return its lastrowid
+    def execute(self, sql, parameters=(), delay=None):
+        return self.run(lambda conn: conn.execute(sql, parameters).lastrowid, delay=delay)
+
+    def current_context(self):
+        return getattr(self._local, 'context', None)
+
+    def _next_batch(self):
+        job = self._queue.get()
+        if job is None:
+            return None
+        batch = [job]
+        rows = job[2]
+        deadline = time.monotonic() + job[3]
+        while rows < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                # Finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(job)
+            rows += job[2]
+            deadline = min(deadline, time.monotonic() + job[3])
+        return batch
+
+    def _run(self):
+        try:
+            conn = self.pool.acquire_detached()
+        except Exception as e:
+            self._fail_queued(e)
+            return
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                self._run_batch(conn, batch)
+        finally:
+            conn.close()
+
+    # The write connection could not be opened. Fail every queued job and
+    # clear _thread under the lock, so the next submit() starts a new writer
+    # that tries again instead of queueing behind this one.
+    def _fail_queued(self, error):
+        jobs = []
+        with self._lock:
+            if self._thread is threading.current_thread():
+                self._thread = None
+            while True:
+                try:
+                    job = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is not None and job[0].set_running_or_notify_cancel():
+                    jobs.append(job)
+            self._stats['jobs'] += len(jobs)
+            self._stats['rows'] += sum(job[2] for job in jobs)
+            self._stats['failed'] += len(jobs)
+        for job in jobs:
+            job[0].set_exception(error)
+
+    def _run_batch(self, conn, batch):
+        rows = sum(job[2] for job in batch)
+        batch = [(future, func, context) for future, func, _, _, context in batch
+                 if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for future, func, context in batch:
+                self._local.context = context
+                conn.execute('SAVEPOINT write_job')
+                try:
+                    result = func(conn)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO write_job')
+                    conn.execute('RELEASE write_job')
+                    results.append((future, None, e))
+                else:
+                    conn.execute('RELEASE write_job')
+                    results.append((future, result, None))
+            self._local.context = None
+            start = time.perf_counter()
+            conn.commit()
+            commit_seconds = time.perf_counter() - start
+        except sqlite3.Error as e:
+            # The transaction itself failed (lock timeout, disk error, ...);
+            # nothing in the batch was written
+            self._local.context = None
+            if conn.in_transaction:
+                conn.rollback()
+            for future, _, _ in batch:
+                future.set_exception(e)
+            with self._lock:
+                self._stats['jobs'] += len(batch)
+                self._stats['rows'] += rows
+                self._stats['failed'] += len(batch)
+                self._stats['batches'] += 1
+            return
+
+        with self._lock:
+            self._stats['jobs'] += len(batch)
+            self._stats['rows'] += rows
+            self._stats['failed'] += sum(1 for _, _, error in results if error is not None)
+            self._stats['batches'] += 1
+            self._stats['commits'] += 1
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], rows)
+            self._stats['commit_seconds'] += commit_seconds
+        if self.on_commit is not None:
+            self.on_commit()
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        stats['max_batch'] = self.max_batch
+        stats['max_delay'] = self.max_delay
+        return stats
+
+    # Refuse new jobs, commit everything already queued and stop the writer
+    # thread. Safe to call more than once.
+    def close(self):
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+            self._thread = None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
@@ -0,0 +1,51 @@
+import gzip
+
+# brotli and msgpack are optional; without them br and MessagePack are simply
+# not offered during negotiation
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from streaming import NDJSON_MIMETYPE
+
+JSON_MIMETYPE = 'application/json'
+# Column names once, then one array of values per row:
+#   {"columns": ["id", "gradeValue"], "rows": [[1, "A"], [2, "B"]]}
+COLUMNS_MIMETYPE = 'application/vnd.columns+json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+# Accept header value -> list response format, in order of preference when
+# the client accepts several equally
+FORMATS = [(JSON_MIMETYPE, 'json'), (NDJSON_MIMETYPE, 'ndjson'),
+           (COLUMNS_MIMETYPE, 'columns')]
+if msgpack is not None:
+    FORMATS += [(MSGPACK_MIMETYPE, 'msgpack'), ('application/x-msgpack', 'msgpack')]
+
+ENCODINGS = (['br'] if brotli is not None else []) + ['gzip']
+
+# Bodies worth compressing; anything else (images, gzip downloads) is left alone
+COMPRESSIBLE_MIMETYPES = {JSON_MIMETYPE, NDJSON_MIMETYPE, COLUMNS_MIMETYPE, MSGPACK_MIMETYPE,
+                          'text/plain', 'text/csv', 'text/html'}
+
+def negotiate_format(accept):
+    mimetype = accept.best_match([mimetype for mimetype, _ in FORMATS], default=JSON_MIMETYPE)
+    return dict(FORMATS)[mimetype]
+
+def negotiate_encoding(accept_encoding):
+    return accept_encoding.best_match(ENCODINGS)
+
+# level is the gzip level (1-9), quality the brotli quality (0-11)
+def compress(body, encoding, level=6, quality=4):
+    if encoding == 'br':
+        return brotli.compress(body, quality=quality, mode=brotli.MODE_TEXT)
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+def pack_msgpack(value):
+    return msgpack.packb(value, use_bin_type=True)
@@ -0,0 +1,192 @@
+import csv
+import gzip
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', '.csv.gz'),
+    'ndjson': ('application/x-ndjson', '.ndjson.gz'),
+}
+EXPORT_CHUNK_SIZE = 1000
+
+class ExportBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Too many export jobs')
+        self.retry_after = retry_after
+
+class ExportCancelled(Exception):
+    pass
+
+class ExportJob:
+    def __init__(self, kind, fmt, owner, sql, params, columns):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.format = fmt
+        self.owner = owner
+        self.sql = sql
+        self.params = params
+        self.columns = columns
+        self.status = 'queued'
+        self.rows = 0
+        self.bytes = 0
+        self.error = None
+        self.path = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def filename(self):
+        return f'{self.kind}-{self.id}{EXPORT_FORMATS[self.format][1]}'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'format': self.format,
+            'status': self.status,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+# Runs report exports on a small dedicated thread pool so they never hold a
+# request thread or run under the request timeout. Each job reads on a
+# read-only connection of its own inside one transaction, so the file is a
+# consistent snapshot and, with WAL, writers are never blocked. Rows are
+# fetched in chunks and written to a gzip file that is renamed into place
+# when complete. At most max_jobs jobs are queued or running at once; beyond
+# that submit() raises ExportBusy. Finished files are deleted after
+# `retention` seconds. A job belongs to the user who submitted it; get() and
+# list() given an owner only return that user's jobs.
+class ExportManager:
+    def __init__(self, pool, directory, workers=2, max_jobs=4, retention=3600,
+                 compress_level=6, retry_after=5):
+        self.pool = pool
+        self.directory = directory
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.retention = retention
+        self.compress_level = compress_level
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='export')
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._jobs = {}
+        self._stats = {'submitted': 0, 'rejected': 0, 'done': 0, 'failed': 0, 'rows': 0}
+
+    def submit(self, kind, fmt, owner, sql, params, columns):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+        self._expire()
+        job = ExportJob(kind, fmt, owner, sql, params, columns)
+        with self._lock:
+            active = sum(1 for j in self._jobs.values() if j.status in ('queued', 'running'))
+            if active >= self.max_jobs:
+                self._stats['rejected'] += 1
+                raise ExportBusy(self.retry_after)
+            self._jobs[job.id] = job
+            self._stats['submitted'] += 1
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id, owner=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def list(self, owner=None):
+        self._expire()
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if owner is None or job.owner == owner]
+        return sorted(jobs, key=lambda job: job.created, reverse=True)
+
+    def _run(self, job):
+        job.status = 'running'
+        job.started = time.time()
+        path = os.path.join(self.directory, job.filename)
+        partial = path + '.part'
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._write(job, partial)
+            os.replace(partial, path)
+        except Exception as e:
+            if os.path.exists(partial):
+                os.remove(partial)
+            job.error = 'Export cancelled' if isinstance(e, ExportCancelled) else str(e)
+            job.status = 'failed'
+        else:
+            job.path = path
+            job.bytes = os.path.getsize(path)
+            job.status = 'done'
+        job.finished = time.time()
+        with self._lock:
+            self._stats[job.status] += 1
+            self._stats['rows'] += job.rows
+
+    def _write(self, job, path):
+        conn = self.pool.acquire_detached()
+        try:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            # The snapshot starts with the first read and lasts until rollback
+            cursor.execute('BEGIN')
+            try:
+                cursor.execute(job.sql, job.params)
+                with gzip.open(path, 'wt', encoding='utf-8', newline='',
+                               compresslevel=self.compress_level) as f:
+                    if job.format == 'csv':
+                        writer = csv.writer(f)
+                        writer.writerow(job.columns)
+                        write = writer.writerows
+                    else:
+                        write = lambda rows: f.writelines(row[0] + '\n' for row in rows)
+                    while True:
+                        if self._stopping.is_set():
+                            raise ExportCancelled()
+                        rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+                        if not rows:
+                            break
+                        write(rows)
+                        job.rows += len(rows)
+            finally:
+                conn.rollback()
+        finally:
+            conn.close()
+
+    # Forget jobs that finished more than `retention` seconds ago and delete
+    # their files
+    def _expire(self):
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job.finished is not None and job.finished < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if job.path and os.path.exists(job.path):
+                os.remove(job.path)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            statuses = [job.status for job in self._jobs.values()]
+        stats['queued'] = statuses.count('queued')
+        stats['running'] = statuses.count('running')
+        stats['workers'] = self.workers
+        stats['max_jobs'] = self.max_jobs
+        return stats
+
+    # Running jobs stop at their next chunk; queued jobs never start
+    def shutdown(self):
+        self._stopping.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
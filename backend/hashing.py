@@ -0,0 +1,126 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+# Upper bounds (seconds) of the hash latency histogram buckets
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+class HasherBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Password hashing pool is saturated')
+        self.retry_after = retry_after
+
+# Runs bcrypt on a small dedicated thread pool (bcrypt releases the GIL while
+# hashing) so a login storm cannot tie up every request thread. At most
+# workers + max_queue hashes are admitted at once; beyond that callers get
+# HasherBusy immediately instead of queueing.
+#
+# hash() and check() block the calling thread until the hash is done. A
+# caller that can wait without a thread (the ASGI server, see asgi.py) uses
+# submit() instead to run a whole view on the pool; hashes made by that view
+# then run inline on the pool thread, so no request thread waits on bcrypt.
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=2, max_queue=8, retry_after=1):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='bcrypt')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self._inline = threading.local()
+        self._stats = {
+            'hashes': 0,
+            'rejected': 0,
+            'pending': 0,
+            'total_seconds': 0.0,
+            'max_seconds': 0.0,
+        }
+        self._buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._stats['hashes'] += 1
+                self._stats['total_seconds'] += elapsed
+                self._stats['max_seconds'] = max(self._stats['max_seconds'], elapsed)
+                for i, bound in enumerate(LATENCY_BUCKETS):
+                    if elapsed <= bound:
+                        self._buckets[i] += 1
+                        break
+                else:
+                    self._buckets[-1] += 1
+
+    def _admit(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HasherBusy(self.retry_after)
+        with self._lock:
+            self._stats['pending'] += 1
+
+    def _release(self, future=None):
+        with self._lock:
+            self._stats['pending'] -= 1
+        self._slots.release()
+
+    def _run(self, func, *args):
+        # Already on a pool thread under a slot taken by submit()
+        if getattr(self._inline, 'active', False):
+            return self._timed(func, *args)
+        self._admit()
+        try:
+            return self._executor.submit(self._timed, func, *args).result()
+        finally:
+            self._release()
+
+    def _call_inline(self, func, *args):
+        self._inline.active = True
+        try:
+            return func(*args)
+        finally:
+            self._inline.active = False
+
+    # Run func(*args) on the pool and return its future. The call takes one
+    # slot for its whole duration and raises HasherBusy like hash() and
+    # check() when none is free.
+    def submit(self, func, *args):
+        self._admit()
+        try:
+            future = self._executor.submit(self._call_inline, func, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def hash(self, password):
+        return self._run(self._hash, password)
+
+    def check(self, password, hashed):
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), hashed)
+
+    def _hash(self, password):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds))
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            buckets = list(self._buckets)
+        stats['rounds'] = self.rounds
+        stats['workers'] = self.workers
+        stats['max_queue'] = self.max_queue
+        stats['latency_buckets'] = {
+            **{str(bound): count for bound, count in zip(LATENCY_BUCKETS, buckets)},
+            '+Inf': buckets[-1],
+        }
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,299 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from bulk import find_missing_references, write_bulk
+
+IMPORT_CHUNK_ROWS = 1000
+MAX_IMPORT_CHUNK_ROWS = 5000
+# Only the first errors are kept, so memory stays flat on a bad file
+MAX_REPORTED_ERRORS = 1000
+IMPORT_FORMATS = ('csv', 'ndjson')
+LOOKUP_BATCH = 250
+
+# Fills an id column from natural keys in the row, e.g. studentId from
+# studentEmail, with one query per batch of distinct keys.
+#   keys - (row field, table column) pairs identifying one row of table
+class Lookup:
+    def __init__(self, field, table, keys):
+        self.field = field
+        self.table = table
+        self.keys = keys
+        self.columns = [column for _, column in keys]
+
+    def describe(self, key):
+        return ', '.join(f'{field} {value!r}' for (field, _), value in zip(self.keys, key))
+
+    def resolve(self, cursor, items, errors):
+        wanted = {}
+        for index, item in enumerate(items):
+            if index in errors or item.get(self.field) is not None:
+                continue
+            key = tuple(item.get(field) for field, _ in self.keys)
+            if any(value is None for value in key):
+                continue
+            wanted.setdefault(key, []).append(index)
+
+        found = {}
+        keys = list(wanted)
+        for start in range(0, len(keys), LOOKUP_BATCH):
+            chunk = keys[start:start + LOOKUP_BATCH]
+            if len(self.columns) == 1:
+                where = f"{self.columns[0]} IN ({', '.join('?' for _ in chunk)})"
+            else:
+                row = '(' + ', '.join('?' for _ in self.columns) + ')'
+                where = f"({', '.join(self.columns)}) IN (VALUES {', '.join(row for _ in chunk)})"
+            cursor.execute(f"SELECT id, {', '.join(self.columns)} FROM {self.table} WHERE {where}",
+                           [value for key in chunk for value in key])
+            for row in cursor.fetchall():
+                if isinstance(row, dict):
+                    row = [row['id']] + [row[column] for column in self.columns]
+                found.setdefault(tuple(row[1:]), []).append(row[0])
+
+        for key, indexes in wanted.items():
+            ids = found.get(key, [])
+            for index in indexes:
+                if len(ids) == 1:
+                    items[index][self.field] = ids[0]
+                elif ids:
+                    errors.setdefault(index, []).append(
+                        f'{self.describe(key)} matches {len(ids)} rows in {self.table}')
+                else:
+                    errors.setdefault(index, []).append(f'no {self.table} with {self.describe(key)}')
+
+# What an import of one kind writes: a BulkInsert spec plus the natural-key
+# lookups that may stand in for its id columns, applied in order
+class ImportSpec:
+    def __init__(self, bulk, lookups=()):
+        self.bulk = bulk
+        self.lookups = list(lookups)
+        self.fields = [name for name, _ in bulk.fields]
+        self.allowed = set(self.fields)
+        for lookup in self.lookups:
+            self.allowed.update(field for field, _ in lookup.keys)
+
+    # Fields that neither appear in columns nor can be looked up from them
+    def missing_columns(self, columns):
+        available = set(columns)
+        for lookup in self.lookups:
+            if all(field in available for field, _ in lookup.keys):
+                available.add(lookup.field)
+        return [name for name in self.fields if name not in available]
+
+    def check_columns(self, columns):
+        unknown = [name for name in columns if name not in self.allowed]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        missing = self.missing_columns(columns)
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+
+    # Declared column types of the target table, plus those of the columns
+    # the lookups match on
+    def column_types(self, cursor):
+        types = column_types(cursor, self.bulk.table)
+        for lookup in self.lookups:
+            lookup_types = column_types(cursor, lookup.table)
+            for field, column in lookup.keys:
+                types.setdefault(field, lookup_types.get(column, ''))
+        return types
+
+# Rows are read lazily as (line number, dict or error message). The CSV
+# header is checked up front so a wrong file fails before anything is written.
+# A line the csv module cannot parse (a NUL byte, an oversized field) is
+# reported as an error on that line and reading goes on with the next one.
+def read_csv_rows(stream, spec):
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    try:
+        header = reader.fieldnames
+    except csv.Error as e:
+        raise ValueError(f'invalid CSV header: {e}')
+    if not header:
+        raise ValueError('CSV file has no header row')
+    spec.check_columns(header)
+
+    def rows():
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # DictReader only updates line_num after a good row
+                yield reader.reader.line_num, f'invalid CSV: {e}'
+                continue
+            if None in row:
+                yield reader.line_num, 'more values than header columns'
+            else:
+                yield reader.line_num, row
+    return rows()
+
+def read_ndjson_rows(stream):
+    for line_num, line in enumerate(io.TextIOWrapper(stream, encoding='utf-8-sig'), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_num, f'invalid JSON: {e}'
+            continue
+        yield line_num, row if isinstance(row, dict) else 'row must be an object'
+
+def read_rows(stream, fmt, spec):
+    if fmt == 'csv':
+        return read_csv_rows(stream, spec)
+    if fmt == 'ndjson':
+        return read_ndjson_rows(stream)
+    raise ValueError(f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+
+def column_types(cursor, table):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {(row['name'] if isinstance(row, dict) else row[1]):
+            (row['type'] if isinstance(row, dict) else row[2]).upper()
+            for row in cursor.fetchall()}
+
+# Normalise one parsed row in place: empty strings become missing values and
+# text in INTEGER columns is parsed. Returns a list of problems.
+def coerce_row(spec, types, item):
+    problems = []
+    for name in list(item):
+        value = item[name]
+        if name not in spec.allowed:
+            problems.append(f'unknown column {name}')
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        if value == '':
+            value = None
+        elif types.get(name) == 'INTEGER' and isinstance(value, str):
+            try:
+                value = int(value)
+            except ValueError:
+                problems.append(f'{name} must be an integer')
+        item[name] = value
+    return problems
+
+class ImportResult:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.failed = 0
+        self.chunks = 0
+        self.aborted = False
+        self.errors = []
+
+    def add_error(self, line, messages):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': messages})
+
+    def to_dict(self, include_errors=True):
+        result = {
+            'processed': self.processed,
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'chunks': self.chunks,
+            'aborted': self.aborted,
+        }
+        if include_errors:
+            result['errors'] = self.errors
+            result['errors_truncated'] = self.failed > len(self.errors)
+        return result
+
+# Validate one chunk on a read connection. Returns the rows that can be
+# written, with their line numbers, and reports the rest on result.
+def prepare_chunk(cursor, spec, types, rows, result):
+    lines = []
+    items = []
+    errors = {}
+    for line, row in rows:
+        index = len(items)
+        lines.append(line)
+        if isinstance(row, str):
+            items.append({})
+            errors[index] = [row]
+            continue
+        items.append(row)
+        problems = coerce_row(spec, types, row)
+        if problems:
+            errors[index] = problems
+
+    for lookup in spec.lookups:
+        lookup.resolve(cursor, items, errors)
+    for index, item in enumerate(items):
+        if index not in errors:
+            item_errors = spec.bulk.validate_item(item)
+            if item_errors:
+                errors[index] = item_errors
+    find_missing_references(cursor, spec.bulk, items, errors)
+
+    valid = [(lines[index], item) for index, item in enumerate(items) if index not in errors]
+    for index in sorted(errors):
+        result.add_error(lines[index], errors[index])
+    return valid
+
+# Insert one chunk inside the writer's transaction. Rows that break a
+# constraint are reported and the rest are inserted. If the rest still fail
+# together, they are all reported as failed rather than retried row by row.
+def write_chunk(conn, spec, valid, dry_run):
+    items = [item for _, item in valid]
+    written, errors = write_bulk(conn, spec.bulk, items, dry_run)
+    if written is not None:
+        return written.get('created', written.get('count', 0)), {}
+    remaining = [index for index in range(len(items)) if index not in errors]
+    created = 0
+    if remaining:
+        written, retry_errors = write_bulk(conn, spec.bulk, [items[index] for index in remaining], dry_run)
+        if written is None:
+            for position, index in enumerate(remaining):
+                errors[index] = retry_errors.get(position) or [
+                    'not inserted: the rest of the chunk still broke a constraint']
+        else:
+            created = written.get('created', written.get('count', 0))
+    return created, {valid[index][0]: messages for index, messages in sorted(errors.items())}
+
+# Import rows from read_rows() into the spec's table in chunks of
+# chunk_rows, yielding the running ImportResult after each chunk. Validation
+# and key lookups run on read_conn; each chunk is one job on writer (a
+# db.WriteQueue), so every chunk commits on its own and memory use depends on
+# the chunk size, not the file size.
+# on_error='skip' imports the valid rows and reports the others,
+# on_error='abort' stops at the first chunk that has errors, before writing
+# it when validation caught them.
+def import_chunks(spec, rows, read_conn, writer, chunk_rows=IMPORT_CHUNK_ROWS,
+                  dry_run=False, on_error='skip'):
+    cursor = read_conn.cursor()
+    types = spec.column_types(cursor)
+    result = ImportResult()
+
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            break
+        result.processed += len(chunk)
+        failed_before = result.failed
+        valid = prepare_chunk(cursor, spec, types, chunk, result)
+        if on_error == 'abort' and result.failed > failed_before:
+            result.aborted = True
+            yield result
+            break
+
+        if valid:
+            created, errors = writer.run(lambda conn: write_chunk(conn, spec, valid, dry_run),
+                                         rows=len(valid))
+            result.inserted += created
+            for line, messages in sorted(errors.items()):
+                result.add_error(line, messages)
+        result.chunks += 1
+        if on_error == 'abort' and result.failed > failed_before:
+            result.aborted = True
+        yield result
+        if result.aborted:
+            break
+
+def check_import_options(chunk_rows, on_error):
+    if on_error not in ('skip', 'abort'):
+        raise ValueError('on_error must be skip or abort')
+    if not 1 <= chunk_rows <= MAX_IMPORT_CHUNK_ROWS:
+        raise ValueError(f'Chunk size must be between 1 and {MAX_IMPORT_CHUNK_ROWS}')
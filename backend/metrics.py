@@ -0,0 +1,110 @@
+import re
+import threading
+
+# Bucket upper bounds
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+ROW_BUCKETS = [0, 1, 10, 100, 1000, 10000, 100000, 1000000]
+BYTE_BUCKETS = [100, 1000, 10000, 100000, 1000000, 10000000, 100000000]
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+# Thread-safe store of counters, gauges and histograms, rendered in the
+# Prometheus text exposition format. Updates are a dict lookup and a few
+# additions under one lock, so it is cheap enough to leave on in production.
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, buckets, value, labels=()):
+        key = (name, tuple(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    # Collectors return (name, kind, help, [(sample name, labels dict, value)])
+    # tuples for values that live elsewhere, e.g. connection pool statistics
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h.counts), h.sum, h.count, h.buckets))
+                                for key, h in self._histograms.items())
+
+        lines = []
+        described = set()
+
+        def header(name, kind, text=None):
+            if name in described:
+                return
+            described.add(name)
+            kind, text = self._help.get(name, (kind, text or name))
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f'{name}{format_labels(dict(labels))} {value}')
+
+        for (name, labels), (counts, total, count, buckets) in histograms:
+            header(name, 'histogram')
+            labels = dict(labels)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{format_labels({**labels, "le": bound})} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+
+        for collector in self._collectors:
+            for name, kind, text, samples in collector():
+                header(name, kind, text)
+                for sample_name, labels, value in samples:
+                    lines.append(f'{sample_name}{format_labels(labels)} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+WHITESPACE = re.compile(r'\s+')
+
+def compact_sql(sql, limit=500):
+    sql = WHITESPACE.sub(' ', sql).strip()
+    return sql if len(sql) <= limit else sql[:limit] + '...'
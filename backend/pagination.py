@@ -0,0 +1,93 @@
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Helper to build (name, sql expression) pairs for a table alias
+def table_columns(alias, names):
+    return [(name, f'{alias}.{name}') for name in names]
+
+# Query parameters shared by every list endpoint:
+#   limit  - page size (keyset pagination on the row id)
+#   after  - id of the last row of the previous page
+#   fields - comma separated list of columns to return
+class ListArgs:
+    def __init__(self, limit=None, after=None, fields=None):
+        self.limit = limit
+        self.after = after
+        self.fields = fields
+
+    @property
+    def paginated(self):
+        return self.limit is not None or self.after is not None
+
+    @classmethod
+    def from_request(cls, args):
+        limit = args.get('limit')
+        after = args.get('after')
+        fields = args.get('fields')
+        try:
+            limit = int(limit) if limit not in (None, '') else None
+            after = int(after) if after not in (None, '') else None
+        except ValueError:
+            raise ValueError('limit and after must be integers')
+        if limit is not None and not 1 <= limit <= MAX_LIMIT:
+            raise ValueError(f'limit must be between 1 and {MAX_LIMIT}')
+        if after is not None and limit is None:
+            limit = DEFAULT_LIMIT
+        if fields:
+            fields = [f.strip() for f in fields.split(',') if f.strip()]
+        else:
+            fields = None
+        return cls(limit, after, fields)
+
+# Declarative description of a list query so projection and keyset
+# pagination can be applied the same way on every route
+class ListQuery:
+    def __init__(self, columns, from_clause, key, where=None, params=(),
+                 distinct=False):
+        self.columns = columns
+        self.from_clause = from_clause
+        self.key = key
+        self.where = list(where) if where else []
+        self.params = list(params)
+        self.distinct = distinct
+
+    def select_columns(self, fields=None):
+        if not fields:
+            return self.columns
+        available = dict(self.columns)
+        unknown = [f for f in fields if f not in available]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        # id is always returned so the next cursor can be computed
+        names = ['id'] + [f for f in fields if f != 'id']
+        return [(name, available[name]) for name in names]
+
+    # With json_rows=True each result row is (json object text, key): SQLite
+    # encodes the row itself, so no per-row dict is built in Python.
+    # json_rows='array' encodes a JSON array of the values instead, for the
+    # columnar format. with_key=True appends the key as a last plain column.
+    def build(self, list_args, json_rows=False, with_key=False):
+        columns = self.select_columns(list_args.fields)
+        if json_rows == 'array':
+            values = ', '.join(expr for _, expr in columns)
+            select = f'json_array({values}) AS row, {self.key} AS row_key'
+        elif json_rows:
+            pairs = ', '.join(f"'{name}', {expr}" for name, expr in columns)
+            select = f'json_object({pairs}) AS row, {self.key} AS row_key'
+        else:
+            select = ', '.join(f'{expr} AS {name}' for name, expr in columns)
+            if with_key:
+                select += f', {self.key} AS row_key'
+        where = list(self.where)
+        params = list(self.params)
+        if list_args.after is not None:
+            where.append(f'{self.key} > ?')
+            params.append(list_args.after)
+
+        sql = f"SELECT {'DISTINCT ' if self.distinct else ''}{select} FROM {self.from_clause}"
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if list_args.paginated:
+            sql += f' ORDER BY {self.key} LIMIT ?'
+            params.append(list_args.limit)
+        return sql, params
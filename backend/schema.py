@@ -0,0 +1,692 @@
+from sqlite3 import Error
+
+# Schema migrations, applied in order. The database records the last applied
+# step in PRAGMA user_version, so each step runs exactly once per database.
+
+# 1: base tables and default roles
+def create_base_tables(c):
+    # Create users table with role-based access control
+    c.execute('''CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        role TEXT NOT NULL,
+        reference_id INTEGER,
+        email TEXT UNIQUE NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+    # Create roles table
+    c.execute('''CREATE TABLE IF NOT EXISTS roles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        role_name TEXT UNIQUE NOT NULL,
+        permissions TEXT NOT NULL
+    )''')
+
+    # Insert default roles if they don't exist
+    roles = [
+        ('admin', 'all'),
+        ('teacher', 'courses,students,grades,attendance'),
+        ('student', 'courses,grades'),
+        ('parent', 'grades,attendance'),
+        ('staff', 'courses,attendance'),
+        ('investor', 'none')
+    ]
+
+    c.executemany('''INSERT OR IGNORE INTO roles (role_name, permissions)
+                    VALUES (?, ?)''', roles)
+
+    # Create course table
+    c.execute('''CREATE TABLE IF NOT EXISTS course (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        courseName TEXT NOT NULL,
+        courseDescription TEXT NOT NULL,
+        credits INTEGER NOT NULL
+    )''')
+
+    # Create teachers table
+    c.execute('''CREATE TABLE IF NOT EXISTS teachers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        firstName TEXT NOT NULL,
+        lastName TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        phoneNumber INTEGER UNIQUE NOT NULL,
+        department TEXT NOT NULL
+    )''')
+
+    # Create student table
+    c.execute('''CREATE TABLE IF NOT EXISTS student (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        firstName TEXT NOT NULL,
+        lastName TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        dateOfBirth TEXT NOT NULL,
+        address TEXT NOT NULL,
+        phoneNumber INTEGER UNIQUE NOT NULL
+    )''')
+
+    # Create parent_guardian table
+    c.execute('''CREATE TABLE IF NOT EXISTS parent_guardian (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        firstName TEXT NOT NULL,
+        lastName TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        phoneNumber INTEGER UNIQUE NOT NULL,
+        relationToStudent TEXT NOT NULL
+    )''')
+
+    # Create enrollment table
+    c.execute('''CREATE TABLE IF NOT EXISTS enrollment (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        studentId INTEGER NOT NULL,
+        courseId INTEGER NOT NULL,
+        enrollmentDate DATE NOT NULL,
+        FOREIGN KEY (studentId) REFERENCES student(id),
+        FOREIGN KEY (courseId) REFERENCES course(id)
+    )''')
+
+    # Create grade table
+    c.execute('''CREATE TABLE IF NOT EXISTS grade (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        enrollmentId INTEGER NOT NULL,
+        gradeValue TEXT NOT NULL,
+        FOREIGN KEY (enrollmentId) REFERENCES enrollment(id)
+    )''')
+
+    # Create attendance table
+    c.execute('''CREATE TABLE IF NOT EXISTS attendance (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        enrollmentId INTEGER NOT NULL,
+        date DATE NOT NULL,
+        status TEXT NOT NULL,
+        FOREIGN KEY (enrollmentId) REFERENCES enrollment(id)
+    )''')
+
+    # Create supporting_staff table
+    c.execute('''CREATE TABLE IF NOT EXISTS supporting_staff (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        firstName TEXT NOT NULL,
+        lastName TEXT NOT NULL,
+        role TEXT NOT NULL,
+        department TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL
+    )''')
+
+    # Create investor table
+    c.execute('''CREATE TABLE IF NOT EXISTS investor (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        firstName TEXT NOT NULL,
+        lastName TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        phoneNumber INTEGER UNIQUE NOT NULL,
+        investmentDetails TEXT NOT NULL
+    )''')
+
+    # Create exam_board table
+    c.execute('''CREATE TABLE IF NOT EXISTS exam_board (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        boardName TEXT NOT NULL,
+        contactDetails TEXT NOT NULL
+    )''')
+
+    # Create course_teacher table
+    c.execute('''CREATE TABLE IF NOT EXISTS course_teacher (
+        courseId INTEGER NOT NULL,
+        teacherId INTEGER NOT NULL,
+        PRIMARY KEY (courseId, teacherId),
+        FOREIGN KEY (courseId) REFERENCES course(id),
+        FOREIGN KEY (teacherId) REFERENCES teachers(id)
+    )''')
+
+    # Create course_exam_board table
+    c.execute('''CREATE TABLE IF NOT EXISTS course_exam_board (
+        courseId INTEGER NOT NULL,
+        examBoardId INTEGER NOT NULL,
+        PRIMARY KEY (courseId, examBoardId),
+        FOREIGN KEY (courseId) REFERENCES course(id),
+        FOREIGN KEY (examBoardId) REFERENCES exam_board(id)
+    )''')
+
+# 2: indexes for the join and filter columns used by the role-scoped queries
+def add_role_query_indexes(c):
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_enrollment_student
+                 ON enrollment (studentId, courseId)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_enrollment_course
+                 ON enrollment (courseId, studentId)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_grade_enrollment
+                 ON grade (enrollmentId)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_attendance_enrollment_date
+                 ON attendance (enrollmentId, date)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_course_teacher_teacher
+                 ON course_teacher (teacherId, courseId)''')
+    # Give the query planner statistics for the new indexes
+    c.execute('ANALYZE')
+
+# 3: per-student, per-course and per-date summaries kept up to date by
+# triggers, so dashboards read one row instead of scanning attendance/grade
+GRADE_POINTS = [
+    ('A+', 4.0), ('A', 4.0), ('A-', 3.7),
+    ('B+', 3.3), ('B', 3.0), ('B-', 2.7),
+    ('C+', 2.3), ('C', 2.0), ('C-', 1.7),
+    ('D+', 1.3), ('D', 1.0), ('D-', 0.7),
+    ('F', 0.0),
+]
+
+# Trigger bodies that add or remove one attendance/grade row from the
+# summaries; {row} is NEW or OLD
+ADD_ATTENDANCE = '''
+    INSERT INTO student_attendance_summary (studentId, presentCount, absentCount, totalCount)
+    SELECT e.studentId, {row}.status = 'Present', {row}.status = 'Absent', 1
+    FROM enrollment e WHERE e.id = {row}.enrollmentId
+    ON CONFLICT (studentId) DO UPDATE SET
+        presentCount = presentCount + excluded.presentCount,
+        absentCount = absentCount + excluded.absentCount,
+        totalCount = totalCount + excluded.totalCount;
+    INSERT INTO attendance_daily_summary (date, presentCount, absentCount, totalCount)
+    VALUES ({row}.date, {row}.status = 'Present', {row}.status = 'Absent', 1)
+    ON CONFLICT (date) DO UPDATE SET
+        presentCount = presentCount + excluded.presentCount,
+        absentCount = absentCount + excluded.absentCount,
+        totalCount = totalCount + excluded.totalCount;
+'''
+
+REMOVE_ATTENDANCE = '''
+    UPDATE student_attendance_summary SET
+        presentCount = presentCount - ({row}.status = 'Present'),
+        absentCount = absentCount - ({row}.status = 'Absent'),
+        totalCount = totalCount - 1
+    WHERE studentId = (SELECT studentId FROM enrollment WHERE id = {row}.enrollmentId);
+    UPDATE attendance_daily_summary SET
+        presentCount = presentCount - ({row}.status = 'Present'),
+        absentCount = absentCount - ({row}.status = 'Absent'),
+        totalCount = totalCount - 1
+    WHERE date = {row}.date;
+'''
+
+ADD_GRADE = '''
+    INSERT INTO student_grade_summary (studentId, gradeCount, scoredCount, pointsTotal)
+    SELECT e.studentId, 1, gp.points IS NOT NULL, COALESCE(gp.points, 0)
+    FROM enrollment e LEFT JOIN grade_points gp ON gp.gradeValue = {row}.gradeValue
+    WHERE e.id = {row}.enrollmentId
+    ON CONFLICT (studentId) DO UPDATE SET
+        gradeCount = gradeCount + excluded.gradeCount,
+        scoredCount = scoredCount + excluded.scoredCount,
+        pointsTotal = pointsTotal + excluded.pointsTotal;
+    INSERT INTO course_summary (courseId, enrolledCount, gradeCount, scoredCount, pointsTotal)
+    SELECT e.courseId, 0, 1, gp.points IS NOT NULL, COALESCE(gp.points, 0)
+    FROM enrollment e LEFT JOIN grade_points gp ON gp.gradeValue = {row}.gradeValue
+    WHERE e.id = {row}.enrollmentId
+    ON CONFLICT (courseId) DO UPDATE SET
+        gradeCount = gradeCount + excluded.gradeCount,
+        scoredCount = scoredCount + excluded.scoredCount,
+        pointsTotal = pointsTotal + excluded.pointsTotal;
+'''
+
+REMOVE_GRADE = '''
+    UPDATE student_grade_summary SET
+        gradeCount = gradeCount - 1,
+        scoredCount = scoredCount - (SELECT COUNT(*) FROM grade_points WHERE gradeValue = {row}.gradeValue),
+        pointsTotal = pointsTotal - COALESCE((SELECT points FROM grade_points WHERE gradeValue = {row}.gradeValue), 0)
+    WHERE studentId = (SELECT studentId FROM enrollment WHERE id = {row}.enrollmentId);
+    UPDATE course_summary SET
+        gradeCount = gradeCount - 1,
+        scoredCount = scoredCount - (SELECT COUNT(*) FROM grade_points WHERE gradeValue = {row}.gradeValue),
+        pointsTotal = pointsTotal - COALESCE((SELECT points FROM grade_points WHERE gradeValue = {row}.gradeValue), 0)
+    WHERE courseId = (SELECT courseId FROM enrollment WHERE id = {row}.enrollmentId);
+'''
+
+# An enrollment carries its grades and attendance with it: moving one to
+# another student or course moves their totals, and deleting one drops them
+# (grades or attendance deleted afterwards no longer match an enrollment and
+# change nothing, as in rebuild_summaries). The daily attendance totals do
+# not depend on the enrollment and are left alone.
+ADD_ENROLLMENT = '''
+    INSERT INTO course_summary (courseId, enrolledCount, gradeCount, scoredCount, pointsTotal)
+    SELECT {row}.courseId, 1, COUNT(*), COUNT(gp.points), COALESCE(SUM(gp.points), 0)
+    FROM grade g LEFT JOIN grade_points gp ON gp.gradeValue = g.gradeValue
+    WHERE g.enrollmentId = {row}.id
+    ON CONFLICT (courseId) DO UPDATE SET
+        enrolledCount = enrolledCount + excluded.enrolledCount,
+        gradeCount = gradeCount + excluded.gradeCount,
+        scoredCount = scoredCount + excluded.scoredCount,
+        pointsTotal = pointsTotal + excluded.pointsTotal;
+    INSERT INTO student_grade_summary (studentId, gradeCount, scoredCount, pointsTotal)
+    SELECT {row}.studentId, COUNT(*), COUNT(gp.points), COALESCE(SUM(gp.points), 0)
+    FROM grade g LEFT JOIN grade_points gp ON gp.gradeValue = g.gradeValue
+    WHERE g.enrollmentId = {row}.id
+    HAVING COUNT(*) > 0
+    ON CONFLICT (studentId) DO UPDATE SET
+        gradeCount = gradeCount + excluded.gradeCount,
+        scoredCount = scoredCount + excluded.scoredCount,
+        pointsTotal = pointsTotal + excluded.pointsTotal;
+    INSERT INTO student_attendance_summary (studentId, presentCount, absentCount, totalCount)
+    SELECT {row}.studentId, SUM(status = 'Present'), SUM(status = 'Absent'), COUNT(*)
+    FROM attendance WHERE enrollmentId = {row}.id
+    HAVING COUNT(*) > 0
+    ON CONFLICT (studentId) DO UPDATE SET
+        presentCount = presentCount + excluded.presentCount,
+        absentCount = absentCount + excluded.absentCount,
+        totalCount = totalCount + excluded.totalCount;
+'''
+
+ENROLLMENT_GRADES = '''(SELECT {aggregate} FROM grade g
+        LEFT JOIN grade_points gp ON gp.gradeValue = g.gradeValue
+        WHERE g.enrollmentId = {row}.id)'''
+
+REMOVE_ENROLLMENT = '''
+    UPDATE course_summary SET
+        enrolledCount = enrolledCount - 1,
+        gradeCount = gradeCount - {grades},
+        scoredCount = scoredCount - {scored},
+        pointsTotal = pointsTotal - {points}
+    WHERE courseId = {row}.courseId;
+    UPDATE student_grade_summary SET
+        gradeCount = gradeCount - {grades},
+        scoredCount = scoredCount - {scored},
+        pointsTotal = pointsTotal - {points}
+    WHERE studentId = {row}.studentId;
+    UPDATE student_attendance_summary SET
+        presentCount = presentCount - (SELECT COUNT(*) FROM attendance
+                                       WHERE enrollmentId = {row}.id AND status = 'Present'),
+        absentCount = absentCount - (SELECT COUNT(*) FROM attendance
+                                     WHERE enrollmentId = {row}.id AND status = 'Absent'),
+        totalCount = totalCount - (SELECT COUNT(*) FROM attendance WHERE enrollmentId = {row}.id)
+    WHERE studentId = {row}.studentId;
+'''
+
+def remove_enrollment(row):
+    return REMOVE_ENROLLMENT.format(
+        row=row,
+        grades=ENROLLMENT_GRADES.format(aggregate='COUNT(*)', row=row),
+        scored=ENROLLMENT_GRADES.format(aggregate='COUNT(gp.points)', row=row),
+        points=ENROLLMENT_GRADES.format(aggregate='COALESCE(SUM(gp.points), 0)', row=row))
+
+def enrollment_summary_triggers():
+    return [
+        ('enrollment_summary_insert', 'AFTER INSERT ON enrollment',
+         ADD_ENROLLMENT.format(row='NEW')),
+        ('enrollment_summary_delete', 'AFTER DELETE ON enrollment', remove_enrollment('OLD')),
+        ('enrollment_summary_update', 'AFTER UPDATE OF id, studentId, courseId ON enrollment',
+         remove_enrollment('OLD') + ADD_ENROLLMENT.format(row='NEW')),
+    ]
+
+def add_summary_tables(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS grade_points (
+        gradeValue TEXT PRIMARY KEY,
+        points REAL NOT NULL
+    )''')
+    c.executemany('INSERT OR IGNORE INTO grade_points (gradeValue, points) VALUES (?, ?)',
+                  GRADE_POINTS)
+
+    c.execute('''CREATE TABLE IF NOT EXISTS student_attendance_summary (
+        studentId INTEGER PRIMARY KEY,
+        presentCount INTEGER NOT NULL DEFAULT 0,
+        absentCount INTEGER NOT NULL DEFAULT 0,
+        totalCount INTEGER NOT NULL DEFAULT 0
+    )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS attendance_daily_summary (
+        date DATE PRIMARY KEY,
+        presentCount INTEGER NOT NULL DEFAULT 0,
+        absentCount INTEGER NOT NULL DEFAULT 0,
+        totalCount INTEGER NOT NULL DEFAULT 0
+    )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS student_grade_summary (
+        studentId INTEGER PRIMARY KEY,
+        gradeCount INTEGER NOT NULL DEFAULT 0,
+        scoredCount INTEGER NOT NULL DEFAULT 0,
+        pointsTotal REAL NOT NULL DEFAULT 0
+    )''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS course_summary (
+        courseId INTEGER PRIMARY KEY,
+        enrolledCount INTEGER NOT NULL DEFAULT 0,
+        gradeCount INTEGER NOT NULL DEFAULT 0,
+        scoredCount INTEGER NOT NULL DEFAULT 0,
+        pointsTotal REAL NOT NULL DEFAULT 0
+    )''')
+
+    triggers = [
+        ('attendance_summary_insert', 'AFTER INSERT ON attendance',
+         ADD_ATTENDANCE.format(row='NEW')),
+        ('attendance_summary_delete', 'AFTER DELETE ON attendance',
+         REMOVE_ATTENDANCE.format(row='OLD')),
+        ('attendance_summary_update', 'AFTER UPDATE OF enrollmentId, date, status ON attendance',
+         REMOVE_ATTENDANCE.format(row='OLD') + ADD_ATTENDANCE.format(row='NEW')),
+        ('grade_summary_insert', 'AFTER INSERT ON grade',
+         ADD_GRADE.format(row='NEW')),
+        ('grade_summary_delete', 'AFTER DELETE ON grade',
+         REMOVE_GRADE.format(row='OLD')),
+        ('grade_summary_update', 'AFTER UPDATE OF enrollmentId, gradeValue ON grade',
+         REMOVE_GRADE.format(row='OLD') + ADD_GRADE.format(row='NEW')),
+    ] + enrollment_summary_triggers()
+    for name, event, body in triggers:
+        c.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event}\nBEGIN{body}END')
+
+    rebuild_summaries(c)
+
+# Recompute every summary table from the base tables. The triggers keep
+# them current; this is for repairs (e.g. after editing enrollments by hand).
+def rebuild_summaries(c):
+    c.execute('DELETE FROM student_attendance_summary')
+    c.execute('''
+        INSERT INTO student_attendance_summary (studentId, presentCount, absentCount, totalCount)
+        SELECT e.studentId, SUM(a.status = 'Present'), SUM(a.status = 'Absent'), COUNT(*)
+        FROM attendance a
+        JOIN enrollment e ON a.enrollmentId = e.id
+        GROUP BY e.studentId
+    ''')
+
+    c.execute('DELETE FROM attendance_daily_summary')
+    c.execute('''
+        INSERT INTO attendance_daily_summary (date, presentCount, absentCount, totalCount)
+        SELECT date, SUM(status = 'Present'), SUM(status = 'Absent'), COUNT(*)
+        FROM attendance
+        GROUP BY date
+    ''')
+
+    c.execute('DELETE FROM student_grade_summary')
+    c.execute('''
+        INSERT INTO student_grade_summary (studentId, gradeCount, scoredCount, pointsTotal)
+        SELECT e.studentId, COUNT(*), COUNT(gp.points), COALESCE(SUM(gp.points), 0)
+        FROM grade g
+        JOIN enrollment e ON g.enrollmentId = e.id
+        LEFT JOIN grade_points gp ON gp.gradeValue = g.gradeValue
+        GROUP BY e.studentId
+    ''')
+
+    c.execute('DELETE FROM course_summary')
+    c.execute('''
+        INSERT INTO course_summary (courseId, enrolledCount, gradeCount, scoredCount, pointsTotal)
+        SELECT e.courseId, COUNT(DISTINCT e.id), COUNT(g.id), COUNT(gp.points),
+               COALESCE(SUM(gp.points), 0)
+        FROM enrollment e
+        LEFT JOIN grade g ON g.enrollmentId = e.id
+        LEFT JOIN grade_points gp ON gp.gradeValue = g.gradeValue
+        GROUP BY e.courseId
+    ''')
+
+# 4: per-table change versions. Every insert, update or delete bumps the
+# table's row in table_version, so readers can tell whether anything they
+# depend on changed with one primary-key lookup (used for ETags).
+VERSIONED_TABLES = ['course', 'student', 'teachers', 'parent_guardian', 'enrollment',
+                    'grade', 'attendance', 'course_teacher']
+
+BUMP_VERSION = '''
+    UPDATE table_version
+    SET version = version + 1, updatedAt = strftime('%Y-%m-%d %H:%M:%S', 'now')
+    WHERE tableName = '{table}';
+'''
+
+def add_table_versions(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS table_version (
+        tableName TEXT PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 1,
+        updatedAt TEXT NOT NULL
+    ) WITHOUT ROWID''')
+    add_version_triggers(c, VERSIONED_TABLES)
+
+def add_version_triggers(c, tables):
+    c.executemany('''INSERT OR IGNORE INTO table_version (tableName, version, updatedAt)
+                     VALUES (?, 1, strftime('%Y-%m-%d %H:%M:%S', 'now'))''',
+                  [(table,) for table in tables])
+
+    for table in tables:
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            c.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN{BUMP_VERSION.format(table=table)}END''')
+
+# 5: full-text search over people. One external-content FTS5 index per
+# table stores only the index, not a second copy of the rows; triggers keep
+# it in step with the table. prefix='2 3' adds prefix indexes so
+# search-as-you-type queries like "jo*" avoid a scan of the term list.
+SEARCH_TABLES = ['student', 'teachers', 'parent_guardian']
+SEARCH_COLUMNS = ['firstName', 'lastName', 'email']
+
+def add_people_search(c):
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_values = ', '.join(f'NEW.{column}' for column in SEARCH_COLUMNS)
+    old_values = ', '.join(f'OLD.{column}' for column in SEARCH_COLUMNS)
+    for table in SEARCH_TABLES:
+        index = f'{table}_search'
+        c.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(
+            {columns}, content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )''')
+        add = f'INSERT INTO {index} (rowid, {columns}) VALUES (NEW.id, {new_values});'
+        remove = (f"INSERT INTO {index} ({index}, rowid, {columns}) "
+                  f"VALUES ('delete', OLD.id, {old_values});")
+        triggers = [
+            (f'{index}_insert', f'AFTER INSERT ON {table}', add),
+            (f'{index}_delete', f'AFTER DELETE ON {table}', remove),
+            (f'{index}_update', f'AFTER UPDATE OF {columns} ON {table}', remove + '\n    ' + add),
+        ]
+        for name, event, body in triggers:
+            c.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event}\nBEGIN\n    {body}\nEND')
+        # Name matches rank above email matches
+        c.execute(f"INSERT INTO {index} ({index}, rank) VALUES ('rank', 'bm25(2.0, 2.0, 1.0)')")
+    rebuild_search(c)
+
+# Re-index every search table from its content table
+def rebuild_search(c):
+    for table in SEARCH_TABLES:
+        c.execute(f"INSERT INTO {table}_search ({table}_search) VALUES ('rebuild')")
+
+# 6: parent-student links and materialised access scopes. enrollment_scope
+# holds, for every teacher and parent, the enrollments they may see; the
+# triggers below keep it current as course_teacher, enrollment and
+# parent_student change, so a role-scoped query is one indexed semi-join on
+# (viewerRole, viewerId) instead of a join through the assignment tables.
+TEACHER_SCOPE = '''
+    INSERT OR IGNORE INTO enrollment_scope (viewerRole, viewerId, enrollmentId, studentId)
+    SELECT 'teacher', ct.teacherId, e.id, e.studentId
+    FROM course_teacher ct JOIN enrollment e ON e.courseId = ct.courseId
+    WHERE {where};
+'''
+
+PARENT_SCOPE = '''
+    INSERT OR IGNORE INTO enrollment_scope (viewerRole, viewerId, enrollmentId, studentId)
+    SELECT 'parent', ps.parentId, e.id, e.studentId
+    FROM parent_student ps JOIN enrollment e ON e.studentId = ps.studentId
+    WHERE {where};
+'''
+
+REMOVE_TEACHER_SCOPE = '''
+    DELETE FROM enrollment_scope
+    WHERE viewerRole = 'teacher' AND viewerId = OLD.teacherId
+      AND enrollmentId IN (SELECT id FROM enrollment WHERE courseId = OLD.courseId);
+'''
+
+REMOVE_PARENT_SCOPE = '''
+    DELETE FROM enrollment_scope
+    WHERE viewerRole = 'parent' AND viewerId = OLD.parentId
+      AND enrollmentId IN (SELECT id FROM enrollment WHERE studentId = OLD.studentId);
+'''
+
+REMOVE_ENROLLMENT_SCOPE = '''
+    DELETE FROM enrollment_scope WHERE enrollmentId = OLD.id;
+'''
+
+def add_access_scope(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS parent_student (
+        parentId INTEGER NOT NULL,
+        studentId INTEGER NOT NULL,
+        PRIMARY KEY (parentId, studentId),
+        FOREIGN KEY (parentId) REFERENCES parent_guardian(id),
+        FOREIGN KEY (studentId) REFERENCES student(id)
+    ) WITHOUT ROWID''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_parent_student_student
+                 ON parent_student (studentId, parentId)''')
+    # Until now a parent saw the student whose id equals their own; keep
+    # those pairs as explicit links
+    c.execute('''INSERT OR IGNORE INTO parent_student (parentId, studentId)
+                 SELECT pg.id, s.id FROM parent_guardian pg JOIN student s ON s.id = pg.id''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS enrollment_scope (
+        viewerRole TEXT NOT NULL,
+        viewerId INTEGER NOT NULL,
+        enrollmentId INTEGER NOT NULL,
+        studentId INTEGER NOT NULL,
+        PRIMARY KEY (viewerRole, viewerId, enrollmentId)
+    ) WITHOUT ROWID''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_enrollment_scope_enrollment
+                 ON enrollment_scope (enrollmentId)''')
+
+    triggers = [
+        ('course_teacher_scope_insert', 'AFTER INSERT ON course_teacher',
+         TEACHER_SCOPE.format(where='ct.courseId = NEW.courseId AND ct.teacherId = NEW.teacherId')),
+        ('course_teacher_scope_delete', 'AFTER DELETE ON course_teacher', REMOVE_TEACHER_SCOPE),
+        ('course_teacher_scope_update', 'AFTER UPDATE OF courseId, teacherId ON course_teacher',
+         REMOVE_TEACHER_SCOPE +
+         TEACHER_SCOPE.format(where='ct.courseId = NEW.courseId AND ct.teacherId = NEW.teacherId')),
+        ('parent_student_scope_insert', 'AFTER INSERT ON parent_student',
+         PARENT_SCOPE.format(where='ps.parentId = NEW.parentId AND ps.studentId = NEW.studentId')),
+        ('parent_student_scope_delete', 'AFTER DELETE ON parent_student', REMOVE_PARENT_SCOPE),
+        ('parent_student_scope_update', 'AFTER UPDATE OF parentId, studentId ON parent_student',
+         REMOVE_PARENT_SCOPE +
+         PARENT_SCOPE.format(where='ps.parentId = NEW.parentId AND ps.studentId = NEW.studentId')),
+        ('enrollment_scope_insert', 'AFTER INSERT ON enrollment',
+         TEACHER_SCOPE.format(where='e.id = NEW.id') + PARENT_SCOPE.format(where='e.id = NEW.id')),
+        ('enrollment_scope_delete', 'AFTER DELETE ON enrollment', REMOVE_ENROLLMENT_SCOPE),
+        ('enrollment_scope_update', 'AFTER UPDATE OF studentId, courseId ON enrollment',
+         REMOVE_ENROLLMENT_SCOPE + TEACHER_SCOPE.format(where='e.id = NEW.id') +
+         PARENT_SCOPE.format(where='e.id = NEW.id')),
+        # Links go with the people they link
+        ('student_parent_links_delete', 'AFTER DELETE ON student', '''
+    DELETE FROM parent_student WHERE studentId = OLD.id;
+'''),
+        ('parent_student_links_delete', 'AFTER DELETE ON parent_guardian', '''
+    DELETE FROM parent_student WHERE parentId = OLD.id;
+'''),
+    ]
+    for name, event, body in triggers:
+        c.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event}\nBEGIN{body}END')
+
+    add_version_triggers(c, ['parent_student'])
+    rebuild_access_scope(c)
+    c.execute('ANALYZE')
+
+# Recompute enrollment_scope from course_teacher, parent_student and enrollment
+def rebuild_access_scope(c):
+    c.execute('DELETE FROM enrollment_scope')
+    c.execute(TEACHER_SCOPE.format(where='1'))
+    c.execute(PARENT_SCOPE.format(where='1'))
+
+# 7: token versions. Every token carries its user's tokenVersion; bumping
+# it revokes all of that user's tokens. users is versioned so processes can
+# tell cheaply whether their in-memory copy of the versions is stale.
+def add_token_versions(c):
+    c.execute('ALTER TABLE users ADD COLUMN tokenVersion INTEGER NOT NULL DEFAULT 0')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_users_token_version
+                 ON users (tokenVersion) WHERE tokenVersion > 0''')
+    add_version_triggers(c, ['users'])
+
+# 8: change log. Triggers append one row per insert, update or delete on the
+# tables below, in the same transaction as the change, with the new row as
+# JSON (NULL for deletes) and the enrollment it belongs to so feeds can be
+# filtered by role scope. seq orders the changes; clients resume from the
+# last seq they saw.
+CHANGE_LOG_TABLES = {
+    # table -> expression giving the enrollment a row belongs to
+    'course': None,
+    'student': None,
+    'teachers': None,
+    'parent_guardian': None,
+    'enrollment': '{row}.id',
+    'grade': '{row}.enrollmentId',
+    'attendance': '{row}.enrollmentId',
+}
+
+LOG_CHANGE = '''
+    INSERT INTO change_log (tableName, rowId, op, enrollmentId, data)
+    VALUES ('{table}', {row}.id, '{op}', {enrollment}, {data});
+'''
+
+def add_change_log(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tableName TEXT NOT NULL,
+        rowId INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        enrollmentId INTEGER,
+        data TEXT,
+        createdAt TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+    )''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_change_log_created
+                 ON change_log (createdAt)''')
+    create_change_log_triggers(c)
+
+def create_change_log_triggers(c):
+    for table, enrollment in CHANGE_LOG_TABLES.items():
+        c.execute(f'PRAGMA table_info({table})')
+        columns = [row['name'] if isinstance(row, dict) else row[1] for row in c.fetchall()]
+        for op, row in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+            data = 'NULL' if op == 'delete' else (
+                'json_object(' + ', '.join(f"'{column}', NEW.{column}" for column in columns) + ')')
+            body = LOG_CHANGE.format(table=table, row=row, op=op, data=data,
+                                     enrollment=enrollment.format(row=row) if enrollment else 'NULL')
+            c.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_change_{op}
+                AFTER {op.upper()} ON {table}
+                BEGIN{body}END''')
+
+# For bulk loads that replace the data wholesale (see DataEntry.generate_data),
+# where logging every row would only give feed clients a huge log to replay
+def drop_change_log_triggers(c):
+    for table in CHANGE_LOG_TABLES:
+        for op in ('insert', 'update', 'delete'):
+            c.execute(f'DROP TRIGGER IF EXISTS {table}_change_{op}')
+
+MIGRATIONS = [
+    (1, create_base_tables),
+    (2, add_role_query_indexes),
+    (3, add_summary_tables),
+    (4, add_table_versions),
+    (5, add_people_search),
+    (6, add_access_scope),
+    (7, add_token_versions),
+    (8, add_change_log),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    row = conn.execute('PRAGMA user_version').fetchone()
+    return row['user_version'] if isinstance(row, dict) else row[0]
+
+def get_pending_migrations(conn):
+    current = get_schema_version(conn)
+    return [version for version, _ in MIGRATIONS if version > current]
+
+# Apply every migration newer than the database's user_version. Each step
+# runs in its own write transaction together with its version bump, and the
+# version is re-read under the write lock so concurrent runners (several
+# workers starting at once) never apply a step twice.
+def run_migrations(conn):
+    applied = []
+    for version, migration in MIGRATIONS:
+        c = conn.cursor()
+        c.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            migration(c)
+            c.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Error:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+# EXPLAIN QUERY PLAN a query and return the steps that read a whole table
+def find_table_scans(conn, sql, params=()):
+    plan = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    scans = []
+    for row in plan:
+        detail = row['detail'] if isinstance(row, dict) else row[3]
+        if detail.startswith('SCAN '):
+            scans.append(detail)
+    return scans
@@ -0,0 +1,89 @@
+import re
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# Ranked results are paged by offset; deep pages are refused since each one
+# ranks every row before it
+MAX_SEARCH_OFFSET = 1000
+MAX_SEARCH_TERMS = 8
+# Single letters match a large share of any school and cost a full ranking
+# pass, so they only narrow a query that has a longer word
+MIN_TERM_LENGTH = 2
+
+# Search type -> table with a <table>_search FTS5 index (see schema.py)
+SEARCH_TYPES = {
+    'student': 'student',
+    'teacher': 'teachers',
+    'parent': 'parent_guardian',
+}
+
+# Turn free text into an FTS5 query where every word must match the start of
+# a token, so "jo smi" finds John Smith. Words are taken the way the
+# unicode61 tokenizer splits them, which also keeps FTS5 syntax out.
+def match_expression(text):
+    terms = re.findall(r'\w+', text or '')[:MAX_SEARCH_TERMS]
+    if not any(len(term) >= MIN_TERM_LENGTH for term in terms):
+        raise ValueError(f'q must contain a word of at least {MIN_TERM_LENGTH} characters')
+    return ' '.join(f'"{term}"*' for term in terms)
+
+# Query parameters of the search endpoint:
+#   q     - words to look for in firstName, lastName and email
+#   type  - comma separated search types, all allowed ones by default
+#   limit - page size
+#   after - next_cursor of the previous page
+class SearchArgs:
+    def __init__(self, match, types, limit=SEARCH_LIMIT, offset=0):
+        self.match = match
+        self.types = types
+        self.limit = limit
+        self.offset = offset
+
+    @classmethod
+    def from_request(cls, args, allowed_types):
+        match = match_expression(args.get('q'))
+        types = args.get('type')
+        if types:
+            types = [t.strip() for t in types.split(',') if t.strip()]
+            unknown = [t for t in types if t not in SEARCH_TYPES]
+            if unknown:
+                raise ValueError(f"Unknown types: {', '.join(unknown)}")
+            types = [t for t in SEARCH_TYPES if t in types]
+        else:
+            types = [t for t in SEARCH_TYPES if t in allowed_types]
+        try:
+            limit = int(args.get('limit') or SEARCH_LIMIT)
+            offset = int(args.get('after') or 0)
+        except ValueError:
+            raise ValueError('limit and after must be integers')
+        if not 1 <= limit <= MAX_SEARCH_LIMIT:
+            raise ValueError(f'limit must be between 1 and {MAX_SEARCH_LIMIT}')
+        if not 0 <= offset <= MAX_SEARCH_OFFSET:
+            raise ValueError(f'after must be between 0 and {MAX_SEARCH_OFFSET}')
+        return cls(match, types, limit, offset)
+
+# One sub-select per type. Each lets FTS5 rank its matches and keep only the
+# first offset + limit, so the final merge sorts at most that many rows per
+# type. filters maps a type to (sql, params) selecting the ids the caller
+# may see. Scores are negated bm25 values: higher is a better match.
+def build_search(search_args, filters=None):
+    keep = search_args.offset + search_args.limit
+    parts = []
+    params = []
+    for search_type in search_args.types:
+        table = SEARCH_TYPES[search_type]
+        index = f'{table}_search'
+        where = [f'{index} MATCH ?']
+        params.append(search_args.match)
+        if filters and search_type in filters:
+            sql, filter_params = filters[search_type]
+            where.append(f'rowid IN ({sql})')
+            params.extend(filter_params)
+        params.append(keep)
+        parts.append(f"""SELECT '{search_type}' AS type, t.id AS id, t.firstName AS firstName,
+                   t.lastName AS lastName, t.email AS email, -m.rank AS score
+            FROM (SELECT rowid, rank FROM {index} WHERE {' AND '.join(where)}
+                  ORDER BY rank LIMIT ?) m
+            JOIN {table} t ON t.id = m.rowid""")
+    sql = ' UNION ALL '.join(parts) + ' ORDER BY score DESC, type, id LIMIT ? OFFSET ?'
+    params.extend([search_args.limit, search_args.offset])
+    return sql, params
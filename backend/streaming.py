@@ -0,0 +1,31 @@
+STREAM_CHUNK_SIZE = 500
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Pull rows from the cursor in chunks so the full result set is never held
+# in memory at once
+def iter_rows(cursor, chunk_size=STREAM_CHUNK_SIZE):
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield from rows
+
+# Rows are (json object text, key) tuples as built by ListQuery(json_rows=True)
+
+# One JSON document per line
+def iter_ndjson(rows):
+    for row in rows:
+        yield row[0] + '\n'
+
+# A regular JSON array, written out element by element
+def iter_json_array(rows):
+    yield '['
+    first = True
+    for row in rows:
+        if first:
+            first = False
+            yield row[0]
+        else:
+            yield ',' + row[0]
+    yield ']\n'
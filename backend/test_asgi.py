@@ -0,0 +1,85 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import Executor, Future
+
+import pytest
+
+# app reads its configuration on import, so point it at a scratch database
+# before importing it
+os.environ.setdefault('DATABASE', os.path.join(tempfile.mkdtemp(), 'test.db'))
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-that-is-at-least-32-bytes')
+
+import app as app_module
+import asgi
+
+# Runs every call on a thread of its own, the worst case for a response
+# whose chunks are pulled by separate executor calls
+class ThreadPerCallExecutor(Executor):
+    def __init__(self):
+        self.calls = 0
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.calls += 1
+
+        def run():
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        return future
+
+@pytest.fixture(scope='module')
+def admin_token():
+    client = app_module.app.test_client()
+    client.post('/api/auth/register', json={'username': 'asgi_admin', 'password': 'secret',
+                                            'email': 'asgi_admin@x', 'role': 'admin'})
+    response = client.post('/api/auth/login', json={'username': 'asgi_admin', 'password': 'secret'})
+    return response.get_json()['token']
+
+def call(method, path, token, body=b'', query=b'', headers=()):
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query,
+             'http_version': '1.1',
+             'headers': [(b'authorization', f'Bearer {token}'.encode()),
+                         (b'content-length', str(len(body)).encode()), *headers]}
+    asyncio.run(asgi.application(scope, receive, send))
+    return sent
+
+def test_buffered_response(admin_token):
+    sent = call('GET', '/api/courses', admin_token)
+    assert sent[0]['status'] == 200
+    assert json.loads(b''.join(message.get('body', b'') for message in sent[1:])) == []
+
+def test_streamed_response_keeps_request_context_across_threads(monkeypatch, admin_token):
+    executor = ThreadPerCallExecutor()
+    monkeypatch.setattr(asgi, 'executor', executor)
+    rows = ''.join(json.dumps({'firstName': f'S{n}', 'lastName': 'L', 'email': f'asgi{n}@x',
+                               'dateOfBirth': '2010-01-01', 'address': 'a',
+                               'phoneNumber': 9000 + n}) + '\n' for n in range(3))
+    sent = call('POST', '/api/import/students', admin_token, rows.encode(),
+                query=b'chunk=1&format=ndjson',
+                headers=[(b'accept', b'application/x-ndjson')])
+    assert sent[0]['status'] == 200
+    chunks = [message['body'] for message in sent[1:] if message['body']]
+    events = [json.loads(line) for line in b''.join(chunks).splitlines()]
+    assert [event['event'] for event in events] == ['progress'] * 3 + ['done']
+    assert events[-1]['inserted'] == 3
+    # One chunk per progress line, each pulled by a separate call
+    assert len(chunks) == 4 and executor.calls >= 5
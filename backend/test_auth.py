@@ -0,0 +1,107 @@
+import os
+import tempfile
+
+import pytest
+
+# app reads its configuration on import, so point it at a scratch database
+# before importing it
+os.environ.setdefault('DATABASE', os.path.join(tempfile.mkdtemp(), 'test.db'))
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-that-is-at-least-32-bytes')
+
+import app as app_module
+from app import app
+
+@pytest.fixture(scope='module')
+def client():
+    return app.test_client()
+
+def login(client, username, role='admin'):
+    client.post('/api/auth/register', json={'username': username, 'password': 'secret',
+                                            'email': f'{username}@x', 'role': role})
+    return client.post('/api/auth/login', json={'username': username, 'password': 'secret'}).get_json()
+
+def bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+@pytest.fixture
+def claims_mode(monkeypatch):
+    monkeypatch.setitem(app.config, 'AUTH_MODE', 'claims')
+    loads = []
+    load_user = app_module.load_user
+    monkeypatch.setattr(app_module, 'load_user', lambda user_id: loads.append(user_id) or load_user(user_id))
+    return loads
+
+def test_claims_mode_builds_the_user_from_the_token_on_get(client, claims_mode):
+    body = login(client, 'auth_claims')
+    response = client.get('/api/courses', headers=bearer(body['token']))
+    assert response.status_code == 200
+    assert claims_mode == []
+
+def test_claims_mode_loads_the_user_for_writes(client, claims_mode):
+    body = login(client, 'auth_claims_write')
+    response = client.post('/api/courses', json={'courseName': 'Auth 101', 'courseDescription': 'd',
+                                                 'credits': 3}, headers=bearer(body['token']))
+    assert response.status_code == 201
+    assert claims_mode == [body['user']['id']]
+
+def test_database_mode_loads_the_user(client, monkeypatch):
+    loads = []
+    load_user = app_module.load_user
+    monkeypatch.setattr(app_module, 'load_user', lambda user_id: loads.append(user_id) or load_user(user_id))
+    body = login(client, 'auth_database')
+    assert client.get('/api/courses', headers=bearer(body['token'])).status_code == 200
+    assert loads == [body['user']['id']]
+
+def test_refresh_issues_a_working_access_token(client):
+    body = login(client, 'auth_refresh')
+    response = client.post('/api/auth/refresh', json={'refresh_token': body['refresh_token']})
+    assert response.status_code == 200
+    assert client.get('/api/courses', headers=bearer(response.get_json()['token'])).status_code == 200
+
+def test_token_types_are_not_interchangeable(client):
+    body = login(client, 'auth_types')
+    response = client.post('/api/auth/refresh', json={'refresh_token': body['token']})
+    assert (response.status_code, response.get_json()['message']) == (401, 'Invalid token')
+    response = client.get('/api/courses', headers=bearer(body['refresh_token']))
+    assert (response.status_code, response.get_json()['message']) == (401, 'Invalid token')
+    response = client.post('/api/auth/refresh', json={})
+    assert (response.status_code, response.get_json()['message']) == (401, 'Refresh token is missing')
+
+@pytest.mark.parametrize('mode', ['database', 'claims'])
+def test_logout_revokes_access_and_refresh_tokens(client, monkeypatch, mode):
+    monkeypatch.setitem(app.config, 'AUTH_MODE', mode)
+    body = login(client, f'auth_logout_{mode}')
+    assert client.post('/api/auth/logout', headers=bearer(body['token'])).status_code == 200
+    response = client.get('/api/courses', headers=bearer(body['token']))
+    assert (response.status_code, response.get_json()['message']) == (401, 'Token has been revoked')
+    response = client.post('/api/auth/refresh', json={'refresh_token': body['refresh_token']})
+    assert (response.status_code, response.get_json()['message']) == (401, 'Token has been revoked')
+    fresh = client.post('/api/auth/login', json={'username': f'auth_logout_{mode}', 'password': 'secret'})
+    assert client.get('/api/courses', headers=bearer(fresh.get_json()['token'])).status_code == 200
+
+def test_admin_revokes_another_users_tokens(client):
+    admin = login(client, 'auth_revoke_admin')
+    user = login(client, 'auth_revoke_teacher', 'teacher')
+    response = client.post(f"/api/users/{user['user']['id']}/revoke-tokens", headers=bearer(admin['token']))
+    assert response.status_code == 200
+    response = client.get('/api/courses', headers=bearer(user['token']))
+    assert (response.status_code, response.get_json()['message']) == (401, 'Token has been revoked')
+    assert client.get('/api/courses', headers=bearer(admin['token'])).status_code == 200
+    response = client.post('/api/users/999999/revoke-tokens', headers=bearer(admin['token']))
+    assert response.status_code == 404
+
+def test_only_admins_revoke_tokens(client):
+    user = login(client, 'auth_revoke_self', 'teacher')
+    response = client.post(f"/api/users/{user['user']['id']}/revoke-tokens", headers=bearer(user['token']))
+    assert response.status_code == 403
+
+def test_query_token_is_only_taken_by_the_change_stream(client, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHANGE_STREAM_SECONDS', 0)
+    token = login(client, 'auth_query_token')['token']
+    response = client.get(f'/api/changes/stream?access_token={token}')
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    response.close()
+    for accept in ('application/json', 'text/event-stream'):
+        response = client.get(f'/api/changes?access_token={token}', headers={'Accept': accept})
+        assert (response.status_code, response.get_json()['message']) == (401, 'Token is missing')
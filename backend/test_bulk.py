@@ -0,0 +1,78 @@
+import sqlite3
+
+import pytest
+
+from bulk import BulkInsert, validate_bulk, write_bulk
+from schema import run_migrations
+
+STUDENTS = BulkInsert('student', [
+    ('firstName', str), ('lastName', str), ('email', str),
+    ('dateOfBirth', str), ('address', str), ('phoneNumber', None)])
+
+GRADES = BulkInsert('grade', [('enrollmentId', int), ('gradeValue', str)],
+                    references={'enrollmentId': 'enrollment'})
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:', isolation_level=None)
+    run_migrations(conn)
+    conn.execute("INSERT INTO student (firstName, lastName, email, dateOfBirth, address, phoneNumber) "
+                 "VALUES ('Ann', 'Lee', 'ann@x', '2010-01-01', 'a', 1)")
+    conn.execute("INSERT INTO course (courseName, courseDescription, credits) VALUES ('C', 'd', 3)")
+    conn.execute("INSERT INTO enrollment (studentId, courseId, enrollmentDate) VALUES (1, 1, '2024-09-02')")
+    yield conn
+    conn.close()
+
+def student(n, **overrides):
+    row = {'firstName': f'S{n}', 'lastName': 'L', 'email': f's{n}@x',
+           'dateOfBirth': '2010-01-01', 'address': 'a', 'phoneNumber': 100 + n}
+    row.update(overrides)
+    return row
+
+def count(conn, table):
+    return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+def test_validate_reports_field_errors(conn):
+    errors = validate_bulk(conn.cursor(), STUDENTS, [
+        student(1), student(2, email=''), student(3, firstName=7), 'row'])
+    assert errors == {1: ['email is required'], 2: ['firstName must be a string'],
+                      3: ['row must be an object']}
+
+def test_validate_reports_missing_references(conn):
+    errors = validate_bulk(conn.cursor(), GRADES, [
+        {'enrollmentId': 1, 'gradeValue': 'A'},
+        {'enrollmentId': 9, 'gradeValue': 'B'},
+        {'enrollmentId': True, 'gradeValue': 'C'}])
+    assert errors == {1: ['enrollmentId 9 does not exist'], 2: ['enrollmentId must be an integer']}
+
+def test_write_returns_consecutive_ids(conn):
+    result, errors = write_bulk(conn, STUDENTS, [student(1), student(2), student(3)])
+    assert errors == {}
+    assert result == {'created': 3, 'ids': [2, 3, 4]}
+    assert count(conn, 'student') == 4
+
+def test_dry_run_checks_constraints_without_writing(conn):
+    result, errors = write_bulk(conn, STUDENTS, [student(1), student(2)], dry_run=True)
+    assert (result, errors) == ({'dry_run': True, 'count': 2}, {})
+    assert count(conn, 'student') == 1
+
+def test_dry_run_reports_constraint_errors(conn):
+    result, errors = write_bulk(conn, STUDENTS, [student(1), student(2, email='ann@x')], dry_run=True)
+    assert result is None
+    assert list(errors) == [1]
+    assert 'UNIQUE' in errors[1][0]
+
+def test_constraint_errors_name_every_failing_row(conn):
+    rows = [student(1), student(2, phoneNumber=1), student(3), student(4, email='s1@x')]
+    result, errors = write_bulk(conn, STUDENTS, rows)
+    assert result is None
+    assert sorted(errors) == [1, 3]
+    assert count(conn, 'student') == 1
+
+def test_failed_write_leaves_enclosing_transaction_intact(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    conn.execute("INSERT INTO course (courseName, courseDescription, credits) VALUES ('D', 'd', 3)")
+    write_bulk(conn, STUDENTS, [student(1, email='ann@x')])
+    conn.execute('COMMIT')
+    assert count(conn, 'course') == 2
+    assert count(conn, 'student') == 1
@@ -0,0 +1,172 @@
+import pytest
+
+import cache
+from cache import DiskResponseCache, MemoryResponseCache, TokenVersionTable, TTLCache, create_response_cache
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    monkeypatch.setattr(cache.time, 'time', clock)
+    return clock
+
+def test_ttl_cache_expires_entries(clock):
+    users = TTLCache(maxsize=4, ttl=30)
+    users.set(1, {'id': 1})
+    clock.now += 29
+    assert users.get(1) == {'id': 1}
+    clock.now += 1
+    assert users.get(1) is None
+    assert users.get_stats()['size'] == 0
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    users = TTLCache(maxsize=2, ttl=30)
+    users.set(1, 'a')
+    users.set(2, 'b')
+    users.get(1)
+    users.set(3, 'c')
+    assert users.get(2) is None
+    assert users.get(1) == 'a'
+    assert users.get(3) == 'c'
+    assert users.get_stats()['evictions'] == 1
+
+def test_ttl_cache_set_restarts_expiry(clock):
+    users = TTLCache(maxsize=2, ttl=30)
+    users.set(1, 'old')
+    clock.now += 20
+    users.set(1, 'new')
+    clock.now += 20
+    assert users.get(1) == 'new'
+
+def test_ttl_cache_invalidate(clock):
+    users = TTLCache()
+    users.set(1, 'a')
+    users.set(2, 'b')
+    users.invalidate(1)
+    users.invalidate(99)
+    assert users.get(1) is None
+    assert users.get(2) == 'b'
+    stats = users.get_stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+class Versions:
+    def __init__(self):
+        self.stamp = 1
+        self.versions = {}
+        self.calls = []
+
+    def __call__(self, stamp):
+        self.calls.append(stamp)
+        if stamp == self.stamp:
+            return None
+        return self.stamp, dict(self.versions)
+
+def test_token_versions_load_on_first_get(clock):
+    versions = Versions()
+    versions.versions = {1: 2}
+    table = TokenVersionTable(versions, interval=5)
+    assert table.get(1) == 2
+    assert table.get(2) == 0
+    assert versions.calls == [None]
+
+def test_token_versions_refresh_after_interval(clock):
+    versions = Versions()
+    table = TokenVersionTable(versions, interval=5)
+    table.get(1)
+    versions.versions = {1: 1}
+    clock.now += 4
+    assert table.get(1) == 0
+    clock.now += 1
+    assert table.get(1) == 0
+    assert versions.calls == [None, 1]
+    versions.stamp = 2
+    clock.now += 5
+    assert table.get(1) == 1
+    assert versions.calls == [None, 1, 1]
+    stats = table.get_stats()
+    assert (stats['refreshes'], stats['reloads'], stats['revoked_users']) == (3, 2, 1)
+
+def test_token_versions_set_is_seen_before_the_next_refresh(clock):
+    versions = Versions()
+    table = TokenVersionTable(versions, interval=5)
+    table.get(1)
+    table.set(1, 3)
+    assert table.get(1) == 3
+    assert versions.calls == [None]
+
+@pytest.fixture(params=['memory', 'disk'])
+def responses(request, tmp_path, clock):
+    if request.param == 'memory':
+        return MemoryResponseCache(max_bytes=4000, ttl=60)
+    return DiskResponseCache(str(tmp_path / 'responses.db'), max_bytes=4000, ttl=60)
+
+def body(n):
+    return bytes([n]) * 1000
+
+def test_response_cache_round_trip(responses):
+    responses.set('a', 'application/json', b'[]')
+    assert responses.get('a') == ('application/json', b'[]')
+    assert responses.get('b') is None
+    stats = responses.get_stats()
+    assert (stats['entries'], stats['bytes'], stats['hits'], stats['misses']) == (1, 2, 1, 1)
+
+def test_response_cache_replaces_entry(responses):
+    responses.set('a', 'application/json', body(1))
+    responses.set('a', 'text/csv', body(2))
+    assert responses.get('a') == ('text/csv', body(2))
+    assert responses.get_stats()['bytes'] == 1000
+
+def test_response_cache_expires_entries(responses, clock):
+    responses.set('a', 'application/json', body(1))
+    clock.now += 60
+    assert responses.get('a') is None
+
+def test_response_cache_evicts_least_recently_used_bytes(responses, clock):
+    for n, key in enumerate('abcd'):
+        responses.set(key, 'application/json', body(n))
+        clock.now += 2
+    responses.get('a')
+    clock.now += 2
+    responses.set('e', 'application/json', body(9))
+    assert responses.get('b') is None
+    assert [key for key in 'acde' if responses.get(key) is None] == []
+    stats = responses.get_stats()
+    assert (stats['entries'], stats['bytes'], stats['evictions']) == (4, 4000, 1)
+
+def test_response_cache_evicts_only_what_it_needs(responses, clock):
+    for n, key in enumerate('abcd'):
+        responses.set(key, 'application/json', bytes([n]) * 900)
+        clock.now += 2
+    responses.set('e', 'application/json', body(9))
+    assert responses.get('a') is None
+    assert [key for key in 'bcde' if responses.get(key) is None] == []
+    assert responses.get_stats()['bytes'] == 3700
+
+def test_response_cache_skips_oversized_bodies(responses):
+    responses.set('a', 'application/json', b'x' * 1001)
+    assert responses.get('a') is None
+    assert responses.get_stats()['bytes'] == 0
+
+def test_response_cache_clear(responses):
+    responses.set('a', 'application/json', body(1))
+    responses.clear()
+    assert responses.get('a') is None
+    assert responses.get_stats()['bytes'] == 0
+
+def test_disk_cache_is_shared_between_instances(tmp_path, clock):
+    path = str(tmp_path / 'responses.db')
+    DiskResponseCache(path).set('a', 'application/json', b'[1]')
+    assert DiskResponseCache(path).get('a') == ('application/json', b'[1]')
+
+def test_create_response_cache(tmp_path):
+    assert create_response_cache('off').get('a') is None
+    assert create_response_cache('disk', str(tmp_path / 'r.db')).kind == 'disk'
+    with pytest.raises(ValueError):
+        create_response_cache('redis')
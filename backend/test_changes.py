@@ -0,0 +1,84 @@
+import json
+import sqlite3
+
+import pytest
+
+from changes import change_filter, format_event, is_stale, log_bounds, read_changes
+from schema import run_migrations
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    run_migrations(conn)
+    conn.executemany("INSERT INTO course (courseName, courseDescription, credits) VALUES (?, 'd', 3)",
+                     [('Maths',), ('Art',)])
+    conn.executemany("INSERT INTO student (firstName, lastName, email, dateOfBirth, address, phoneNumber) "
+                     "VALUES (?, 'Lee', ?, '2010-01-01', 'a', ?)", [('Ann', 'ann@x', 1), ('Bo', 'bo@x', 2)])
+    conn.execute("INSERT INTO teachers (firstName, lastName, email, phoneNumber, department) "
+                 "VALUES ('Tess', 'Ray', 'tess@x', 3, 'Maths')")
+    conn.execute("INSERT INTO parent_guardian (firstName, lastName, email, phoneNumber, relationToStudent) "
+                 "VALUES ('Pat', 'Lee', 'pat@x', 4, 'Mother')")
+    conn.execute('INSERT INTO course_teacher (courseId, teacherId) VALUES (1, 1)')
+    conn.execute('INSERT INTO parent_student (parentId, studentId) VALUES (1, 1)')
+    conn.executemany("INSERT INTO enrollment (studentId, courseId, enrollmentDate) VALUES (?, ?, '2024-09-02')",
+                     [(1, 1), (2, 2)])
+    conn.executemany("INSERT INTO grade (enrollmentId, gradeValue) VALUES (?, 'A')", [(1,), (2,)])
+    conn.executemany("INSERT INTO attendance (enrollmentId, date, status) VALUES (?, '2024-09-03', 'Present')",
+                     [(1,), (2,)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+def visible(conn, role, reference_id=None):
+    rows, _ = read_changes(conn, {'role': role, 'reference_id': reference_id}, 0, 100)
+    return sorted((change['table'], change['id']) for change in (json.loads(row[1]) for row in rows))
+
+def test_admin_sees_every_change(conn):
+    assert change_filter({'role': 'admin', 'reference_id': None}) is None
+    assert len(visible(conn, 'admin')) == conn.execute('SELECT COUNT(*) FROM change_log').fetchone()[0]
+
+def test_teacher_sees_their_courses_and_enrollments(conn):
+    assert visible(conn, 'teacher', 1) == [
+        ('attendance', 1), ('course', 1), ('enrollment', 1), ('grade', 1), ('student', 1)]
+
+def test_parent_sees_grades_and_attendance_of_linked_students(conn):
+    assert visible(conn, 'parent', 1) == [('attendance', 1), ('grade', 1)]
+
+def test_student_sees_their_grades_and_courses(conn):
+    assert visible(conn, 'student', 2) == [('course', 2), ('grade', 2)]
+
+def test_other_roles_see_nothing(conn):
+    assert change_filter({'role': 'guest', 'reference_id': 1}) == ('0', [])
+    assert visible(conn, 'guest', 1) == []
+    assert visible(conn, 'teacher', 99) == []
+
+def test_cursor_moves_past_rows_the_caller_cannot_see(conn):
+    latest = log_bounds(conn)[1]
+    rows, cursor = read_changes(conn, {'role': 'parent', 'reference_id': 1}, 0, 100)
+    assert len(rows) == 2 and cursor == latest
+    rows, cursor = read_changes(conn, {'role': 'admin', 'reference_id': None}, 0, 3)
+    assert [row[0] for row in rows] == [1, 2, 3] and cursor == 3
+
+def test_log_bounds_of_an_empty_log(conn):
+    latest = log_bounds(conn)[1]
+    conn.execute('DELETE FROM change_log')
+    assert log_bounds(conn) == (latest + 1, latest)
+
+@pytest.mark.parametrize('since, stale', [
+    (9, False),
+    (10, False),
+    (15, False),
+    (20, False),
+    (8, True),
+    (21, True),
+])
+def test_is_stale(since, stale):
+    assert is_stale(since, 10, 20) is stale
+
+def test_is_stale_after_the_log_was_pruned_empty():
+    assert not is_stale(20, 21, 20)
+    assert is_stale(19, 21, 20)
+
+def test_format_event():
+    assert format_event('change', '{"seq":3}', 3) == 'id: 3\nevent: change\ndata: {"seq":3}\n\n'
+    assert format_event('reset', '{}') == 'event: reset\ndata: {}\n\n'
@@ -0,0 +1,99 @@
+import sqlite3
+import time
+
+import pytest
+
+from db import ConnectionPool, WriteQueue
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'test.db'), max_idle=1)
+    conn = pool.acquire_detached()
+    conn.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT UNIQUE)')
+    conn.commit()
+    conn.close()
+    yield pool
+    pool.close_all()
+
+@pytest.fixture
+def writer(pool):
+    writer = WriteQueue(pool)
+    yield writer
+    writer.close()
+
+def names(pool):
+    conn = pool.acquire_detached()
+    try:
+        return [row[0] for row in conn.execute('SELECT name FROM item ORDER BY id')]
+    finally:
+        conn.close()
+
+def test_failing_job_rolls_back_only_itself(pool, writer):
+    futures = [writer.submit(lambda conn, name=name: conn.execute(
+        'INSERT INTO item (name) VALUES (?)', (name,)).lastrowid) for name in ('a', 'b', 'a', 'c')]
+    assert futures[0].result() == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[2].result()
+    assert names(pool) == ['a', 'b', 'c']
+    assert writer.get_stats()['failed'] == 1
+
+def test_job_context_is_captured_at_submit(pool, writer):
+    seen = []
+    writer.capture_context = lambda: 'create_item'
+    writer.run(lambda conn: seen.append(writer.current_context()))
+    assert seen == ['create_item']
+    assert writer.current_context() is None
+
+def test_queries_are_labelled_with_the_submitting_context(pool, writer):
+    labels = []
+    pool.on_query = lambda sql, seconds: labels.append((sql, writer.current_context()))
+    writer.capture_context = lambda: 'create_item'
+    writer.execute('INSERT INTO item (name) VALUES (?)', ('a',))
+    assert ('INSERT INTO item (name) VALUES (?)', 'create_item') in labels
+
+def test_writer_recovers_when_the_connection_cannot_be_opened(pool, writer, monkeypatch):
+    def unavailable():
+        raise sqlite3.OperationalError('unable to open database file')
+
+    acquire = pool.acquire_detached
+    monkeypatch.setattr(pool, 'acquire_detached', unavailable)
+    with pytest.raises(sqlite3.OperationalError):
+        writer.execute('INSERT INTO item (name) VALUES (?)', ('a',))
+    assert writer.get_stats()['failed'] == 1
+    monkeypatch.setattr(pool, 'acquire_detached', acquire)
+    assert writer.execute('INSERT INTO item (name) VALUES (?)', ('b',)) == 1
+    assert names(pool) == ['b']
+
+def insert(name):
+    return lambda conn: conn.execute('INSERT INTO item (name) VALUES (?)', (name,)).lastrowid
+
+def test_delayed_jobs_share_one_commit(pool, writer):
+    futures = [writer.submit(insert(f'item{n}'), delay=0.5) for n in range(5)]
+    assert [future.result() for future in futures] == [1, 2, 3, 4, 5]
+    stats = writer.get_stats()
+    assert (stats['commits'], stats['largest_batch']) == (1, 5)
+
+def test_job_without_delay_cuts_the_wait_short(pool, writer):
+    start = time.monotonic()
+    delayed = writer.submit(insert('a'), delay=5)
+    writer.run(insert('b'))
+    assert delayed.result() == 1
+    assert time.monotonic() - start < 2
+    assert writer.get_stats()['commits'] == 1
+
+def test_batch_flushes_at_max_batch_rows(pool):
+    writer = WriteQueue(pool, max_batch=3)
+    try:
+        futures = [writer.submit(insert(f'item{n}'), delay=5) for n in range(3)]
+        start = time.monotonic()
+        assert [future.result() for future in futures] == [1, 2, 3]
+        assert time.monotonic() - start < 2
+    finally:
+        writer.close()
+
+def test_close_commits_delayed_jobs(pool, writer):
+    delayed = writer.submit(insert('a'), delay=5)
+    start = time.monotonic()
+    writer.close()
+    assert delayed.result() == 1
+    assert time.monotonic() - start < 2
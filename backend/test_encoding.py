@@ -0,0 +1,127 @@
+import gzip
+import json
+import os
+import tempfile
+
+import pytest
+from werkzeug.datastructures import LanguageAccept, MIMEAccept
+from werkzeug.http import parse_accept_header
+
+# app reads its configuration on import, so point it at a scratch database
+# before importing it
+os.environ.setdefault('DATABASE', os.path.join(tempfile.mkdtemp(), 'test.db'))
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-that-is-at-least-32-bytes')
+
+import encoding
+from app import app
+from encoding import COLUMNS_MIMETYPE, MSGPACK_MIMETYPE, compress, negotiate_encoding, negotiate_format
+
+@pytest.mark.parametrize('accept, fmt', [
+    ('', 'json'),
+    ('*/*', 'json'),
+    ('text/html', 'json'),
+    ('application/x-ndjson', 'ndjson'),
+    ('application/vnd.columns+json', 'columns'),
+    ('application/json;q=0.5, application/vnd.columns+json', 'columns'),
+    ('application/x-ndjson, application/json', 'json'),
+])
+def test_negotiate_format(accept, fmt):
+    assert negotiate_format(parse_accept_header(accept, MIMEAccept)) == fmt
+
+def test_negotiate_format_without_msgpack(monkeypatch):
+    monkeypatch.setattr(encoding, 'FORMATS', [f for f in encoding.FORMATS if f[1] != 'msgpack'])
+    assert negotiate_format(parse_accept_header(MSGPACK_MIMETYPE, MIMEAccept)) == 'json'
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('', None),
+    ('identity', None),
+    ('gzip', 'gzip'),
+    ('gzip, deflate', 'gzip'),
+    ('gzip;q=1.0, br;q=0.5', 'gzip'),
+    ('*', encoding.ENCODINGS[0]),
+])
+def test_negotiate_encoding(accept_encoding, expected):
+    assert negotiate_encoding(parse_accept_header(accept_encoding, LanguageAccept)) == expected
+
+def test_gzip_output_is_deterministic():
+    body = b'{"id": 1}' * 100
+    assert compress(body, 'gzip') == compress(body, 'gzip')
+    assert gzip.decompress(compress(body, 'gzip')) == body
+
+def test_brotli_round_trip():
+    brotli = pytest.importorskip('brotli')
+    body = b'{"id": 1}' * 100
+    assert brotli.decompress(compress(body, 'br')) == body
+
+@pytest.fixture(scope='module')
+def client():
+    return app.test_client()
+
+@pytest.fixture(scope='module')
+def headers(client):
+    client.post('/api/auth/register', json={'username': 'encoding_admin', 'password': 'secret',
+                                            'email': 'encoding_admin@x', 'role': 'admin'})
+    token = client.post('/api/auth/login', json={'username': 'encoding_admin',
+                                                 'password': 'secret'}).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    client.post('/api/courses/bulk', json=[
+        {'courseName': f'Encoding {n}', 'courseDescription': 'd' * 50, 'credits': 3} for n in range(40)],
+        headers=headers)
+    return headers
+
+def get_courses(client, headers, **extra):
+    return client.get('/api/courses?limit=5', headers={**headers, **extra})
+
+def test_columns_format(client, headers):
+    response = get_courses(client, headers, Accept=COLUMNS_MIMETYPE)
+    assert response.mimetype == COLUMNS_MIMETYPE
+    body = json.loads(response.data)
+    assert body['columns'] == ['id', 'courseName', 'courseDescription', 'credits']
+    plain = get_courses(client, headers).get_json()
+    assert [dict(zip(body['columns'], row)) for row in body['rows']] == plain['data']
+    assert (body['next_cursor'], body['limit']) == (plain['next_cursor'], 5)
+
+def test_msgpack_format(client, headers):
+    msgpack = pytest.importorskip('msgpack')
+    response = get_courses(client, headers, Accept=MSGPACK_MIMETYPE)
+    assert response.mimetype == MSGPACK_MIMETYPE
+    body = msgpack.unpackb(response.data)
+    plain = get_courses(client, headers).get_json()
+    assert [dict(zip(body['columns'], row)) for row in body['rows']] == plain['data']
+
+def test_formats_get_their_own_etag(client, headers):
+    etags = {get_courses(client, headers, Accept=accept).headers['ETag']
+             for accept in ('application/json', COLUMNS_MIMETYPE)}
+    assert len(etags) == 2
+
+def test_large_bodies_are_compressed_with_a_weak_etag(client, headers, monkeypatch):
+    monkeypatch.setitem(app.config, 'COMPRESS_MIN_BYTES', 100)
+    plain = get_courses(client, headers)
+    response = get_courses(client, headers, **{'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == plain.data
+    assert response.headers['ETag'] == 'W/' + plain.headers['ETag']
+
+def test_small_bodies_are_not_compressed(client, headers, monkeypatch):
+    monkeypatch.setitem(app.config, 'COMPRESS_MIN_BYTES', 1 << 20)
+    response = get_courses(client, headers, **{'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+def test_compression_can_be_turned_off(client, headers, monkeypatch):
+    monkeypatch.setitem(app.config, 'COMPRESS', False)
+    monkeypatch.setitem(app.config, 'COMPRESS_MIN_BYTES', 100)
+    response = get_courses(client, headers, **{'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+def test_weak_etag_revalidates(client, headers, monkeypatch):
+    monkeypatch.setitem(app.config, 'COMPRESS_MIN_BYTES', 100)
+    compressed = get_courses(client, headers, **{'Accept-Encoding': 'gzip'})
+    etag = compressed.headers['ETag']
+    assert etag.startswith('W/')
+    response = get_courses(client, headers, **{'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    response = get_courses(client, headers, **{'If-None-Match': etag[2:]})
+    assert response.status_code == 304
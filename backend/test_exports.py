@@ -0,0 +1,125 @@
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import exports
+from db import ConnectionPool
+from exports import ExportBusy, ExportManager
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / 'export.db')
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('CREATE TABLE course (id INTEGER PRIMARY KEY, courseName TEXT)')
+    conn.executemany('INSERT INTO course (courseName) VALUES (?)', [('Maths',), ('Art',), ('Music',)])
+    conn.commit()
+    conn.close()
+    pool = ConnectionPool(path, read_only=True)
+    yield pool
+    pool.close_all()
+
+@pytest.fixture
+def manager(pool, tmp_path):
+    manager = ExportManager(pool, str(tmp_path / 'exports'), workers=1, max_jobs=2)
+    yield manager
+    manager.shutdown()
+
+# Reads block in pause() until the returned event is set
+@pytest.fixture
+def paused(pool, monkeypatch):
+    resume = threading.Event()
+    acquire = pool.acquire_detached
+
+    def acquire_detached():
+        conn = acquire()
+        conn.create_function('pause', 1, lambda id: id if id == 1 or resume.wait(5) else None)
+        return conn
+
+    monkeypatch.setattr(pool, 'acquire_detached', acquire_detached)
+    monkeypatch.setattr(exports, 'EXPORT_CHUNK_SIZE', 1)
+    yield resume
+    resume.set()
+
+COURSES = ('SELECT id, courseName FROM course ORDER BY id', [], ['id', 'courseName'])
+PAUSED_COURSES = ('SELECT pause(id), courseName FROM course ORDER BY id', [], ['id', 'courseName'])
+
+def wait_for(job, *statuses):
+    deadline = time.monotonic() + 5
+    while job.status not in statuses:
+        assert time.monotonic() < deadline, job.status
+        time.sleep(0.01)
+    return job
+
+def test_csv_export(manager):
+    job = wait_for(manager.submit('courses', 'csv', 1, *COURSES), 'done', 'failed')
+    assert (job.status, job.rows) == ('done', 3)
+    assert job.path.endswith('.csv.gz') and job.bytes == os.path.getsize(job.path)
+    with gzip.open(job.path, 'rt', newline='') as f:
+        assert f.read() == 'id,courseName\r\n1,Maths\r\n2,Art\r\n3,Music\r\n'
+    assert os.listdir(manager.directory) == [os.path.basename(job.path)]
+
+def test_ndjson_export(manager):
+    sql = "SELECT json_object('id', id, 'courseName', courseName) FROM course ORDER BY id"
+    job = wait_for(manager.submit('courses', 'ndjson', 1, sql, [], ['id', 'courseName']), 'done')
+    with gzip.open(job.path, 'rt') as f:
+        assert [json.loads(line)['courseName'] for line in f] == ['Maths', 'Art', 'Music']
+
+def test_unknown_format(manager):
+    with pytest.raises(ValueError):
+        manager.submit('courses', 'xml', 1, *COURSES)
+
+def test_file_is_written_as_part_and_renamed(manager, paused):
+    job = wait_for(manager.submit('courses', 'csv', 1, *PAUSED_COURSES), 'running')
+    final = os.path.join(manager.directory, job.filename)
+    deadline = time.monotonic() + 5
+    while not os.path.exists(final + '.part'):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert not os.path.exists(final)
+    paused.set()
+    wait_for(job, 'done')
+    assert os.listdir(manager.directory) == [job.filename]
+
+def test_failed_export_leaves_no_file(manager):
+    job = wait_for(manager.submit('courses', 'csv', 1, 'SELECT * FROM nowhere', [], []), 'done', 'failed')
+    assert job.status == 'failed' and 'no such table' in job.error
+    assert job.path is None
+    assert os.listdir(manager.directory) == []
+    assert manager.get_stats()['failed'] == 1
+
+def test_jobs_beyond_max_jobs_are_rejected(manager, paused):
+    running = manager.submit('courses', 'csv', 1, *PAUSED_COURSES)
+    manager.submit('courses', 'csv', 1, *COURSES)
+    with pytest.raises(ExportBusy):
+        manager.submit('courses', 'csv', 1, *COURSES)
+    assert manager.get_stats()['rejected'] == 1
+    paused.set()
+    wait_for(running, 'done')
+
+def test_jobs_are_only_visible_to_their_owner(manager):
+    job = wait_for(manager.submit('courses', 'csv', 1, *COURSES), 'done')
+    other = wait_for(manager.submit('courses', 'csv', 2, *COURSES), 'done')
+    assert manager.get(job.id, 1) is job
+    assert manager.get(job.id, 2) is None
+    assert manager.list(2) == [other]
+    assert {j.id for j in manager.list()} == {job.id, other.id}
+
+def test_finished_jobs_expire(manager):
+    job = wait_for(manager.submit('courses', 'csv', 1, *COURSES), 'done')
+    manager.retention = 0
+    assert manager.list() == []
+    assert manager.get(job.id) is None
+    assert not os.path.exists(job.path)
+
+def test_shutdown_cancels_running_export(manager, paused):
+    job = wait_for(manager.submit('courses', 'csv', 1, *PAUSED_COURSES), 'running')
+    threading.Timer(0.1, paused.set).start()
+    manager.shutdown()
+    assert (job.status, job.error) == ('failed', 'Export cancelled')
+    assert os.listdir(manager.directory) == []
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+
+import pytest
+
+# app reads its configuration on import, so point it at a scratch database
+# before importing it
+os.environ.setdefault('DATABASE', os.path.join(tempfile.mkdtemp(), 'test.db'))
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-that-is-at-least-32-bytes')
+
+import app as app_module
+import asgi
+from hashing import HasherBusy, PasswordHasher
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(rounds=4, workers=1, max_queue=0, retry_after=7)
+    yield hasher
+    hasher.shutdown()
+
+# Hold the hasher's only slot until the returned event is set
+def saturate(hasher):
+    started = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+
+    future = hasher.submit(hold)
+    started.wait(5)
+    return release, future
+
+def test_hash_and_check(hasher):
+    hashed = hasher.hash('secret')
+    assert hasher.check('secret', hashed)
+    assert not hasher.check('wrong', hashed)
+    assert hasher.get_stats()['hashes'] == 3
+
+def test_saturated_pool_rejects_without_queueing(hasher):
+    release, future = saturate(hasher)
+    with pytest.raises(HasherBusy) as e:
+        hasher.hash('secret')
+    assert e.value.retry_after == 7
+    release.set()
+    future.result(5)
+    assert hasher.get_stats()['rejected'] == 1
+    assert hasher.get_stats()['pending'] == 0
+    assert hasher.hash('secret')
+
+def test_submit_hashes_inline_on_pool_thread(hasher):
+    # With one worker, a nested hash that went back through the executor
+    # would wait for the thread it is running on
+    def view():
+        return threading.current_thread().name, hasher.check('secret', hasher.hash('secret'))
+
+    name, ok = hasher.submit(view).result(5)
+    assert name.startswith('bcrypt') and ok
+    assert hasher.get_stats()['pending'] == 0
+
+@pytest.fixture
+def busy_hasher(monkeypatch, hasher):
+    monkeypatch.setattr(app_module, 'password_hasher', hasher)
+    monkeypatch.setattr(asgi, 'password_hasher', hasher)
+    release, future = saturate(hasher)
+    yield hasher
+    release.set()
+    future.result(5)
+
+REGISTRATION = {'username': 'busy', 'password': 'secret', 'email': 'busy@x',
+                'role': 'student', 'reference_id': 1}
+
+def test_busy_hasher_answers_503_with_retry_after(busy_hasher):
+    response = app_module.app.test_client().post('/api/auth/register', json=REGISTRATION)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '7'
+
+def asgi_post(path, data):
+    body = json.dumps(data).encode()
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': path,
+             'query_string': b'', 'http_version': '1.1',
+             'headers': [(b'content-type', b'application/json'),
+                         (b'content-length', str(len(body)).encode())]}
+    asyncio.run(asgi.application(scope, receive, send))
+    return sent[0], b''.join(message.get('body', b'') for message in sent[1:])
+
+def test_busy_hasher_answers_503_under_asgi(busy_hasher):
+    start, _ = asgi_post('/api/auth/register', REGISTRATION)
+    assert start['status'] == 503
+    assert (b'retry-after', b'7') in start['headers']
+
+def test_asgi_runs_password_views_on_hasher_pool(monkeypatch, hasher):
+    monkeypatch.setattr(app_module, 'password_hasher', hasher)
+    monkeypatch.setattr(asgi, 'password_hasher', hasher)
+    registration = dict(REGISTRATION, username='pooled', email='pooled@x')
+    start, _ = asgi_post('/api/auth/register', registration)
+    assert start['status'] == 201
+    start, body = asgi_post('/api/auth/login', {'username': 'pooled', 'password': 'secret'})
+    assert start['status'] == 200
+    assert json.loads(body)['user']['username'] == 'pooled'
+    assert hasher.get_stats()['hashes'] == 2
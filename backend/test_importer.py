@@ -0,0 +1,169 @@
+import io
+import sqlite3
+
+import pytest
+
+import importer
+from bulk import BulkInsert
+from db import ConnectionPool, WriteQueue
+from importer import ImportSpec, Lookup, import_chunks, read_rows
+from schema import run_migrations
+
+STUDENTS = ImportSpec(BulkInsert('student', [
+    ('firstName', str), ('lastName', str), ('email', str),
+    ('dateOfBirth', str), ('address', str), ('phoneNumber', None)]))
+STUDENT_BY_EMAIL = Lookup('studentId', 'student', [('studentEmail', 'email')])
+COURSE_BY_NAME = Lookup('courseId', 'course', [('courseName', 'courseName')])
+ENROLLMENTS = ImportSpec(BulkInsert('enrollment', [('studentId', int), ('courseId', int)],
+                                    references={'studentId': 'student', 'courseId': 'course'},
+                                    extra_columns=['enrollmentDate'],
+                                    extra=lambda: ('2024-09-02',)),
+                         [STUDENT_BY_EMAIL, COURSE_BY_NAME])
+GRADES = ImportSpec(BulkInsert('grade', [('enrollmentId', int), ('gradeValue', str)],
+                               references={'enrollmentId': 'enrollment'}), [
+    STUDENT_BY_EMAIL, COURSE_BY_NAME,
+    Lookup('enrollmentId', 'enrollment', [('studentId', 'studentId'), ('courseId', 'courseId')])])
+
+HEADER = 'firstName,lastName,email,dateOfBirth,address,phoneNumber\n'
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'import.db')
+    conn = sqlite3.connect(path)
+    run_migrations(conn)
+    conn.execute("INSERT INTO student (firstName, lastName, email, dateOfBirth, address, phoneNumber) "
+                 "VALUES ('Ann', 'Lee', 'ann@x', '2010-01-01', 'a', 1)")
+    conn.executemany("INSERT INTO course (courseName, courseDescription, credits) VALUES (?, 'd', 3)",
+                     [('Maths',), ('Art',)])
+    conn.commit()
+    conn.close()
+    pool = ConnectionPool(path, max_idle=1)
+    writer = WriteQueue(pool)
+    read_conn = sqlite3.connect(path)
+    yield read_conn, writer
+    writer.close()
+    read_conn.close()
+    pool.close_all()
+
+def run_import(db, spec, text, fmt='csv', **options):
+    read_conn, writer = db
+    rows = read_rows(io.BytesIO(text.encode()), fmt, spec)
+    results = [result.to_dict() for result in import_chunks(spec, rows, read_conn, writer, **options)]
+    return results[-1] if results else None, results
+
+def count(db, table):
+    return db[0].execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+def test_csv_rows_are_coerced_and_inserted(db):
+    summary, _ = run_import(db, STUDENTS, HEADER + 'Bo,Ray,bo@x,2011-02-03,b, 2 \n')
+    assert (summary['inserted'], summary['failed']) == (1, 0)
+    assert db[0].execute("SELECT phoneNumber FROM student WHERE email = 'bo@x'").fetchone() == (2,)
+
+def test_csv_row_errors_carry_line_numbers(db):
+    text = (HEADER
+            + 'Bo,Ray,bo@x,2011-02-03,b,two\n'
+            + 'Cy,Ray,cy@x,2011-02-03,b,3,extra\n'
+            + 'Di,Ray,di@x,2011-02-03,b,\n'
+            + 'Ed,Ray,ed@x,2011-02-03,' + 'b' * 200000 + ',5\n'
+            + 'Flo,Ray,flo@x,2011-02-03,b,6\n')
+    summary, _ = run_import(db, STUDENTS, text)
+    assert summary['inserted'] == 1
+    assert [(error['line'], error['errors'][0]) for error in summary['errors']] == [
+        (2, 'phoneNumber must be an integer'),
+        (3, 'more values than header columns'),
+        (4, 'phoneNumber is required'),
+        (5, 'invalid CSV: field larger than field limit (131072)'),
+    ]
+
+@pytest.mark.parametrize('text, message', [
+    ('', 'CSV file has no header row'),
+    ('firstName,nickname\n', 'Unknown columns: nickname'),
+    ('firstName,lastName\n', 'Missing columns: email, dateOfBirth, address, phoneNumber'),
+])
+def test_csv_header_is_checked_before_reading(text, message):
+    with pytest.raises(ValueError, match=message):
+        read_rows(io.BytesIO(text.encode()), 'csv', STUDENTS)
+
+def test_ndjson_rows(db):
+    text = ('{"firstName": "Bo", "lastName": "Ray", "email": "bo@x", "dateOfBirth": "2011-02-03",'
+            ' "address": "b", "phoneNumber": 2}\n'
+            '\n'
+            '{"firstName": \n'
+            '["not", "an", "object"]\n'
+            '{"firstName": "Cy", "nickname": "C"}\n')
+    summary, _ = run_import(db, STUDENTS, text, fmt='ndjson')
+    assert summary['inserted'] == 1
+    assert [error['line'] for error in summary['errors']] == [3, 4, 5]
+    assert summary['errors'][0]['errors'][0].startswith('invalid JSON')
+    assert summary['errors'][1]['errors'] == ['row must be an object']
+    assert 'unknown column nickname' in summary['errors'][2]['errors']
+
+def test_unknown_format():
+    with pytest.raises(ValueError, match='format must be one of'):
+        read_rows(io.BytesIO(b''), 'xml', STUDENTS)
+
+def test_natural_keys_are_resolved(db):
+    text = ('studentEmail,courseName\n'
+            'ann@x,Maths\n'
+            'ann@x,Art\n'
+            'nobody@x,Maths\n'
+            'ann@x,Music\n')
+    summary, _ = run_import(db, ENROLLMENTS, text)
+    assert summary['inserted'] == 2
+    assert [error['errors'] for error in summary['errors']] == [
+        ["no student with studentEmail 'nobody@x'"],
+        ["no course with courseName 'Music'"],
+    ]
+    summary, _ = run_import(db, GRADES, 'studentEmail,courseName,gradeValue\nann@x,Art,A\nann@x,Maths,B\n')
+    assert summary['inserted'] == 2
+    assert db[0].execute('SELECT e.courseId, g.gradeValue FROM grade g JOIN enrollment e '
+                         'ON e.id = g.enrollmentId ORDER BY g.id').fetchall() == [(2, 'A'), (1, 'B')]
+
+def test_ids_take_precedence_over_natural_keys(db):
+    summary, _ = run_import(db, ENROLLMENTS, 'studentId,courseName\n1,Art\n')
+    assert (summary['inserted'], summary['failed']) == (1, 0)
+
+def test_chunks_commit_separately(db):
+    rows = ''.join(f'S{n},L,s{n}@x,2011-02-03,b,{100 + n}\n' for n in range(5))
+    summary, results = run_import(db, STUDENTS, HEADER + rows, chunk_rows=2)
+    assert [result['processed'] for result in results] == [2, 4, 5]
+    assert summary['chunks'] == 3 and summary['inserted'] == 5
+    assert db[1].get_stats()['commits'] == 3
+
+def test_constraint_errors_skip_only_the_failing_rows(db):
+    rows = ('Bo,Ray,bo@x,2011-02-03,b,2\n'
+            'Cy,Ray,ann@x,2011-02-03,b,3\n'
+            'Di,Ray,di@x,2011-02-03,b,2\n'
+            'Ed,Ray,ed@x,2011-02-03,b,5\n')
+    summary, _ = run_import(db, STUDENTS, HEADER + rows)
+    assert (summary['inserted'], summary['failed']) == (2, 2)
+    assert [error['line'] for error in summary['errors']] == [3, 4]
+    assert count(db, 'student') == 3
+
+def test_abort_stops_before_writing_an_invalid_chunk(db):
+    rows = ('Bo,Ray,bo@x,2011-02-03,b,2\n'
+            'Cy,Ray,cy@x,2011-02-03,b,3\n'
+            'Di,Ray,di@x,2011-02-03,b,x\n'
+            'Ed,Ray,ed@x,2011-02-03,b,5\n'
+            'Flo,Ray,flo@x,2011-02-03,b,6\n')
+    summary, results = run_import(db, STUDENTS, HEADER + rows, chunk_rows=2, on_error='abort')
+    assert summary['aborted'] and len(results) == 2
+    assert (summary['inserted'], summary['failed'], summary['chunks']) == (2, 1, 1)
+    assert count(db, 'student') == 3
+
+def test_abort_after_constraint_errors(db):
+    rows = 'Bo,Ray,ann@x,2011-02-03,b,2\nCy,Ray,cy@x,2011-02-03,b,3\n'
+    summary, _ = run_import(db, STUDENTS, HEADER + rows * 2, chunk_rows=2, on_error='abort')
+    assert summary['aborted'] and summary['chunks'] == 1
+
+def test_dry_run_writes_nothing(db):
+    summary, _ = run_import(db, STUDENTS, HEADER + 'Bo,Ray,bo@x,2011-02-03,b,2\n', dry_run=True)
+    assert summary['inserted'] == 1
+    assert count(db, 'student') == 1
+
+def test_rows_still_failing_on_retry_are_reported(db, monkeypatch):
+    monkeypatch.setattr(importer, 'write_bulk', lambda conn, spec, items, dry_run: (None, {}))
+    rows = 'Bo,Ray,bo@x,2011-02-03,b,2\nCy,Ray,cy@x,2011-02-03,b,3\n'
+    summary, _ = run_import(db, STUDENTS, HEADER + rows)
+    assert (summary['inserted'], summary['failed']) == (0, 2)
+    assert [error['line'] for error in summary['errors']] == [2, 3]
@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+
+from pagination import DEFAULT_LIMIT, MAX_LIMIT, ListArgs, ListQuery, table_columns
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE course (id INTEGER PRIMARY KEY, courseName TEXT, credits INTEGER)')
+    conn.executemany('INSERT INTO course (id, courseName, credits) VALUES (?, ?, ?)',
+                     [(i, f'C{i}', i % 4) for i in (1, 2, 3, 5, 8, 13, 21)])
+    yield conn
+    conn.close()
+
+COURSES = ListQuery(table_columns('c', ['id', 'courseName', 'credits']), 'course c', 'c.id')
+
+def test_from_request_defaults():
+    args = ListArgs.from_request({})
+    assert (args.limit, args.after, args.fields, args.paginated) == (None, None, None, False)
+
+def test_from_request_after_implies_default_limit():
+    args = ListArgs.from_request({'after': '5'})
+    assert (args.limit, args.after, args.paginated) == (DEFAULT_LIMIT, 5, True)
+
+def test_from_request_parses_fields():
+    args = ListArgs.from_request({'limit': '10', 'fields': ' courseName, ,credits'})
+    assert args.limit == 10
+    assert args.fields == ['courseName', 'credits']
+
+@pytest.mark.parametrize('args', [
+    {'limit': 'ten'},
+    {'after': '1.5'},
+    {'limit': '0'},
+    {'limit': str(MAX_LIMIT + 1)},
+])
+def test_from_request_rejects(args):
+    with pytest.raises(ValueError):
+        ListArgs.from_request(args)
+
+def test_unknown_field_rejected():
+    with pytest.raises(ValueError, match='Unknown fields: grade'):
+        COURSES.build(ListArgs(fields=['grade']))
+
+def test_projection_keeps_id_first():
+    sql, _ = COURSES.build(ListArgs(fields=['credits', 'id']))
+    assert sql == 'SELECT c.id AS id, c.credits AS credits FROM course c'
+
+def test_unpaginated_query_has_no_order_or_limit():
+    sql, params = COURSES.build(ListArgs())
+    assert 'ORDER BY' not in sql and 'LIMIT' not in sql
+    assert params == []
+
+def test_keyset_pages_cover_every_row_once(conn):
+    seen = []
+    after = None
+    while True:
+        sql, params = COURSES.build(ListArgs(limit=3, after=after), with_key=True)
+        rows = conn.execute(sql, params).fetchall()
+        seen += [row[0] for row in rows]
+        if len(rows) < 3:
+            break
+        after = rows[-1][-1]
+    assert seen == [1, 2, 3, 5, 8, 13, 21]
+
+def test_keyset_cursor_follows_existing_filters(conn):
+    query = ListQuery(COURSES.columns, 'course c', 'c.id', where=['c.credits = ?'], params=[1])
+    sql, params = query.build(ListArgs(limit=10, after=1))
+    assert params == [1, 1, 10]
+    assert [row[0] for row in conn.execute(sql, params)] == [5, 13, 21]
+
+def test_json_rows_encode_in_sqlite(conn):
+    sql, params = COURSES.build(ListArgs(limit=1, fields=['courseName']), json_rows=True)
+    assert conn.execute(sql, params).fetchall() == [('{"id":1,"courseName":"C1"}', 1)]
+    sql, params = COURSES.build(ListArgs(limit=1), json_rows='array')
+    assert conn.execute(sql, params).fetchall() == [('[1,"C1",1]', 1)]
@@ -0,0 +1,111 @@
+import os
+import tempfile
+
+import pytest
+
+# app reads its configuration on import, so point it at a scratch database
+# before importing it
+os.environ.setdefault('DATABASE', os.path.join(tempfile.mkdtemp(), 'test.db'))
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-that-is-at-least-32-bytes')
+
+from app import app
+
+@pytest.fixture(scope='module')
+def client():
+    return app.test_client()
+
+def login(client, username, role, reference_id=None):
+    client.post('/api/auth/register', json={'username': username, 'password': 'secret',
+                                            'email': f'{username}@x', 'role': role,
+                                            'reference_id': reference_id})
+    token = client.post('/api/auth/login', json={'username': username, 'password': 'secret'}).get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
+
+@pytest.fixture(scope='module')
+def admin(client):
+    return login(client, 'parents_admin', 'admin')
+
+@pytest.fixture(scope='module')
+def students(client, admin):
+    rows = [{'firstName': f'P{n}', 'lastName': 'Kid', 'email': f'parents_kid{n}@x',
+             'dateOfBirth': '2012-01-01', 'address': 'a', 'phoneNumber': 22000 + n} for n in range(3)]
+    return client.post('/api/students/bulk', json=rows, headers=admin).get_json()['ids']
+
+counter = iter(range(1000))
+
+def parent(**fields):
+    n = next(counter)
+    return {'firstName': 'Pat', 'lastName': f'P{n}', 'email': f'parents_parent{n}@x',
+            'phoneNumber': 23000 + n, 'relationToStudent': 'Mother', **fields}
+
+def linked(client, admin, parent_id):
+    response = client.get(f'/api/parents/{parent_id}/students', headers=admin)
+    return sorted(row['id'] for row in response.get_json())
+
+def test_parent_without_student_ids_is_not_linked(client, admin, students):
+    response = client.post('/api/parents', json=parent(), headers=admin)
+    assert response.status_code == 201
+    assert linked(client, admin, response.get_json()['id']) == []
+
+def test_parent_is_linked_to_student_ids(client, admin, students):
+    response = client.post('/api/parents', json=parent(studentIds=students[:2]), headers=admin)
+    assert linked(client, admin, response.get_json()['id']) == students[:2]
+
+@pytest.mark.parametrize('student_ids, message', [
+    ([999999], 'studentIds 999999 do not exist'),
+    ('1', 'studentIds must be a list of integers'),
+    ([True], 'studentIds must be a list of integers'),
+])
+def test_parent_with_bad_student_ids_is_rejected(client, admin, students, student_ids, message):
+    response = client.post('/api/parents', json=parent(studentIds=student_ids), headers=admin)
+    assert response.status_code == 400
+    assert response.get_json()['message'] == message
+
+def test_bulk_parents_are_linked_to_student_ids(client, admin, students):
+    rows = [parent(studentIds=[students[0]]), parent(), parent(studentIds=students[1:])]
+    response = client.post('/api/parents/bulk', json=rows, headers=admin)
+    assert response.status_code == 201
+    ids = response.get_json()['ids']
+    assert [linked(client, admin, parent_id) for parent_id in ids] == [[students[0]], [], students[1:]]
+
+def test_bulk_parents_with_missing_students_are_rejected(client, admin, students):
+    rows = [parent(studentIds=[students[0]]), parent(studentIds=[students[0], 999999])]
+    response = client.post('/api/parents/bulk', json=rows, headers=admin)
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == [{'index': 1, 'errors': ['studentIds 999999 do not exist']}]
+
+def test_bulk_dry_run_does_not_link(client, admin, students):
+    response = client.post('/api/parents/bulk?dry_run=1', json=[parent(studentIds=[students[0]])],
+                           headers=admin)
+    assert response.get_json() == {'dry_run': True, 'count': 1}
+
+def test_link_and_unlink(client, admin, students):
+    parent_id = client.post('/api/parents', json=parent(), headers=admin).get_json()['id']
+    response = client.post(f'/api/parents/{parent_id}/students', json={'studentId': students[2]},
+                           headers=admin)
+    assert response.status_code == 201
+    assert linked(client, admin, parent_id) == [students[2]]
+    client.delete(f'/api/parents/{parent_id}/students/{students[2]}', headers=admin)
+    assert linked(client, admin, parent_id) == []
+
+def test_link_to_missing_rows_is_404(client, admin, students):
+    parent_id = client.post('/api/parents', json=parent(), headers=admin).get_json()['id']
+    response = client.post('/api/parents/999999/students', json={'studentId': students[0]}, headers=admin)
+    assert (response.status_code, response.get_json()['message']) == (404, 'Parent not found')
+    response = client.post(f'/api/parents/{parent_id}/students', json={'studentId': 999999}, headers=admin)
+    assert (response.status_code, response.get_json()['message']) == (404, 'Student not found')
+
+def test_parent_user_sees_only_linked_students(client, admin, students):
+    course = client.post('/api/courses', json={'courseName': 'Parents 101', 'courseDescription': 'd',
+                                               'credits': 3}, headers=admin).get_json()['id']
+    enrollments = client.post('/api/enrollments/bulk', json=[
+        {'studentId': students[0], 'courseId': course},
+        {'studentId': students[1], 'courseId': course}], headers=admin).get_json()['ids']
+    grades = client.post('/api/grades/bulk', json=[
+        {'enrollmentId': enrollment, 'gradeValue': 'A'} for enrollment in enrollments],
+        headers=admin).get_json()['ids']
+    parent_id = client.post('/api/parents', json=parent(studentIds=[students[1]]), headers=admin).get_json()['id']
+    headers = login(client, f'parents_user{parent_id}', 'parent', parent_id)
+    response = client.get('/api/grades', headers=headers)
+    assert [row['id'] for row in response.get_json()] == [grades[1]]
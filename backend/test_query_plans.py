@@ -0,0 +1,29 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+# app reads its configuration on import, so point it at a scratch database
+# before importing it
+os.environ.setdefault('DATABASE', os.path.join(tempfile.mkdtemp(), 'test.db'))
+
+from app import ROLE_SCOPED_QUERIES
+from pagination import ListArgs
+from schema import find_table_scans, run_migrations
+
+@pytest.fixture(scope='module')
+def conn(tmp_path_factory):
+    conn = sqlite3.connect(str(tmp_path_factory.mktemp('plans') / 'plans.db'))
+    run_migrations(conn)
+    yield conn
+    conn.close()
+
+@pytest.mark.parametrize('name, build_query, role', [
+    (name, build_query, role)
+    for name, build_query, roles in ROLE_SCOPED_QUERIES
+    for role in roles
+])
+def test_role_scoped_query_uses_indexes(conn, name, build_query, role):
+    sql, params = build_query({'role': role, 'reference_id': 1}).build(ListArgs())
+    assert find_table_scans(conn, sql, params) == [], f'{name} ({role}) scans a table'
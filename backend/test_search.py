@@ -0,0 +1,92 @@
+import sqlite3
+
+import pytest
+
+from schema import run_migrations
+from search import MAX_SEARCH_TERMS, SearchArgs, build_search, match_expression
+
+PEOPLE = [
+    ('John', 'Smith', 'john.smith@school.org'),
+    ('Joanna', 'Smithers', 'jo@school.org'),
+    ('José', 'Núñez', 'jose@school.org'),
+    ('Mary', 'Jones', 'mary_jones@school.org'),
+]
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    run_migrations(conn)
+    for n, (first, last, email) in enumerate(PEOPLE):
+        conn.execute("INSERT INTO student (firstName, lastName, email, dateOfBirth, address, phoneNumber) "
+                     "VALUES (?, ?, ?, '2010-01-01', 'a', ?)", (first, last, email, n))
+    conn.execute("INSERT INTO teachers (firstName, lastName, email, phoneNumber, department) "
+                 "VALUES ('Jon', 'Smith', 'jon@school.org', 1, 'Maths')")
+    yield conn
+    conn.close()
+
+def search(conn, q, types=('student', 'teacher', 'parent'), **args):
+    search_args = SearchArgs.from_request({'q': q, **args}, types)
+    sql, params = build_search(search_args)
+    return [(row[0], row[2], row[3]) for row in conn.execute(sql, params)]
+
+@pytest.mark.parametrize('text, expression', [
+    ('jo smi', '"jo"* "smi"*'),
+    ('  Smith, John!  ', '"Smith"* "John"*'),
+    ('"john" OR NOT smith*', '"john"* "OR"* "NOT"* "smith"*'),
+    ('email:jo^ (x) -y', '"email"* "jo"* "x"* "y"*'),
+    ('Núñez', '"Núñez"*'),
+])
+def test_match_expression(text, expression):
+    assert match_expression(text) == expression
+
+@pytest.mark.parametrize('text', [None, '', '  ', 'j', 'j s', '"*^()'])
+def test_match_expression_needs_a_longer_word(text):
+    with pytest.raises(ValueError, match='at least 2 characters'):
+        match_expression(text)
+
+def test_match_expression_caps_terms():
+    assert match_expression(' '.join(f'w{n}' for n in range(20))).count('*') == MAX_SEARCH_TERMS
+
+@pytest.mark.parametrize('q', ['"john', 'john"', 'NEAR(john smith)', 'email:john', 'john AND', '* ^ :',
+                               'jo - smi', "o'brien", 'mary_jones'])
+def test_fts_syntax_in_queries_is_harmless(conn, q):
+    try:
+        search(conn, q)
+    except ValueError:
+        pass
+
+def test_prefix_matches_every_word(conn):
+    assert sorted(search(conn, 'jo smi')) == [
+        ('student', 'Joanna', 'Smithers'), ('student', 'John', 'Smith'), ('teacher', 'Jon', 'Smith')]
+    assert search(conn, 'jo smi', ('student',)) == [
+        ('student', 'John', 'Smith'), ('student', 'Joanna', 'Smithers')]
+
+def test_matches_accented_names_and_email_parts(conn):
+    assert search(conn, 'nunez') == [('student', 'José', 'Núñez')]
+    assert search(conn, 'mary_jones') == [('student', 'Mary', 'Jones')]
+
+def test_offset_paging(conn):
+    first = search(conn, 'jo smi', limit='2')
+    rest = search(conn, 'jo smi', limit='2', after='2')
+    assert first + rest == search(conn, 'jo smi')
+
+def test_filters_limit_visible_rows(conn):
+    search_args = SearchArgs.from_request({'q': 'smith'}, ['student'])
+    sql, params = build_search(search_args, {'student': ('SELECT id FROM student WHERE firstName = ?',
+                                                          ['Joanna'])})
+    assert [row[2] for row in conn.execute(sql, params)] == ['Joanna']
+
+@pytest.mark.parametrize('args, message', [
+    ({'type': 'student,admin'}, 'Unknown types: admin'),
+    ({'limit': '0'}, 'limit must be between'),
+    ({'after': '5000'}, 'after must be between'),
+    ({'limit': 'ten'}, 'must be integers'),
+])
+def test_search_args_validation(args, message):
+    with pytest.raises(ValueError, match=message):
+        SearchArgs.from_request({'q': 'smith', **args}, ['student'])
+
+def test_types_default_to_the_allowed_ones():
+    assert SearchArgs.from_request({'q': 'smith'}, ['student']).types == ['student']
+    assert SearchArgs.from_request({'q': 'smith', 'type': 'parent,student'}, ['student']).types == [
+        'student', 'parent']
@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+from schema import rebuild_summaries, run_migrations
+
+SUMMARY_TABLES = {
+    'student_attendance_summary': 'studentId',
+    'attendance_daily_summary': 'date',
+    'student_grade_summary': 'studentId',
+    'course_summary': 'courseId',
+}
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    run_migrations(conn)
+    for i in range(1, 4):
+        conn.execute("INSERT INTO student (firstName, lastName, email, dateOfBirth, address, phoneNumber) "
+                     "VALUES (?, 'L', ?, '2010-01-01', 'a', ?)", (f'S{i}', f's{i}@x', i))
+        conn.execute("INSERT INTO course (courseName, courseDescription, credits) VALUES (?, 'd', 3)",
+                     (f'C{i}',))
+    for student_id, course_id in [(1, 1), (1, 2), (2, 1), (2, 3)]:
+        enrollment_id = conn.execute(
+            "INSERT INTO enrollment (studentId, courseId, enrollmentDate) VALUES (?, ?, '2024-09-02')",
+            (student_id, course_id)).lastrowid
+        conn.executemany('INSERT INTO grade (enrollmentId, gradeValue) VALUES (?, ?)',
+                         [(enrollment_id, 'A'), (enrollment_id, 'B-'), (enrollment_id, 'X')])
+        conn.executemany('INSERT INTO attendance (enrollmentId, date, status) VALUES (?, ?, ?)',
+                         [(enrollment_id, '2024-09-02', 'Present'),
+                          (enrollment_id, '2024-09-03', 'Absent'),
+                          (enrollment_id, '2024-09-04', 'Late')])
+    conn.commit()
+    yield conn
+    conn.close()
+
+# Summary rows by key. Points are rounded since the triggers add and
+# subtract them one at a time, and rows the triggers left at zero count as
+# missing, since rebuild_summaries only writes rows that have something to count.
+def summaries(conn):
+    result = {}
+    for table, key in SUMMARY_TABLES.items():
+        rows = conn.execute(f'SELECT * FROM {table} ORDER BY {key}').fetchall()
+        rows = [tuple(round(v, 6) + 0.0 if isinstance(v, float) else v for v in row) for row in rows]
+        result[table] = [row for row in rows if any(row[1:])]
+    return result
+
+def assert_matches_rebuild(conn):
+    maintained = summaries(conn)
+    rebuild_summaries(conn.cursor())
+    assert maintained == summaries(conn)
+
+def test_delete_enrollment(conn):
+    conn.execute('DELETE FROM enrollment WHERE id = 2')
+    assert_matches_rebuild(conn)
+
+def test_delete_children_after_enrollment(conn):
+    conn.execute('DELETE FROM enrollment WHERE id = 2')
+    conn.execute('DELETE FROM grade WHERE enrollmentId = 2')
+    conn.execute('DELETE FROM attendance WHERE enrollmentId = 2')
+    assert_matches_rebuild(conn)
+
+def test_move_enrollment_to_other_course(conn):
+    conn.execute('UPDATE enrollment SET courseId = 3 WHERE id = 1')
+    assert_matches_rebuild(conn)
+
+def test_move_enrollment_to_other_student(conn):
+    conn.execute('UPDATE enrollment SET studentId = 3 WHERE id = 4')
+    assert_matches_rebuild(conn)
+
+def test_delete_student_enrollments(conn):
+    conn.execute('DELETE FROM enrollment WHERE studentId = 1')
+    conn.execute("UPDATE grade SET gradeValue = 'C' WHERE enrollmentId = 3")
+    assert_matches_rebuild(conn)
@@ -49,27 +49,19 @@ const AdminDashboard = () => {
       const token = localStorage.getItem('token');
       const headers = { 'Authorization': `Bearer ${token}` };
 
-      const [studentsRes, teachersRes, coursesRes] = await Promise.all([
-        fetch('/api/students', { headers }),
-        fetch('/api/teachers', { headers }),
-        fetch('/api/courses', { headers })
-      ]);
+      const response = await fetch('/api/admin/dashboard', { headers });
 
-      if (!studentsRes.ok || !teachersRes.ok || !coursesRes.ok) {
+      if (!response.ok) {
         throw new Error('Failed to fetch dashboard data');
       }
 
-      const [students, teachers, courses] = await Promise.all([
-        studentsRes.json(),
-        teachersRes.json(),
-        coursesRes.json()
-      ]);
+      const { counts, attendanceToday } = await response.json();
 
       setStats({
-        students: students.length,
-        teachers: teachers.length,
-        courses: courses.length,
-        attendance: 0
+        students: counts.students,
+        teachers: counts.teachers,
+        courses: counts.courses,
+        attendance: attendanceToday.rate === null ? 0 : Math.round(attendanceToday.rate * 100)
       });
     } catch (err) {
       setError('Failed to load dashboard data');